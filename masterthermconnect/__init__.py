@@ -1,6 +1,17 @@
 """Python API wrapper for Mastertherm Connect."""
 
+from typing import Any
+
 from masterthermconnect.__version__ import __version__
-from masterthermconnect.controller import MasterthermController
 
 __all__ = ["__version__", "MasterthermController"]
+
+
+def __getattr__(name: str) -> Any:
+    """Import the controller on first use, keeping the package import fast."""
+    if name == "MasterthermController":
+        from masterthermconnect.controller import MasterthermController
+
+        return MasterthermController
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
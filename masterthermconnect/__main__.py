@@ -3,13 +3,19 @@
 import argparse
 import asyncio
 import configparser
+import json
 import logging
+import os
 import sys
+from collections.abc import Callable
+from contextlib import AbstractAsyncContextManager, nullcontext
+from datetime import datetime
+from typing import Any
 
-from aiohttp import ClientSession, ClientTimeout
+from masterthermconnect import __version__
 
-from masterthermconnect import MasterthermController, __version__
-from masterthermconnect.modbus import MasterthermModbus
+# Commands import what they use when run, so the transports and their
+# dependencies are only loaded when needed.
 
 _LOGGER: logging.Logger = logging.getLogger(__name__)
 
@@ -19,6 +25,8 @@ class MasterthermCLIShell:
 
     def __init__(self) -> None:
         """Initialise the Mastertherm Connect CLI Shell."""
+        from masterthermconnect.controller import MasterthermController
+
         self._config_file: str = "masterthermconnect.cfg"
         self._controller: MasterthermController = MasterthermController()
         self._configured = False
@@ -32,6 +40,7 @@ class MasterthermCLIShell:
         self._username: str | None = None
         self._password: str | None = None
         self._local_ip: str | None = None
+        self._local_port: int = 502
         self._hp_type: str | None = None
 
     def _input(self, message: str, answers_allowed: list[str]) -> str:
@@ -46,6 +55,8 @@ class MasterthermCLIShell:
         self, login_user: str, login_pass: str, args: list[str]
     ) -> int:
         """Get Command to get data/ registry/ devices."""
+        from masterthermconnect.modbus import MasterthermModbus
+
         modbus = MasterthermModbus("172.16.46.100", "mt_0")
         await modbus.connect()
 
@@ -55,8 +66,8 @@ class MasterthermCLIShell:
         modbus.close()
         return 0
 
-    async def load_config(self) -> int:
-        """Load configuration from a file."""
+    async def load_config(self, interactive: bool = True) -> int:
+        """Load configuration from a file, only prompt for input if interactive."""
         config = configparser.ConfigParser()
         config.read(self._config_file)
 
@@ -81,10 +92,14 @@ class MasterthermCLIShell:
         # Load the local configuration if configured
         if self._local_configured:
             self._local_ip = config.get("LOCAL", "local_ip", fallback=None)
+            self._local_port = config.getint("LOCAL", "local_port", fallback=502)
             self._hp_type = config.get("LOCAL", "hp_type", fallback=None)
 
         # If Password is not passed, ask for it.
-        if self._password is None:
+        if self._password is None and self._api_configured:
+            if not interactive:
+                _LOGGER.error("API password not provided.")
+                return -1
             self._password = input("Enter your login password: ")
 
         return 0
@@ -129,6 +144,8 @@ class MasterthermCLIShell:
                 self._password = input("Enter your login password: ")
 
                 #   TODO: Setup and Connect API, get the HP Type:
+                from aiohttp import ClientSession, ClientTimeout
+
                 await self._controller.enable_api(
                     self._username,
                     self._password,
@@ -143,7 +160,19 @@ class MasterthermCLIShell:
                 == "y"
             ):
                 self._local_configured = True
-                self._local_ip = input("Enter the local IP address of your heat pump: ")
+                self._local_ip = None
+                if (
+                    self._input(
+                        "Scan the network for your heat pump? (y/n): ", ["y", "n"]
+                    )
+                    == "y"
+                ):
+                    await self._scan_select()
+
+                if self._local_ip is None:
+                    self._local_ip = input(
+                        "Enter the local IP address of your heat pump: "
+                    )
                 if self._hp_type is None:
                     hp_type = self._input(
                         "The HP Controller type can be found in the App under Info: \n"
@@ -178,6 +207,7 @@ class MasterthermCLIShell:
                 if self._local_configured:
                     config.add_section("LOCAL")
                     config.set("LOCAL", "local_ip", self._local_ip)
+                    config.set("LOCAL", "local_port", str(self._local_port))
                     config.set("LOCAL", "hp_type", self._hp_type)
 
                 with open(self._config_file, "w") as configfile:
@@ -188,6 +218,261 @@ class MasterthermCLIShell:
             self._configured = True
             _LOGGER.info("Configuration complete.")
 
+    async def _scan_select(self) -> None:
+        """Scan a network and let the user pick the heat pump found."""
+        from masterthermconnect.scan import scan
+
+        network = input("Enter the network to scan, e.g. 192.168.1.0/24: ")
+        try:
+            found = await scan(network)
+        except ValueError as ex:
+            _LOGGER.error("Invalid network: %s", ex)
+            return
+
+        if not found:
+            _LOGGER.info("No Modbus devices found.")
+            return
+
+        for i, result in enumerate(found, 1):
+            _LOGGER.info(
+                "  %s. %s (%s)", i, result["host"], result["hp_type"] or "unknown type"
+            )
+        choice = self._input(
+            "Select your heat pump, or 0 to enter the IP: ",
+            [str(i) for i in range(len(found) + 1)],
+        )
+        if choice != "0":
+            result = found[int(choice) - 1]
+            self._local_ip = result["host"]
+            self._local_port = result["port"]
+            self._hp_type = result["hp_type"] or self._hp_type
+
+    async def _enable_from_config(self) -> Any:
+        """Enable the configured API and local Modbus, returns the API session."""
+        session = None
+        if self._api_configured:
+            from aiohttp import ClientSession, ClientTimeout
+
+            session = ClientSession(timeout=ClientTimeout(total=10))
+            await self._controller.enable_api(
+                self._username, self._password, session, api_version=self._api_version
+            )
+        if self._local_configured:
+            await self._controller.enable_modbus(
+                self._local_ip, self._hp_type, port=self._local_port
+            )
+
+        return session
+
+    async def _serve(
+        self,
+        config_file: str,
+        password: str | None,
+        interval: float,
+        server: Callable[[float], AbstractAsyncContextManager],
+    ) -> int:
+        """Run a server on the controller from the saved configuration until stopped.
+
+        Args:
+            config_file: The saved configuration to use
+            password: The API password, if the API is configured
+            interval: Seconds between data refreshes
+            server: Returns the server for a poll interval, it is started once
+                the controller is connected
+
+        """
+        self._config_file = config_file
+        self._password = password
+        if await self.load_config(interactive=False) == -1:
+            return -1
+
+        session = await self._enable_from_config()
+        self._controller.set_refresh_rate(data_refresh_seconds=interval)
+        try:
+            await self._controller.connect()
+            # Poll often, the refresh only does the work that is due.
+            async with server(min(interval, 5.0)):
+                await asyncio.Event().wait()
+        finally:
+            await self._controller.close()
+            if session is not None:
+                await session.close()
+
+        return 0
+
+    async def export(
+        self,
+        config_file: str = "masterthermconnect.cfg",
+        password: str | None = None,
+        host: str = "0.0.0.0",
+        port: int = 9586,
+        interval: float = 60.0,
+    ) -> int:
+        """Serve the heat pump data for Prometheus until stopped.
+
+        Args:
+            config_file: The saved configuration to use
+            password: The API password, if the API is configured
+            host: The address to listen on
+            port: The port to listen on
+            interval: Seconds between data refreshes
+
+        """
+        from masterthermconnect.exporter import MasterthermExporter
+
+        return await self._serve(
+            config_file,
+            password,
+            interval,
+            lambda poll_interval: MasterthermExporter(
+                self._controller, host=host, port=port, poll_interval=poll_interval
+            ),
+        )
+
+    async def push(
+        self,
+        config_file: str = "masterthermconnect.cfg",
+        password: str | None = None,
+        host: str = "0.0.0.0",
+        port: int = 8765,
+        interval: float = 60.0,
+    ) -> int:
+        """Push the heat pump changes to WebSocket clients until stopped.
+
+        Args:
+            config_file: The saved configuration to use
+            password: The API password, if the API is configured
+            host: The address to listen on
+            port: The port to listen on
+            interval: Seconds between data refreshes
+
+        """
+        from masterthermconnect.push import MasterthermPushServer
+
+        return await self._serve(
+            config_file,
+            password,
+            interval,
+            lambda poll_interval: MasterthermPushServer(
+                self._controller, host=host, port=port, poll_interval=poll_interval
+            ),
+        )
+
+    async def mqtt(
+        self,
+        config_file: str = "masterthermconnect.cfg",
+        password: str | None = None,
+        broker: str = "localhost",
+        broker_port: int = 1883,
+        mqtt_username: str | None = None,
+        mqtt_password: str | None = None,
+        prefix: str = "masterthermconnect",
+        topics: str = "register",
+        batch: bool = False,
+        discovery: bool = True,
+        interval: float = 60.0,
+    ) -> int:
+        """Bridge the heat pump to an MQTT broker until stopped.
+
+        Args:
+            config_file: The saved configuration to use
+            password: The API password, if the API is configured
+            broker: The MQTT broker address
+            broker_port: The MQTT broker port
+            mqtt_username: Optional, the MQTT username
+            mqtt_password: Optional, the MQTT password
+            prefix: The topic prefix
+            topics: register or field
+            batch: Also publish the changes per refresh as JSON
+            discovery: Publish Home Assistant discovery messages
+            interval: Seconds between data refreshes
+
+        """
+        from masterthermconnect.mqtt import MasterthermMQTTBridge
+
+        return await self._serve(
+            config_file,
+            password,
+            interval,
+            lambda poll_interval: MasterthermMQTTBridge(
+                self._controller,
+                host=broker,
+                port=broker_port,
+                username=mqtt_username,
+                password=mqtt_password,
+                prefix=prefix,
+                topics=topics,
+                batch=batch,
+                discovery_prefix="homeassistant" if discovery else None,
+                poll_interval=poll_interval,
+            ),
+        )
+
+    async def watch(
+        self,
+        config_file: str = "masterthermconnect.cfg",
+        password: str | None = None,
+        interval: float = 30.0,
+        count: int = 0,
+        profile: str | None = None,
+    ) -> int:
+        """Print the registers that change, without prompts, until stopped.
+
+        Args:
+            config_file: The saved configuration to use
+            password: The API password, if the API is configured
+            interval: Seconds between refreshes
+            count: Number of refreshes before stopping, 0 to run forever
+            profile: Optional, profile the refreshes and write the profiles
+                to files starting with this path
+
+        """
+        from masterthermconnect.profiling import MasterthermProfiler
+
+        self._config_file = config_file
+        self._password = password
+        if await self.load_config(interactive=False) == -1:
+            return -1
+
+        session = await self._enable_from_config()
+        profiler = MasterthermProfiler(self._controller) if profile else None
+        try:
+            await self._controller.connect()
+
+            with profiler or nullcontext():
+                refreshes = 0
+                while count == 0 or refreshes < count:
+                    await self._print_changes()
+                    refreshes += 1
+                    if count == 0 or refreshes < count:
+                        await asyncio.sleep(interval)
+        finally:
+            await self._controller.close()
+            if session is not None:
+                await session.close()
+            if profiler is not None:
+                _LOGGER.info(
+                    "Profiles written: %s", ", ".join(profiler.export(profile))
+                )
+
+        return 0
+
+    async def _print_changes(self) -> None:
+        """Refresh all devices and print the registers that changed."""
+        results = await self._controller.refresh_devices()
+        timestamp = datetime.now().isoformat(timespec="seconds")
+        for device_id, result in results.items():
+            if result is not True:
+                _LOGGER.warning("%s %s refresh failed", timestamp, device_id)
+                continue
+
+            module_id, unit_id = device_id.rsplit("_", 1)
+            registers = self._controller.get_device_registers(module_id, unit_id)
+            for register in self._controller.get_device_changes(module_id, unit_id):
+                _LOGGER.info(
+                    "%s %s %s=%s", timestamp, device_id, register, registers[register]
+                )
+
     async def process_command(self, command: str, args: list[str]) -> int:
         """Process a command entered in the shell."""
         # Configure local IP, Login URL, User, Password, HP Type
@@ -242,6 +527,177 @@ class MasterthermCLIShell:
         )
 
 
+async def simulate(args: argparse.Namespace) -> int:
+    """Run the Modbus heat pump simulator until interrupted."""
+    from masterthermconnect.simulator import MasterthermModbusSimulator
+
+    simulator = MasterthermModbusSimulator(
+        mt_type=args.type,
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        drift=args.drift,
+        drop_rate=args.drop_rate,
+        max_transactions=args.max_transactions,
+    )
+    await simulator.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await simulator.stop()
+
+    return 0
+
+
+async def gateway(args: argparse.Namespace) -> int:
+    """Run the Modbus caching gateway until interrupted."""
+    from masterthermconnect.gateway import MasterthermModbusGateway
+
+    modbus_gateway = MasterthermModbusGateway(
+        args.address,
+        args.type,
+        upstream_port=args.upstream_port,
+        host=args.host,
+        port=args.port,
+        poll_interval=args.interval,
+        max_staleness=args.max_staleness,
+    )
+    await modbus_gateway.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await modbus_gateway.stop()
+
+    return 0
+
+
+async def scan(args: argparse.Namespace) -> int:
+    """Scan a network for heat pumps and print what was found."""
+    from masterthermconnect.scan import scan as scan_network
+
+    try:
+        found = await scan_network(
+            args.network,
+            port=args.port,
+            slave=args.slave,
+            timeout=args.timeout,
+            concurrency=args.concurrency,
+        )
+    except ValueError as ex:
+        _LOGGER.error("Invalid network: %s", ex)
+        return -1
+
+    for result in found:
+        _LOGGER.info(
+            "%s:%s %s %s",
+            result["host"],
+            result["port"],
+            result["mt_type"] or "unknown",
+            result["hp_type"] or "",
+        )
+    _LOGGER.info("Found %s Modbus device(s).", len(found))
+    return 0
+
+
+async def bench(args: argparse.Namespace) -> int:
+    """Benchmark polls and print or save the results."""
+    from masterthermconnect.bench import run_bench
+    from masterthermconnect.profiling import MasterthermProfiler
+
+    profiler = MasterthermProfiler() if args.profile else None
+    with profiler or nullcontext():
+        results = await run_bench(
+            args.transport,
+            polls=args.polls,
+            full_load=args.full_load,
+            api_version=args.api_version,
+            username=args.username,
+            password=args.password,
+            address=args.address,
+            mt_type=args.type,
+            port=args.port,
+            latency=args.latency,
+            alloc_polls=args.alloc_polls,
+            profiler=profiler,
+        )
+    if profiler is not None:
+        _LOGGER.info("Profiles written: %s", ", ".join(profiler.export(args.profile)))
+
+    if args.output == "-":
+        _LOGGER.info(json.dumps(results, indent=2))
+        return 0
+
+    latency = results["latency_ms"]
+    _LOGGER.info(
+        "%s %s, %s polls: p50 %.2fms p95 %.2fms p99 %.2fms\n"
+        "  round trips/poll %.1f, bytes/poll sent %.0f received %.0f\n"
+        "  decode/poll %.3fms, allocation peak/poll %s bytes, errors %s",
+        results["transport"],
+        results["target"],
+        results["polls"],
+        latency["p50"],
+        latency["p95"],
+        latency["p99"],
+        results["round_trips_per_poll"],
+        results["bytes_sent_per_poll"],
+        results["bytes_received_per_poll"],
+        results["decode_ms_per_poll"],
+        results["alloc_peak_bytes_p50"],
+        results["poll_errors"],
+    )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+
+    return 0
+
+
+async def load(args: argparse.Namespace) -> int:
+    """Load test the polling path and print or save the results."""
+    from masterthermconnect.loadtest import run_load
+
+    results = await run_load(
+        [int(accounts) for accounts in args.accounts.split(",")],
+        modules=args.modules,
+        units=args.units,
+        api_version=args.api_version,
+        data_refresh=args.refresh,
+        duration=args.duration,
+        tick=args.tick,
+        latency=args.latency,
+        connections=args.connections,
+    )
+
+    if args.output == "-":
+        _LOGGER.info(json.dumps(results, indent=2))
+        return 0
+
+    for step in results["steps"]:
+        _LOGGER.info(
+            "%s accounts, %s devices: %.1f of %.1f refreshes/s, "
+            "%.1f requests/s, errors %s\n"
+            "  loop lag p50 %.1fms p99 %.1fms, poll p99 %.1fms, %.0f bytes/device%s",
+            step["accounts"],
+            step["devices"],
+            step["refreshes_per_s"],
+            step["refreshes_due_per_s"],
+            step["requests_per_s"],
+            step["refresh_errors"],
+            step["loop_lag_ms"]["p50"],
+            step["loop_lag_ms"]["p99"],
+            step["poll_ms"]["p99"],
+            step["memory_per_device_bytes"],
+            ", BEHIND" if step["behind"] else "",
+        )
+    _LOGGER.info("Falls behind at: %s accounts", results["falls_behind_at"])
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2)
+
+    return 0
+
+
 def get_arguments(argv: list[str]) -> argparse.Namespace:
     """Read the Arguments passed in."""
     # formatter_class=argparse.MetavarTypeHelpFormatter,
@@ -281,17 +737,398 @@ def get_arguments(argv: list[str]) -> argparse.Namespace:
         "-p", "--password", type=str, help="the API login password."
     )
 
+    parser_watch = subparsers.add_parser(
+        "watch", help="print changed registers, without prompts, until stopped"
+    )
+    parser_watch.set_defaults(command="watch")
+    parser_watch.add_argument(
+        "-c",
+        "--config",
+        type=str,
+        default="masterthermconnect.cfg",
+        help="the configuration file, to use.",
+    )
+    parser_watch.add_argument(
+        "-p",
+        "--password",
+        type=str,
+        default=os.environ.get("MASTERTHERM_PASSWORD"),
+        help="the API login password, default from MASTERTHERM_PASSWORD.",
+    )
+    parser_watch.add_argument(
+        "-i", "--interval", type=float, default=30.0, help="seconds between refreshes"
+    )
+    parser_watch.add_argument(
+        "-n",
+        "--count",
+        type=int,
+        default=0,
+        help="number of refreshes before stopping, default run forever",
+    )
+    parser_watch.add_argument(
+        "--profile",
+        type=str,
+        metavar="PREFIX",
+        help="profile the refreshes, writes PREFIX.pstats, .collapsed and .tracemalloc",
+    )
+
+    parser_export = subparsers.add_parser(
+        "export", help="serve the heat pump data for Prometheus until stopped"
+    )
+    parser_export.set_defaults(command="export")
+    parser_export.add_argument(
+        "-c",
+        "--config",
+        type=str,
+        default="masterthermconnect.cfg",
+        help="the configuration file, to use.",
+    )
+    parser_export.add_argument(
+        "-p",
+        "--password",
+        type=str,
+        default=os.environ.get("MASTERTHERM_PASSWORD"),
+        help="the API login password, default from MASTERTHERM_PASSWORD.",
+    )
+    parser_export.add_argument(
+        "--host", type=str, default="0.0.0.0", help="the address to listen on"
+    )
+    parser_export.add_argument(
+        "--port", type=int, default=9586, help="the port to listen on, default 9586"
+    )
+    parser_export.add_argument(
+        "-i",
+        "--interval",
+        type=float,
+        default=60.0,
+        help="seconds between data refreshes, scrapes never refresh",
+    )
+
+    parser_push = subparsers.add_parser(
+        "push", help="push the heat pump changes to WebSocket clients until stopped"
+    )
+    parser_push.set_defaults(command="push")
+    parser_push.add_argument(
+        "-c",
+        "--config",
+        type=str,
+        default="masterthermconnect.cfg",
+        help="the configuration file, to use.",
+    )
+    parser_push.add_argument(
+        "-p",
+        "--password",
+        type=str,
+        default=os.environ.get("MASTERTHERM_PASSWORD"),
+        help="the API login password, default from MASTERTHERM_PASSWORD.",
+    )
+    parser_push.add_argument(
+        "--host", type=str, default="0.0.0.0", help="the address to listen on"
+    )
+    parser_push.add_argument(
+        "--port", type=int, default=8765, help="the port to listen on, default 8765"
+    )
+    parser_push.add_argument(
+        "-i",
+        "--interval",
+        type=float,
+        default=60.0,
+        help="seconds between data refreshes",
+    )
+
+    parser_mqtt = subparsers.add_parser(
+        "mqtt", help="bridge the heat pump to an MQTT broker until stopped"
+    )
+    parser_mqtt.set_defaults(command="mqtt")
+    parser_mqtt.add_argument(
+        "-c",
+        "--config",
+        type=str,
+        default="masterthermconnect.cfg",
+        help="the configuration file, to use.",
+    )
+    parser_mqtt.add_argument(
+        "-p",
+        "--password",
+        type=str,
+        default=os.environ.get("MASTERTHERM_PASSWORD"),
+        help="the API login password, default from MASTERTHERM_PASSWORD.",
+    )
+    parser_mqtt.add_argument(
+        "--broker", type=str, default="localhost", help="the MQTT broker address"
+    )
+    parser_mqtt.add_argument(
+        "--broker-port", type=int, default=1883, help="the MQTT broker port"
+    )
+    parser_mqtt.add_argument(
+        "--mqtt-username", type=str, default=None, help="the MQTT username"
+    )
+    parser_mqtt.add_argument(
+        "--mqtt-password",
+        type=str,
+        default=os.environ.get("MQTT_PASSWORD"),
+        help="the MQTT password, default from MQTT_PASSWORD.",
+    )
+    parser_mqtt.add_argument(
+        "--prefix", type=str, default="masterthermconnect", help="the topic prefix"
+    )
+    parser_mqtt.add_argument(
+        "--topics",
+        type=str,
+        choices=["register", "field"],
+        default="register",
+        help="publish raw registers or normalized fields, default register",
+    )
+    parser_mqtt.add_argument(
+        "--batch",
+        action="store_true",
+        help="also publish the changes of each refresh as JSON",
+    )
+    parser_mqtt.add_argument(
+        "--no-discovery",
+        action="store_true",
+        help="do not publish Home Assistant discovery messages",
+    )
+    parser_mqtt.add_argument(
+        "-i",
+        "--interval",
+        type=float,
+        default=60.0,
+        help="seconds between data refreshes",
+    )
+
+    parser_simulate = subparsers.add_parser(
+        "simulate", help="run a Modbus TCP heat pump simulator"
+    )
+    parser_simulate.set_defaults(command="simulate")
+    parser_simulate.add_argument(
+        "-t",
+        "--type",
+        choices=["mt_0", "mt_1"],
+        default="mt_0",
+        help="the register mapping to serve, default mt_0",
+    )
+    parser_simulate.add_argument(
+        "--host", type=str, default="127.0.0.1", help="the address to listen on"
+    )
+    parser_simulate.add_argument(
+        "--port", type=int, default=5020, help="the port to listen on, default 5020"
+    )
+    parser_simulate.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to each request"
+    )
+    parser_simulate.add_argument(
+        "--jitter", type=float, default=0.0, help="random seconds added to latency"
+    )
+    parser_simulate.add_argument(
+        "--drift", type=float, default=0.0, help="maximum analog change per read"
+    )
+    parser_simulate.add_argument(
+        "--drop-rate",
+        type=float,
+        default=0.0,
+        help="probability a request drops the connection",
+    )
+    parser_simulate.add_argument(
+        "--max-transactions",
+        type=int,
+        default=None,
+        help="maximum requests processed at the same time",
+    )
+
+    parser_gateway = subparsers.add_parser(
+        "gateway", help="run a caching Modbus TCP gateway for a heat pump"
+    )
+    parser_gateway.set_defaults(command="gateway")
+    parser_gateway.add_argument("address", type=str, help="the heat pump IP address")
+    parser_gateway.add_argument(
+        "-t",
+        "--type",
+        choices=["mt_0", "mt_1"],
+        default="mt_0",
+        help="the heat pump register mapping, default mt_0",
+    )
+    parser_gateway.add_argument(
+        "--upstream-port", type=int, default=502, help="the heat pump Modbus port"
+    )
+    parser_gateway.add_argument(
+        "--host", type=str, default="0.0.0.0", help="the address to listen on"
+    )
+    parser_gateway.add_argument(
+        "--port", type=int, default=5020, help="the port to listen on, default 5020"
+    )
+    parser_gateway.add_argument(
+        "--interval", type=float, default=10.0, help="seconds between polls"
+    )
+    parser_gateway.add_argument(
+        "--max-staleness",
+        type=float,
+        default=30.0,
+        help="maximum age in seconds of values served from the cache",
+    )
+
+    parser_scan = subparsers.add_parser(
+        "scan", help="find heat pumps on a network and detect their type"
+    )
+    parser_scan.set_defaults(command="scan")
+    parser_scan.add_argument(
+        "network", type=str, help="the network to scan, e.g. 192.168.1.0/24"
+    )
+    parser_scan.add_argument(
+        "--port", type=int, default=502, help="the Modbus port, default 502"
+    )
+    parser_scan.add_argument(
+        "--slave", type=int, default=1, help="the Modbus slave id, default 1"
+    )
+    parser_scan.add_argument(
+        "--timeout", type=float, default=1.0, help="seconds to wait for each host"
+    )
+    parser_scan.add_argument(
+        "--concurrency",
+        type=int,
+        default=256,
+        help="the maximum hosts probed at the same time",
+    )
+
+    parser_bench = subparsers.add_parser(
+        "bench",
+        help="time polls over the API or Modbus, live or against a local stand-in",
+    )
+    parser_bench.set_defaults(command="bench")
+    parser_bench.add_argument(
+        "transport", choices=["api", "modbus"], help="the transport to benchmark"
+    )
+    parser_bench.add_argument(
+        "-n", "--polls", type=int, default=20, help="the number of timed polls"
+    )
+    parser_bench.add_argument(
+        "--full-load", action="store_true", help="reload all API data every poll"
+    )
+    parser_bench.add_argument(
+        "--api-version",
+        choices=["v1", "v2"],
+        default="v1",
+        help="the API version, default v1",
+    )
+    parser_bench.add_argument(
+        "-u", "--username", type=str, help="the API login, a stand-in if not set"
+    )
+    parser_bench.add_argument(
+        "-p",
+        "--password",
+        type=str,
+        default=os.environ.get("MASTERTHERM_PASSWORD"),
+        help="the API login password, default from MASTERTHERM_PASSWORD.",
+    )
+    parser_bench.add_argument(
+        "-a", "--address", type=str, help="the heat pump IP, a stand-in if not set"
+    )
+    parser_bench.add_argument(
+        "-t",
+        "--type",
+        choices=["mt_0", "mt_1"],
+        default="mt_0",
+        help="the heat pump register mapping, default mt_0",
+    )
+    parser_bench.add_argument(
+        "--port", type=int, default=502, help="the heat pump Modbus port"
+    )
+    parser_bench.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="seconds added to each stand-in request",
+    )
+    parser_bench.add_argument(
+        "--alloc-polls",
+        type=int,
+        default=5,
+        help="extra polls traced for allocations, 0 to skip",
+    )
+    parser_bench.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        help="write the results as JSON to a file, - for stdout only",
+    )
+    parser_bench.add_argument(
+        "--profile",
+        type=str,
+        metavar="PREFIX",
+        help="profile the timed polls, writes PREFIX.pstats, .collapsed and .tracemalloc",
+    )
+
+    parser_load = subparsers.add_parser(
+        "load",
+        help="load test polling many accounts against a local stand-in",
+    )
+    parser_load.set_defaults(command="load")
+    parser_load.add_argument(
+        "accounts",
+        type=str,
+        help="the total accounts per step, comma separated, e.g. 10,100,1000",
+    )
+    parser_load.add_argument(
+        "--modules", type=int, default=1, help="the modules per account"
+    )
+    parser_load.add_argument(
+        "--units", type=int, default=1, help="the units per module"
+    )
+    parser_load.add_argument(
+        "--api-version",
+        choices=["v1", "v2"],
+        default="v1",
+        help="the API version, default v1",
+    )
+    parser_load.add_argument(
+        "-r",
+        "--refresh",
+        type=int,
+        default=10,
+        help="seconds between data refreshes of a device, default 10",
+    )
+    parser_load.add_argument(
+        "-d",
+        "--duration",
+        type=float,
+        help="seconds measured per step, default three refreshes",
+    )
+    parser_load.add_argument(
+        "--tick",
+        type=float,
+        default=1.0,
+        help="seconds between refresh calls of a controller, default 1",
+    )
+    parser_load.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="seconds added to each stand-in request",
+    )
+    parser_load.add_argument(
+        "--connections",
+        type=int,
+        default=100,
+        help="the connection limit of the shared session, default 100",
+    )
+    parser_load.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        help="write the results as JSON to a file, - for stdout only",
+    )
+
     return parser.parse_args(argv)
 
 
-def main(argv: list[str]) -> str | int | None:
+def main(argv: list[str] | None = None) -> str | int | None:
     """Mastertherm Connect CLI."""
     _LOGGER.setLevel(logging.INFO)
     _LOGGER.addHandler(logging.StreamHandler(sys.stdout))
 
     # Arg Parse raises SystemExit, get return value
     try:
-        args: argparse.Namespace = get_arguments(argv)
+        args: argparse.Namespace = get_arguments(sys.argv[1:] if argv is None else argv)
     except SystemExit as ex:
         return ex.code
 
@@ -312,6 +1149,71 @@ def main(argv: list[str]) -> str | int | None:
         else:
             return asyncio.run(shell.start(password=args.password))
 
+    if args.command == "watch":
+        return asyncio.run(
+            MasterthermCLIShell().watch(
+                config_file=args.config,
+                password=args.password,
+                interval=args.interval,
+                count=args.count,
+                profile=args.profile,
+            )
+        )
+
+    if args.command == "export":
+        return asyncio.run(
+            MasterthermCLIShell().export(
+                config_file=args.config,
+                password=args.password,
+                host=args.host,
+                port=args.port,
+                interval=args.interval,
+            )
+        )
+
+    if args.command == "push":
+        return asyncio.run(
+            MasterthermCLIShell().push(
+                config_file=args.config,
+                password=args.password,
+                host=args.host,
+                port=args.port,
+                interval=args.interval,
+            )
+        )
+
+    if args.command == "mqtt":
+        return asyncio.run(
+            MasterthermCLIShell().mqtt(
+                config_file=args.config,
+                password=args.password,
+                broker=args.broker,
+                broker_port=args.broker_port,
+                mqtt_username=args.mqtt_username,
+                mqtt_password=args.mqtt_password,
+                prefix=args.prefix,
+                topics=args.topics,
+                batch=args.batch,
+                discovery=not args.no_discovery,
+                interval=args.interval,
+            )
+        )
+
+    if args.command == "simulate":
+        return asyncio.run(simulate(args))
+
+    if args.command == "gateway":
+        return asyncio.run(gateway(args))
+
+    if args.command == "scan":
+        return asyncio.run(scan(args))
+
+    if args.command == "bench":
+        return asyncio.run(bench(args))
+
+    if args.command == "load":
+        return asyncio.run(load(args))
+
 
 if __name__ == "__main__":
-    sys.exit(main(sys.argv))
+    sys.exit(main())
@@ -9,7 +9,12 @@ from json.decoder import JSONDecodeError
 from typing import Any
 from urllib.parse import quote_plus, urljoin
 
-from aiohttp import ClientConnectionError, ClientSession, ContentTypeError
+from aiohttp import (
+    ClientConnectionError,
+    ClientResponse,
+    ClientSession,
+    ContentTypeError,
+)
 from natsort import natsorted
 
 from masterthermconnect.const import (
@@ -30,9 +35,12 @@ from masterthermconnect.const import (
     URL_PUMPINFO,
     URL_PUMPINFO_NEW,
 )
+from masterthermconnect.deadline import remaining, within
 from masterthermconnect.exceptions import (
     MasterthermAuthenticationError,
     MasterthermConnectionError,
+    MasterthermDeadlineError,
+    MasterthermError,
     MasterthermPumpError,
     MasterthermResponseFormatError,
     MasterthermServerTimeoutError,
@@ -40,9 +48,39 @@ from masterthermconnect.exceptions import (
     MasterthermUnsupportedRole,
     MasterthermUnsupportedVersion,
 )
+from masterthermconnect.metrics import METRICS
 
 _LOGGER: logging.Logger = logging.getLogger(__name__)
 
+# Seconds to wait before retrying a request the server timed out.
+RETRY_DELAY = 0.5
+
+
+def sort_device_data(response_json: dict, api_version: str, unit_id: str) -> None:
+    """Move the registers of a data response to varData, naturally sorted.
+
+    The registers are under varfile_mt1_config1 or 2 for v1 and varFileData
+    for v2, keyed by the unit id padded to three digits.
+    """
+    data_file = ""
+    if api_version == "v1":
+        if "varfile_mt1_config1" in response_json["data"]:
+            data_file = "varfile_mt1_config1"
+        elif "varfile_mt1_config2" in response_json["data"]:
+            data_file = "varfile_mt1_config2"
+    elif api_version == "v2":
+        data_file = "varFileData"
+
+    response_json["data"]["varData"] = response_json["data"][data_file]
+    del response_json["data"][data_file]
+
+    # Sort the Data
+    sorted_reg = {}
+    device_reg = response_json["data"]["varData"][str(unit_id).zfill(3)]
+    for key in natsorted(device_reg.keys()):
+        sorted_reg[key] = device_reg[key]
+    response_json["data"]["varData"][str(unit_id).zfill(3)] = sorted_reg
+
 
 class MasterthermAPI:
     """API Handler for the Mastertherm API."""
@@ -53,6 +91,9 @@ class MasterthermAPI:
         password: str,
         session: ClientSession,
         api_version: str,
+        base_url: str | None = None,
+        fresh_seconds: float = 0.0,
+        max_stale_seconds: float = 0.0,
     ) -> None:
         """Initialise the Mastertherm API Client.
 
@@ -63,6 +104,12 @@ class MasterthermAPI:
             api_version: The version of the API, mainly the host
                 "v1"  : Original version, data response in varfile_mt1_config1 or 2
                 "v2"  : New version since 2022 response in varFileData
+            base_url: Optional, the server URL to use instead of the one for the
+                version, e.g. a local stand-in server
+            fresh_seconds: Optional, seconds device data is answered from the
+                cache without a request, 0 to disable the cache
+            max_stale_seconds: Optional, seconds older device data is still
+                answered from the cache while it is refreshed in the background
 
         Returns:
             The MasterthermAPI object
@@ -80,6 +127,18 @@ class MasterthermAPI:
         self.__api_version = api_version
         self.__token = None
         self.__expires = None
+        self.__token_lock = asyncio.Lock()
+        # Key to the write generation, read task and callers waiting for it.
+        self.__inflight: dict[tuple, list] = {}
+        self.__write_generation = 0
+        self.__fresh_seconds = fresh_seconds
+        self.__max_stale_seconds = max(max_stale_seconds, fresh_seconds)
+        # Per device the time cached, the lastUpdateTime requested and response.
+        self.__data_cache: dict[tuple, tuple[float, str | None, dict]] = {}
+        self.__revalidating: set[asyncio.Task] = set()
+        self.__base_url = base_url or (
+            URL_BASE if api_version == "v1" else URL_BASE_NEW
+        )
 
         # Setup the Session Details based on if Old or New API.
         codeduser = quote_plus(username)
@@ -112,16 +171,16 @@ class MasterthermAPI:
     async def __post(self, url: str, params: str) -> dict:
         """Push updates to the API."""
         if await self.__token_expired():
-            _LOGGER.info("__post: Token Expired, Refreshing Token.")
-            await self.__connect_refresh()
+            await self.__token_refresh("__post")
 
         _LOGGER.debug("__post: data to: %s, params: %s", url, params)
+        start = time.perf_counter()
         try:
             if self.__api_version == "v1":
                 # Original uses post, with Cookie Token
                 cookies = {"PHPSESSID": self.__token, "$version": "1"}
                 response = await self.__session.post(
-                    urljoin(URL_BASE, url),
+                    urljoin(self.__base_url, url),
                     data=params,
                     headers={"Content-Type": "application/x-www-form-urlencoded"},
                     cookies=cookies,
@@ -129,7 +188,7 @@ class MasterthermAPI:
             else:
                 # New uses get, with Authorization Bearer
                 response = await self.__session.post(
-                    urljoin(URL_BASE_NEW, url),
+                    urljoin(self.__base_url, url),
                     data=params,
                     headers={
                         "Authorization": f"Bearer {self.__token}",
@@ -144,9 +203,19 @@ class MasterthermAPI:
                 response.status,
                 await response.text(),
             )
+            await self.__record_request(url, params, start, response)
+
+            decode_start = time.perf_counter()
             response_json = await response.json()
+            METRICS.inc(
+                "decode_seconds_total",
+                time.perf_counter() - decode_start,
+                transport="api",
+            )
         except ClientConnectionError as ex:
             _LOGGER.error("Client Connection Error: %s", ex)
+            METRICS.inc("requests_total", transport="api", operation=url)
+            METRICS.inc("request_errors_total", transport="api", operation=url)
             raise MasterthermConnectionError("3", "Client Connection Error") from ex
         except JSONDecodeError as ex:
             response_text = await response.text()
@@ -188,16 +257,16 @@ class MasterthermAPI:
     async def __get(self, url: str, params: str) -> dict:
         """Get updates from the API, for old this mostly uses Post."""
         if await self.__token_expired():
-            _LOGGER.info("__get: Token Expired, Refreshing Token.")
-            await self.__connect_refresh()
+            await self.__token_refresh("__get")
 
         _LOGGER.debug("__get: data from: %s", url)
+        start = time.perf_counter()
         try:
             if self.__api_version == "v1":
                 # Original uses post, with Cookie Token
                 cookies = {"PHPSESSID": self.__token, "$version": "1"}
                 response = await self.__session.post(
-                    urljoin(URL_BASE, url),
+                    urljoin(self.__base_url, url),
                     data=params,
                     headers={"content-type": "application/x-www-form-urlencoded"},
                     cookies=cookies,
@@ -205,7 +274,7 @@ class MasterthermAPI:
             else:
                 # New uses get, with Authorization Bearer
                 response = await self.__session.get(
-                    urljoin(URL_BASE_NEW, url),
+                    urljoin(self.__base_url, url),
                     params=params,
                     headers={
                         "Authorization": f"Bearer {self.__token}",
@@ -219,9 +288,19 @@ class MasterthermAPI:
                 response.status,
                 await response.text(),
             )
+            await self.__record_request(url, params, start, response)
+
+            decode_start = time.perf_counter()
             response_json = await response.json()
+            METRICS.inc(
+                "decode_seconds_total",
+                time.perf_counter() - decode_start,
+                transport="api",
+            )
         except ClientConnectionError as ex:
             _LOGGER.error("Client Connection Error: %s", ex)
+            METRICS.inc("requests_total", transport="api", operation=url)
+            METRICS.inc("request_errors_total", transport="api", operation=url)
             raise MasterthermConnectionError("3", "Client Connection Error") from ex
         except JSONDecodeError as ex:
             response_text = await response.text()
@@ -259,26 +338,54 @@ class MasterthermAPI:
 
         return response_json
 
+    async def __record_request(
+        self, url: str, params: str, start: float, response: ClientResponse
+    ) -> None:
+        """Record a completed request, its size and latency in the metrics."""
+        METRICS.inc("requests_total", transport="api", operation=url)
+        METRICS.observe(
+            "request_seconds",
+            time.perf_counter() - start,
+            transport="api",
+            operation=url,
+        )
+        METRICS.inc("bytes_sent_total", len(params), transport="api")
+        METRICS.inc("bytes_received_total", len(await response.read()), transport="api")
+        if response.status != 200:
+            METRICS.inc("request_errors_total", transport="api", operation=url)
+
+    async def __token_refresh(self, caller: str) -> None:
+        """Refresh an expired token once, concurrent callers wait for it."""
+        async with self.__token_lock:
+            if await self.__token_expired():
+                _LOGGER.info("%s: Token Expired, Refreshing Token.", caller)
+                await self.__connect_refresh()
+
     async def __connect_refresh(self) -> dict:
         """Perform the Connect only or refresh token."""
         # Connect based on requirements
         if self.__api_version == "v1":
             # Clear out cookies, clears the auth token.
-            url = urljoin(URL_BASE, URL_LOGIN)
+            url = URL_LOGIN
         else:
-            url = urljoin(URL_BASE_NEW, URL_LOGIN_NEW)
+            url = URL_LOGIN_NEW
 
+        start = time.perf_counter()
         try:
             response = await self.__session.post(
-                url,
+                urljoin(self.__base_url, url),
                 data=self.__login_params,
                 cookies={"PHPSESSID": "", "$version": "1"},
                 headers={"content-type": "application/x-www-form-urlencoded"},
             )
         except ClientConnectionError as ex:
             _LOGGER.warning("Connection Error: %s", ex)
+            METRICS.inc("requests_total", transport="api", operation=url)
+            METRICS.inc("request_errors_total", transport="api", operation=url)
             raise MasterthermConnectionError("3", "Client Connection Error") from ex
 
+        await self.__record_request(url, self.__login_params, start, response)
+
         # Response shoudl always be 200 even for login failures
         if response.status != 200:
             error_msg = await response.text()
@@ -319,6 +426,70 @@ class MasterthermAPI:
 
         return response_json
 
+    async def __before_retry(
+        self, error: MasterthermError, deadline: float | None
+    ) -> None:
+        """Wait before retrying a failed request, a timed out server gets a pause.
+
+        Raises:
+            MasterthermError: The error given, if the deadline leaves no time.
+
+        """
+        delay = RETRY_DELAY if isinstance(error, MasterthermServerTimeoutError) else 0
+        left = remaining(deadline)
+        if left is not None and left <= delay:
+            raise error
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def __coalesce(
+        self, key: tuple, request: Any, deadline: float | None = None
+    ) -> dict:
+        """Share an identical read already in flight instead of repeating it.
+
+        A read is only shared while no write has completed since it started,
+        so a caller never gets data older than a write it has seen complete.
+        The response is shared between the callers, it must not be modified.
+        Each caller waits until its own deadline, the read is cancelled when
+        no caller is waiting for it any more, so the read itself is made
+        without a deadline rather than the one of the caller starting it.
+        """
+
+        def finished(done: asyncio.Future) -> None:
+            if self.__inflight.get(key, (None, None))[1] is done:
+                del self.__inflight[key]
+            # Retrieve the exception in case every caller was cancelled.
+            if not done.cancelled():
+                done.exception()
+
+        inflight = self.__inflight.get(key)
+        if inflight is not None and inflight[0] == self.__write_generation:
+            METRICS.inc("requests_coalesced_total", transport="api", operation=key[0])
+        else:
+            task = asyncio.ensure_future(request())
+            task.add_done_callback(finished)
+            inflight = [self.__write_generation, task, 0]
+            self.__inflight[key] = inflight
+
+        task = inflight[1]
+        inflight[2] += 1
+        try:
+            async with within(deadline, key[0]):
+                return await asyncio.shield(task)
+        finally:
+            inflight[2] -= 1
+            if inflight[2] == 0 and not task.done():
+                task.cancel()
+                # Later callers start a new read, not join the cancelled one.
+                if self.__inflight.get(key) is inflight:
+                    del self.__inflight[key]
+
+    @property
+    def cached_devices(self) -> int:
+        """Return the number of devices with device data cached."""
+        return len(self.__data_cache)
+
     def get_url(self) -> str:
         """Return the API URL Used.
 
@@ -326,14 +497,14 @@ class MasterthermAPI:
             URL(str): The API URL for the version.
 
         """
-        if self.__api_version == "v1":
-            return URL_BASE
-        else:
-            return URL_BASE_NEW
+        return self.__base_url
 
-    async def connect(self) -> dict:
+    async def connect(self, deadline: float | None = None) -> dict:
         """Perform the connection to the Mastertherm API Server.
 
+        Args:
+            deadline: Optional, the loop time to finish by, see deadline.within
+
         Returns:
              devices (dict): Return the list of devices, modules and units.
 
@@ -341,12 +512,14 @@ class MasterthermAPI:
             MasterthermConnectionError - Failed to Connect
             MasterthermAuthenticationError - Failed to Authenticate
             MasterthermUnsupportedRole - Role is not in supported roles
+            MasterthermDeadlineError - The deadline passed.
 
         """
-        response_json = await self.__connect_refresh()
-        if self.__api_version == "v2":
-            # Get the Modules as this now has moved to outside of the auth process
-            response_json = await self.__get(url=URL_MODULES_NEW, params="")
+        async with within(deadline, "connect"):
+            response_json = await self.__connect_refresh()
+            if self.__api_version == "v2":
+                # Get the Modules as this now has moved to outside of the auth process
+                response_json = await self.__get(url=URL_MODULES_NEW, params="")
 
         # Next is same for old and new process, doing a double check just incase
         if response_json["returncode"] != 0:
@@ -362,12 +535,18 @@ class MasterthermAPI:
 
         return response_json
 
-    async def get_device_info(self, module_id: str, unit_id: str) -> dict:
+    async def get_device_info(
+        self, module_id: str, unit_id: str, deadline: float | None = None
+    ) -> dict:
         """Get the Device information.
 
+        An identical call already in flight is shared, not repeated, unless a
+        write has completed since it started.
+
         Args:
             module_id: This is the module_id for the unit
             unit_id: This is the unit id for the unit
+            deadline: Optional, the loop time to finish by, see deadline.within
 
         Return:
             device_info (dict): Information for a specific device.
@@ -377,9 +556,20 @@ class MasterthermAPI:
             MasterthermTokenInvalid - Token has expired or is invalid
             MasterthermResponseFormatError - Some other issue, probably temporary
             MasterthermServerTimeoutError - Server Timed Out more than once.
+            MasterthermDeadlineError - The deadline passed.
 
         """
-        retry = False
+        return await self.__coalesce(
+            ("info", module_id, unit_id),
+            lambda: self.__request_device_info(module_id, unit_id, None),
+            deadline,
+        )
+
+    async def __request_device_info(
+        self, module_id: str, unit_id: str, deadline: float | None
+    ) -> dict:
+        """Request the Device information, see get_device_info."""
+        error: MasterthermError | None = None
         params = f"moduleid={module_id}&unitid={unit_id}&application=android"
 
         _LOGGER.info("Get Device Info %s:%s", module_id, unit_id)
@@ -390,14 +580,14 @@ class MasterthermAPI:
             )
         except MasterthermTokenInvalid as ex:
             _LOGGER.info("Token Expired Early Retry: %s:%s", ex.status, ex.message)
-            retry = True
+            error = ex
             self.__expires = None
         except MasterthermServerTimeoutError as ex:
             _LOGGER.info("API Timed Out Retry: %s:%s", ex.status, ex.message)
-            retry = True
+            error = ex
 
-        if retry:
-            await asyncio.sleep(0.5)
+        if error is not None:
+            await self.__before_retry(error, deadline)
             response_json = await self.__get(
                 url=URL_PUMPINFO if self.__api_version == "v1" else URL_PUMPINFO_NEW,
                 params=params,
@@ -406,14 +596,30 @@ class MasterthermAPI:
         return response_json
 
     async def get_device_data(
-        self, module_id: str, unit_id: str, last_update_time: str | None = None
+        self,
+        module_id: str,
+        unit_id: str,
+        last_update_time: str | None = None,
+        deadline: float | None = None,
     ) -> dict:
         """Get the Device lastest data.
 
+        An identical call already in flight is shared, not repeated, unless a
+        write has completed since it started.
+
+        With the cache enabled a response younger than fresh_seconds is
+        returned without a request. One younger than max_stale_seconds is
+        returned with "stale" set to True while it is refreshed in the
+        background, as is any cached response when the server times out.
+        One response is cached per device, it answers a request for the
+        changes since any time between the one it was requested for and its
+        timestamp.
+
         Args:
             module_id: This is the module_id for the unit
             unit_id: This is the unit id for the unit
             last_update_time: Optional last update date in number format
+            deadline: Optional, the loop time to finish by, see deadline.within
 
         Return:
             device_data (dict): data or updated data for a specific device.
@@ -424,9 +630,81 @@ class MasterthermAPI:
             MasterthermResponseFormatError - Some other issue, probably temporary
             MasterthermPumpDisconnected - Pump is unavailable, disconnected or offline.
             MasterthermServerTimeoutError - Server Timed Out more than once.
+            MasterthermDeadlineError - The deadline passed.
 
         """
-        retry = False
+        key = ("data", module_id, unit_id, last_update_time)
+        if self.__fresh_seconds <= 0:
+            return await self.__revalidate(key, deadline, cache=False)
+
+        cached = self.__cached(module_id, unit_id, last_update_time)
+        age = time.monotonic() - cached[0] if cached is not None else None
+        if age is not None and age <= self.__fresh_seconds:
+            METRICS.inc("cache_hits_total", transport="api", state="fresh")
+            return cached[2]
+
+        if age is not None and age <= self.__max_stale_seconds:
+            METRICS.inc("cache_hits_total", transport="api", state="stale")
+            task = asyncio.create_task(self.__revalidate(key))
+            self.__revalidating.add(task)
+            task.add_done_callback(self.__revalidated)
+            return {**cached[2], "stale": True}
+
+        try:
+            return await self.__revalidate(key, deadline)
+        except (MasterthermServerTimeoutError, MasterthermDeadlineError):
+            if cached is None:
+                raise
+            _LOGGER.warning(
+                "API Timed Out, using data %.0fs old: %s:%s", age, module_id, unit_id
+            )
+            return {**cached[2], "stale": True}
+
+    def __cached(
+        self, module_id: str, unit_id: str, last_update_time: str | None
+    ) -> tuple[float, str | None, dict] | None:
+        """Return the cached response for a device if it answers the request."""
+        cached = self.__data_cache.get((module_id, unit_id))
+        if cached is None:
+            return None
+
+        since, timestamp = cached[1], cached[2].get("timestamp")
+        if last_update_time is None:
+            return cached if since is None else None
+        if since is not None and int(last_update_time) < int(since):
+            return None
+        if timestamp is None or int(last_update_time) > int(timestamp):
+            return None
+        return cached
+
+    def __revalidated(self, task: asyncio.Task) -> None:
+        """Forget a background refresh, a failure keeps the stale data."""
+        self.__revalidating.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            _LOGGER.info("Background Device Data Refresh Failed: %s", task.exception())
+
+    async def __revalidate(
+        self, key: tuple, deadline: float | None = None, cache: bool = True
+    ) -> dict:
+        """Request the device data and cache the response."""
+        generation = self.__write_generation
+        response_json = await self.__coalesce(
+            key, lambda: self.__request_device_data(*key[1:], None), deadline
+        )
+        # A response started before a write may not show it, do not keep it.
+        if cache and generation == self.__write_generation:
+            self.__data_cache[key[1:3]] = (time.monotonic(), key[3], response_json)
+        return response_json
+
+    async def __request_device_data(
+        self,
+        module_id: str,
+        unit_id: str,
+        last_update_time: str | None,
+        deadline: float | None,
+    ) -> dict:
+        """Request the Device latest data, see get_device_data."""
+        error: MasterthermError | None = None
         params = f"moduleId={module_id}&deviceId={unit_id}&application=android&"
         if last_update_time is None:
             params = (
@@ -447,14 +725,14 @@ class MasterthermAPI:
             )
         except MasterthermTokenInvalid as ex:
             _LOGGER.info("Token Expired Early Retrying: %s:%s", ex.status, ex.message)
-            retry = True
+            error = ex
             self.__expires = None
         except MasterthermServerTimeoutError as ex:
             _LOGGER.info("API Timed Out Retry: %s:%s", ex.status, ex.message)
-            retry = True
+            error = ex
 
-        if retry:
-            await asyncio.sleep(0.5)
+        if error is not None:
+            await self.__before_retry(error, deadline)
             response_json = await self.__get(
                 url=URL_PUMPDATA if self.__api_version == "v1" else URL_PUMPDATA_NEW,
                 params=params,
@@ -467,29 +745,23 @@ class MasterthermAPI:
 
         # No error process the response.
         if response_json["data"] != {}:
-            data_file = ""
-            if self.__api_version == "v1":
-                if "varfile_mt1_config1" in response_json["data"]:
-                    data_file = "varfile_mt1_config1"
-                elif "varfile_mt1_config2" in response_json["data"]:
-                    data_file = "varfile_mt1_config2"
-            elif self.__api_version == "v2":
-                data_file = "varFileData"
-
-            response_json["data"]["varData"] = response_json["data"][data_file]
-            del response_json["data"][data_file]
-
-            # Sort the Data
-            sorted_reg = {}
-            device_reg = response_json["data"]["varData"][str(unit_id).zfill(3)]
-            for key in natsorted(device_reg.keys()):
-                sorted_reg[key] = device_reg[key]
-            response_json["data"]["varData"][str(unit_id).zfill(3)] = sorted_reg
+            decode_start = time.perf_counter()
+            sort_device_data(response_json, self.__api_version, unit_id)
+            METRICS.inc(
+                "decode_seconds_total",
+                time.perf_counter() - decode_start,
+                transport="api",
+            )
 
         return response_json
 
     async def set_device_data(
-        self, module_id: str, unit_id: str, register: str, value: Any
+        self,
+        module_id: str,
+        unit_id: str,
+        register: str,
+        value: Any,
+        deadline: float | None = None,
     ) -> bool:
         """Set device data a specific register to a specific value.
 
@@ -501,6 +773,7 @@ class MasterthermAPI:
             unit_id: This is the unit id for the unit
             register: The Register to update
             value: The value to set.
+            deadline: Optional, the loop time to finish by, see deadline.within
 
         Return:
            success (bool): return true if succes and false if not.
@@ -510,9 +783,30 @@ class MasterthermAPI:
             MasterthermTokenInvalid - Token has expired or is invalid
             MasterthermResponseFormatError - Some other issue, probably temporary
             MasterthermServerTimeoutError - Server Timed Out more than once.
+            MasterthermDeadlineError - The deadline passed, the write may still
+                have been made.
 
         """
-        retry = False
+        try:
+            async with within(deadline, "set_device_data"):
+                return await self.__request_set_device_data(
+                    module_id, unit_id, register, value, deadline
+                )
+        finally:
+            # Reads started before the write completed are not shared again.
+            self.__write_generation += 1
+            self.__data_cache.pop((module_id, unit_id), None)
+
+    async def __request_set_device_data(
+        self,
+        module_id: str,
+        unit_id: str,
+        register: str,
+        value: Any,
+        deadline: float | None,
+    ) -> bool:
+        """Request a register is set, see set_device_data."""
+        error: MasterthermError | None = None
         params = (
             f"moduleId={module_id}&deviceId={unit_id}&"
             + "configFile=varfile_mt1_config&messageId=1&errorResponse=true&"
@@ -529,14 +823,14 @@ class MasterthermAPI:
             )
         except MasterthermTokenInvalid as ex:
             _LOGGER.info("Token Expired Early Retrying: %s:%s", ex.status, ex.message)
-            retry = True
+            error = ex
             self.__expires = None
         except MasterthermServerTimeoutError as ex:
             _LOGGER.info("API Timed Out Retry: %s:%s", ex.status, ex.message)
-            retry = True
+            error = ex
 
-        if retry:
-            await asyncio.sleep(0.5)
+        if error is not None:
+            await self.__before_retry(error, deadline)
             response_json = await self.__post(
                 url=(
                     URL_POSTUPDATE if self.__api_version == "v1" else URL_POSTUPDATE_NEW
@@ -0,0 +1,382 @@
+"""Mastertherm API Stand-in Server, for testing and benchmarking offline."""
+
+import asyncio
+import logging
+import random
+import secrets
+import time
+from typing import Any
+
+from aiohttp import web
+
+from masterthermconnect.const import (
+    DATE_FORMAT,
+    URL_LOGIN,
+    URL_LOGIN_NEW,
+    URL_MODULES_NEW,
+    URL_POSTUPDATE,
+    URL_POSTUPDATE_NEW,
+    URL_PUMPDATA,
+    URL_PUMPDATA_NEW,
+    URL_PUMPINFO,
+    URL_PUMPINFO_NEW,
+)
+from masterthermconnect.simulator import DEFAULT_REGISTERS
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+# Device info returned for every unit, pco5 with exp 0 maps to mt_0.
+DEFAULT_INFO = {
+    "returncode": 0,
+    "givenname": "Test",
+    "surname": "User",
+    "localization": "UK",
+    "lang": "en",
+    "type": "AQI",
+    "regulation": "pco5",
+    "serialnumber": "12345",
+    "exp": "0",
+    "output": "10",
+    "reversation": "0",
+    "padz": "Home",
+}
+
+
+class MasterthermAPISimulator:
+    """Local HTTP server answering like the v1 or v2 Mastertherm API.
+
+    Any username and password is accepted. Each account has modules with
+    units, every unit holds A_, D_ and I_ registers as the API strings.
+    Incremental data requests only return the registers changed since the
+    lastUpdateTime sent.
+    """
+
+    def __init__(
+        self,
+        api_version: str = "v1",
+        host: str = "127.0.0.1",
+        port: int = 0,
+        modules: int = 1,
+        units: int = 1,
+        register_count: int = 600,
+        latency: float = 0.0,
+        drift: float = 0.0,
+        token_lifetime: int = 3600,
+        seed: int | None = None,
+    ) -> None:
+        """Initialise the Simulator.
+
+        Args:
+            api_version: The API to answer as, v1 or v2
+            host: The address to listen on
+            port: The port to listen on, 0 to use any free port
+            modules: The number of modules per account
+            units: The number of units per module
+            register_count: The number of A_, D_ and I_ registers per unit
+            latency: Seconds added to every request
+            drift: Maximum change of the analog values per data request
+            token_lifetime: Seconds a login token is valid for
+            seed: Optional seed for repeatable drift
+
+        Raises:
+            ValueError: Invalid version, must be one of v1 or v2
+
+        """
+        if api_version not in ("v1", "v2"):
+            raise ValueError("Invalid version, must be one of v1 or v2")
+
+        self.api_version = api_version
+        self._host = host
+        self._port = port
+        self._module_count = modules
+        self._unit_count = units
+        self._register_count = register_count
+        self.latency = latency
+        self.drift = drift
+        self.token_lifetime = token_lifetime
+        self._random = random.Random(seed)
+
+        self._runner: web.AppRunner | None = None
+        self._tokens: dict[str, str] = {}
+        self._accounts: dict[str, list[str]] = {}
+        self._devices: dict[tuple[str, str], dict[str, Any]] = {}
+        self._timestamp = int(time.time())
+
+        self.error_status: int | None = None
+        self.requests = 0
+        self.requests_by_path: dict[str, int] = {}
+
+    @property
+    def port(self) -> int:
+        """Return the port the simulator is listening on."""
+        if self._runner and self._runner.addresses:
+            return self._runner.addresses[0][1]
+        return self._port
+
+    @property
+    def url(self) -> str:
+        """Return the base URL to pass to MasterthermAPI."""
+        return f"http://{self._host}:{self.port}"
+
+    def _tick(self) -> int:
+        """Return a new timestamp, always later than the last."""
+        self._timestamp = max(self._timestamp + 1, int(time.time()))
+        return self._timestamp
+
+    def _new_device(self) -> dict[str, Any]:
+        """Return the registers and change times for a new unit."""
+        registers: dict[str, str] = {}
+        for prefix in ("A", "D", "I"):
+            for index in range(self._register_count):
+                registers[f"{prefix}_{index}"] = "0"
+        for register, value in DEFAULT_REGISTERS.items():
+            if register in registers:
+                registers[register] = str(int(value) if register[0] == "D" else value)
+
+        timestamp = self._tick()
+        return {
+            "registers": registers,
+            "changed": dict.fromkeys(registers, timestamp),
+        }
+
+    def account(self, username: str) -> list[str]:
+        """Return the module ids of an account, created on first use."""
+        if username not in self._accounts:
+            first = 10000 + len(self._accounts) * self._module_count
+            modules = [str(first + i) for i in range(self._module_count)]
+            for module_id in modules:
+                for unit in range(1, self._unit_count + 1):
+                    self._devices[(module_id, str(unit))] = self._new_device()
+            self._accounts[username] = modules
+
+        return self._accounts[username]
+
+    def set_register(
+        self, module_id: str, unit_id: str, register: str, value: Any
+    ) -> None:
+        """Set a register of a unit, it is returned by the next data request."""
+        device = self._devices[(module_id, unit_id)]
+        if isinstance(value, bool):
+            value = int(value)
+        device["registers"][register] = str(value)
+        device["changed"][register] = self._tick()
+
+    def get_register(self, module_id: str, unit_id: str, register: str) -> str:
+        """Get a register of a unit as the API string."""
+        return self._devices[(module_id, unit_id)]["registers"][register]
+
+    def _apply_drift(self, module_id: str, unit_id: str) -> None:
+        """Random walk the analog defaults of a unit."""
+        if not self.drift:
+            return
+
+        for register, base in DEFAULT_REGISTERS.items():
+            if register[0] != "A":
+                continue
+            value = float(self.get_register(module_id, unit_id, register))
+            value += self._random.uniform(-self.drift, self.drift)
+            value = min(max(value, base - 5.0), base + 5.0)
+            self.set_register(module_id, unit_id, register, round(value, 1))
+
+    async def _params(self, request: web.Request) -> dict[str, str]:
+        """Return the query and form parameters of a request."""
+        params = dict(request.query)
+        if request.method == "POST":
+            params.update(await request.post())
+        return params
+
+    def _authorized(self, request: web.Request) -> str | None:
+        """Return the username for the token in the request."""
+        if self.api_version == "v1":
+            token = request.cookies.get("PHPSESSID", "")
+        else:
+            token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        return self._tokens.get(token)
+
+    def _not_logged_in(self) -> web.Response:
+        """Return the response for an unknown or expired token."""
+        if self.api_version == "v1":
+            return web.Response(text="User not logged in")
+        return web.json_response(
+            {"status": {"id": 401, "message": "Unauthorized"}}, status=401
+        )
+
+    def _modules_response(self, username: str) -> dict[str, Any]:
+        """Return the login or modules response listing the account devices."""
+        return {
+            "returncode": 0,
+            "message": "",
+            "role": "400",
+            "modules": [
+                {
+                    "id": module_id,
+                    "module_name": f"Module {module_id}",
+                    "config": [
+                        {"mb_addr": str(unit), "mb_name": f"Unit {unit}"}
+                        for unit in range(1, self._unit_count + 1)
+                    ],
+                }
+                for module_id in self.account(username)
+            ],
+        }
+
+    def _data_file(self) -> str:
+        """Return the name the register data is returned under."""
+        return "varfile_mt1_config1" if self.api_version == "v1" else "varFileData"
+
+    @web.middleware
+    async def _middleware(
+        self, request: web.Request, handler: Any
+    ) -> web.StreamResponse:
+        """Count requests, apply the latency and any error status."""
+        self.requests += 1
+        self.requests_by_path[request.path] = (
+            self.requests_by_path.get(request.path, 0) + 1
+        )
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        if self.error_status is not None:
+            return web.Response(status=self.error_status, text="Simulated error")
+        return await handler(request)
+
+    async def _login(self, request: web.Request) -> web.Response:
+        """Log in any user, the token is a cookie for v1 and JSON for v2."""
+        params = await self._params(request)
+        username = params.get("uname") or params.get("username", "")
+        token = secrets.token_hex(16)
+        self._tokens[token] = username
+
+        if self.api_version == "v2":
+            self.account(username)
+            return web.json_response(
+                {"access_token": token, "expires_in": self.token_lifetime}
+            )
+
+        response = web.json_response(self._modules_response(username))
+        expires = time.strftime(
+            DATE_FORMAT.replace("%Z", "GMT"),
+            time.gmtime(time.time() + self.token_lifetime),
+        )
+        response.set_cookie("PHPSESSID", token, expires=expires)
+        return response
+
+    async def _modules(self, request: web.Request) -> web.Response:
+        """Return the modules of the account, v2 only."""
+        username = self._authorized(request)
+        if username is None:
+            return self._not_logged_in()
+        return web.json_response(self._modules_response(username))
+
+    async def _info(self, request: web.Request) -> web.Response:
+        """Return the device info."""
+        if self._authorized(request) is None:
+            return self._not_logged_in()
+        return web.json_response(DEFAULT_INFO)
+
+    async def _data(self, request: web.Request) -> web.Response:
+        """Return all registers, or those changed since lastUpdateTime."""
+        if self._authorized(request) is None:
+            return self._not_logged_in()
+
+        params = await self._params(request)
+        module_id = params.get("moduleId", "")
+        unit_id = params.get("deviceId", "")
+        if (module_id, unit_id) not in self._devices:
+            return web.json_response(
+                {
+                    "error": {"errorId": 9, "errorMessage": "Device not found"},
+                    "data": {},
+                }
+            )
+
+        self._apply_drift(module_id, unit_id)
+        device = self._devices[(module_id, unit_id)]
+        since = int(params.get("lastUpdateTime", "0") or 0)
+        registers = {
+            register: value
+            for register, value in device["registers"].items()
+            if device["changed"][register] > since
+        }
+
+        data: dict[str, Any] = {}
+        if registers:
+            data = {self._data_file(): {unit_id.zfill(3): registers}}
+        return web.json_response(
+            {
+                "error": {"errorId": 0, "errorMessage": ""},
+                "timestamp": self._timestamp,
+                "data": data,
+            }
+        )
+
+    async def _update(self, request: web.Request) -> web.Response:
+        """Set a register and echo the value set."""
+        if self._authorized(request) is None:
+            return self._not_logged_in()
+
+        params = await self._params(request)
+        module_id = params.get("moduleId", "")
+        unit_id = params.get("deviceId", "")
+        register = params.get("variableId", "")
+        value = params.get("variableValue", "")
+        if (module_id, unit_id) not in self._devices:
+            return web.json_response(
+                {"error": {"errorId": 9, "errorMessage": "Device not found"}}
+            )
+
+        self.set_register(module_id, unit_id, register, value)
+
+        # Echo numbers back as numbers so the caller can compare the value.
+        echo: Any = value
+        for convert in (int, float):
+            try:
+                echo = convert(value)
+                break
+            except ValueError:
+                continue
+
+        data_file = "varfile_mt1_config1" if self.api_version == "v1" else "data"
+        return web.json_response(
+            {
+                "error": {"errorId": 0, "errorMessage": ""},
+                "data": {data_file: {unit_id.zfill(3): {register: echo}}},
+            }
+        )
+
+    def _app(self) -> web.Application:
+        """Return the application with the routes for the API version."""
+        app = web.Application(middlewares=[self._middleware])
+        if self.api_version == "v1":
+            app.router.add_post(URL_LOGIN, self._login)
+            app.router.add_post(URL_PUMPINFO, self._info)
+            app.router.add_post(URL_PUMPDATA, self._data)
+            app.router.add_post(URL_POSTUPDATE, self._update)
+        else:
+            app.router.add_post(URL_LOGIN_NEW, self._login)
+            app.router.add_get(URL_MODULES_NEW, self._modules)
+            app.router.add_get(URL_PUMPINFO_NEW, self._info)
+            app.router.add_get(URL_PUMPDATA_NEW, self._data)
+            app.router.add_post(URL_POSTUPDATE_NEW, self._update)
+        return app
+
+    async def start(self) -> None:
+        """Start listening in the background."""
+        self._runner = web.AppRunner(self._app(), access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self._host, self._port).start()
+        _LOGGER.info("API Simulator listening on %s", self.url)
+
+    async def stop(self) -> None:
+        """Stop the simulator."""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "MasterthermAPISimulator":
+        """Start the simulator as a context manager."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        """Stop the simulator."""
+        await self.stop()
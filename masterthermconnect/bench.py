@@ -0,0 +1,184 @@
+"""Benchmark controller polls over the API or Modbus, live or against a stand-in."""
+
+import logging
+import math
+import platform
+import time
+import tracemalloc
+from contextlib import AsyncExitStack
+from typing import Any
+
+from aiohttp import ClientSession, ClientTimeout
+
+from masterthermconnect.__version__ import __version__
+from masterthermconnect.apisimulator import MasterthermAPISimulator
+from masterthermconnect.controller import MasterthermController
+from masterthermconnect.metrics import METRICS
+from masterthermconnect.profiling import MasterthermProfiler
+from masterthermconnect.simulator import MasterthermModbusSimulator
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+# Counter totals per transport compared before and after the polls.
+BENCH_COUNTERS = [
+    "requests_total",
+    "request_errors_total",
+    "bytes_sent_total",
+    "bytes_received_total",
+    "decode_seconds_total",
+]
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """Return the nearest rank percentile of the values, 0.0 if empty."""
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    rank = math.ceil(percent / 100 * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+def _totals(transport: str) -> dict[str, float]:
+    """Return the current counter totals for a transport."""
+    return {name: METRICS.total(name, transport=transport) for name in BENCH_COUNTERS}
+
+
+async def _poll(controller: MasterthermController, full_load: bool) -> int:
+    """Refresh all devices once, returns the number of devices that failed."""
+    results = await controller.refresh_devices(full_load=full_load)
+    return sum(1 for result in results.values() if result is not True)
+
+
+async def run_bench(
+    transport: str,
+    polls: int = 20,
+    full_load: bool = False,
+    api_version: str = "v1",
+    username: str | None = None,
+    password: str | None = None,
+    address: str | None = None,
+    mt_type: str = "mt_0",
+    port: int = 502,
+    latency: float = 0.0,
+    alloc_polls: int = 5,
+    profiler: MasterthermProfiler | None = None,
+) -> dict[str, Any]:
+    """Time polls through the controller and return the results.
+
+    Without a username for the API, or an address for Modbus, a local
+    stand-in server is started in this process. The stand-in allocations
+    are then included in the allocation figures.
+
+    Args:
+        transport: api or modbus
+        polls: The number of timed polls
+        full_load: Optional, reload all API data on every poll
+        api_version: The API version, v1 or v2
+        username: The API username for a live benchmark
+        password: The API password for a live benchmark
+        address: The heat pump IP Address for a live Modbus benchmark
+        mt_type: The Modbus register mapping, mt_0 or mt_1
+        port: The Modbus port for a live benchmark
+        latency: Seconds added to every stand-in request
+        alloc_polls: Extra polls made with tracemalloc on, 0 to skip
+        profiler: Optional, profile the timed polls, this slows them down
+
+    Returns:
+        results (dict): Latency percentiles and per poll round trips, bytes,
+            decode time and allocations.
+
+    Raises:
+        ValueError: Unknown transport, must be api or modbus
+
+    """
+    if transport not in ("api", "modbus"):
+        raise ValueError("Unknown transport, must be api or modbus")
+
+    live = (username if transport == "api" else address) is not None
+    controller = MasterthermController()
+
+    async with AsyncExitStack() as stack:
+        if transport == "api":
+            base_url = None
+            if not live:
+                simulator = await stack.enter_async_context(
+                    MasterthermAPISimulator(api_version, latency=latency)
+                )
+                base_url = simulator.url
+                username, password = "bench", "bench"
+
+            session = await stack.enter_async_context(
+                ClientSession(timeout=ClientTimeout(total=30))
+            )
+            await controller.enable_api(
+                username, password, session, api_version, base_url=base_url
+            )
+        else:
+            if not live:
+                modbus_simulator = await stack.enter_async_context(
+                    MasterthermModbusSimulator(mt_type, port=0, latency=latency)
+                )
+                address, port = "127.0.0.1", modbus_simulator.port
+
+            await controller.enable_modbus(address, mt_type, port=port)
+            stack.push_async_callback(controller.close)
+
+        await controller.connect()
+        # The first poll is a full load, later polls are incremental for the API.
+        await _poll(controller, True)
+
+        before = _totals(transport)
+        timings: list[float] = []
+        errors = 0
+        controller.profiler = profiler
+        for _ in range(polls):
+            start = time.perf_counter()
+            errors += await _poll(controller, full_load)
+            timings.append(time.perf_counter() - start)
+        controller.profiler = None
+        after = _totals(transport)
+
+        peaks: list[int] = []
+        if alloc_polls > 0:
+            tracing = tracemalloc.is_tracing()
+            if not tracing:
+                tracemalloc.start()
+            for _ in range(alloc_polls):
+                tracemalloc.reset_peak()
+                current = tracemalloc.get_traced_memory()[0]
+                await _poll(controller, full_load)
+                peaks.append(tracemalloc.get_traced_memory()[1] - current)
+            if not tracing:
+                tracemalloc.stop()
+
+    per_poll = {
+        name: (after[name] - before[name]) / polls if polls else 0.0
+        for name in BENCH_COUNTERS
+    }
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "transport": transport,
+        "api_version": api_version if transport == "api" else None,
+        "mt_type": mt_type if transport == "modbus" else None,
+        "target": "live" if live else "stand-in",
+        "polls": polls,
+        "full_load": full_load,
+        "profiled": profiler is not None,
+        "poll_errors": errors,
+        "latency_ms": {
+            "min": min(timings, default=0.0) * 1000,
+            "p50": percentile(timings, 50) * 1000,
+            "p95": percentile(timings, 95) * 1000,
+            "p99": percentile(timings, 99) * 1000,
+            "max": max(timings, default=0.0) * 1000,
+        },
+        "round_trips_per_poll": per_poll["requests_total"],
+        "request_errors_per_poll": per_poll["request_errors_total"],
+        "bytes_sent_per_poll": per_poll["bytes_sent_total"],
+        "bytes_received_per_poll": per_poll["bytes_received_total"],
+        "decode_ms_per_poll": per_poll["decode_seconds_total"] * 1000,
+        "alloc_peak_bytes_p50": percentile(peaks, 50),
+        "alloc_peak_bytes_max": max(peaks, default=0),
+    }
@@ -0,0 +1,502 @@
+"""Record and replay API and Modbus exchanges, with the credentials redacted."""
+
+import asyncio
+import json
+import logging
+import time
+from datetime import UTC, datetime
+from email.utils import parsedate_to_datetime
+from types import SimpleNamespace
+from typing import Any
+from urllib.parse import parse_qsl, urlencode
+
+from aiohttp import ClientSession, TraceConfig, web
+
+from masterthermconnect.const import DATE_FORMAT
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+CASSETTE_VERSION = 1
+REDACTED = "REDACTED"
+
+# Request parameters, JSON keys and cookies holding credentials or tokens.
+SECRET_KEYS = {
+    "uname",
+    "upwd",
+    "username",
+    "password",
+    "client_secret",
+    "token",
+    "access_token",
+    "refresh_token",
+    "id_token",
+    "PHPSESSID",
+}
+
+# Request parameters that pick the device an API response is for, data
+# requests use moduleId and deviceId, info requests moduleid and unitid.
+DEVICE_PARAMS = ("moduleId", "deviceId", "moduleid", "unitid")
+
+
+def redact_params(params: str) -> str:
+    """Return form or query parameters with the secret values redacted."""
+    return urlencode(
+        [
+            (key, REDACTED if key in SECRET_KEYS else value)
+            for key, value in parse_qsl(params, keep_blank_values=True)
+        ]
+    )
+
+
+def _redact_json(value: Any) -> Any:
+    """Return a JSON value with the secret keys redacted, at any depth."""
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if key in SECRET_KEYS else _redact_json(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_redact_json(item) for item in value]
+    return value
+
+
+def redact_body(body: bytes) -> str:
+    """Return a response body with the secret keys redacted if it is JSON."""
+    text = body.decode("utf-8", errors="replace")
+    try:
+        return json.dumps(_redact_json(json.loads(text)))
+    except ValueError:
+        return text
+
+
+class MasterthermCassette:
+    """Recorded API requests and Modbus transactions, in the order made.
+
+    Record the API by creating the ClientSession with trace_configs=[
+    cassette.trace_config()], and Modbus by passing client=cassette.record_modbus(
+    AsyncModbusTcpClient(...)) to enable_modbus. Credentials, tokens and the
+    session cookie are redacted as each exchange is recorded, an API request
+    once its response is fully read, the request headers are never recorded.
+
+    Replay the API with MasterthermReplayServer and base_url, and Modbus with
+    client=ReplayModbusClient(cassette), the same client code then runs.
+    """
+
+    def __init__(self, interactions: list[dict[str, Any]] | None = None) -> None:
+        """Initialise the Cassette.
+
+        Args:
+            interactions: Optional, recorded interactions e.g. from load
+
+        """
+        self._interactions: list[dict[str, Any]] = interactions or []
+        self._start: float | None = None
+
+    @property
+    def interactions(self) -> list[dict[str, Any]]:
+        """Return the interactions recorded, requests in flight are not included."""
+        return self._interactions
+
+    def _offset(self) -> float:
+        """Return the seconds since the first interaction was recorded."""
+        now = time.monotonic()
+        if self._start is None:
+            self._start = now
+        return now - self._start
+
+    def matching(self, transport: str) -> list[dict[str, Any]]:
+        """Return the interactions recorded for a transport, api or modbus."""
+        return [item for item in self.interactions if item["transport"] == transport]
+
+    @classmethod
+    def load(cls, path: str) -> "MasterthermCassette":
+        """Load a cassette saved with save.
+
+        Raises:
+            ValueError: The file is not a supported cassette.
+
+        """
+        with open(path, encoding="utf-8") as cassette_file:
+            saved = json.load(cassette_file)
+        if saved.get("version") != CASSETTE_VERSION:
+            raise ValueError(f"Unsupported cassette version {saved.get('version')}")
+        return cls(saved["interactions"])
+
+    def save(self, path: str) -> None:
+        """Save the cassette as JSON."""
+        with open(path, "w", encoding="utf-8") as cassette_file:
+            json.dump(
+                {"version": CASSETTE_VERSION, "interactions": self.interactions},
+                cassette_file,
+                indent=1,
+            )
+
+    def trace_config(self) -> TraceConfig:
+        """Return a trace config recording the requests of a ClientSession."""
+        trace = TraceConfig()
+        trace.on_request_start.append(self._on_request_start)
+        trace.on_request_chunk_sent.append(self._on_request_chunk_sent)
+        trace.on_request_end.append(self._on_request_end)
+        trace.on_response_chunk_received.append(self._on_response_chunk_received)
+        return trace
+
+    async def _on_request_start(
+        self, session: ClientSession, context: SimpleNamespace, params: Any
+    ) -> None:
+        """Start timing a request."""
+        context.start = time.perf_counter()
+        context.offset = self._offset()
+        context.sent = bytearray()
+        context.received = bytearray()
+
+    async def _on_request_chunk_sent(
+        self, session: ClientSession, context: SimpleNamespace, params: Any
+    ) -> None:
+        """Collect the request body."""
+        context.sent.extend(params.chunk)
+
+    async def _on_request_end(
+        self, session: ClientSession, context: SimpleNamespace, params: Any
+    ) -> None:
+        """Start the interaction once the response headers are received."""
+        response = params.response
+        cookies = {}
+        for name, morsel in response.cookies.items():
+            expires_in = None
+            if morsel["expires"]:
+                expires = parsedate_to_datetime(morsel["expires"])
+                expires_in = (expires - datetime.now(UTC)).total_seconds()
+            cookies[name] = {
+                "value": REDACTED if name in SECRET_KEYS else morsel.value,
+                "expires_in": expires_in,
+            }
+
+        context.interaction = {
+            "transport": "api",
+            "offset": context.offset,
+            "elapsed": time.perf_counter() - context.start,
+            "method": params.method,
+            "path": params.url.path,
+            "query": redact_params(params.url.query_string),
+            "params": redact_params(context.sent.decode("utf-8", errors="replace")),
+            "status": response.status,
+            "content_type": response.headers.get("Content-Type", ""),
+            "cookies": cookies,
+        }
+        context.response = response
+
+    async def _on_response_chunk_received(
+        self, session: ClientSession, context: SimpleNamespace, params: Any
+    ) -> None:
+        """Collect the response body, recording the interaction once read.
+
+        The body is redacted once, when the response has been fully read.
+        """
+        context.received.extend(params.chunk)
+        if context.response.content.at_eof() and "body" not in context.interaction:
+            context.interaction["body"] = redact_body(bytes(context.received))
+            self._interactions.append(context.interaction)
+
+    def record_modbus(self, client: Any) -> "RecordingModbusClient":
+        """Return a wrapper recording the transactions of a pymodbus client."""
+        return RecordingModbusClient(self, client)
+
+
+def _modbus_key(operation: str, address: int, slave: int) -> tuple[str, int, int]:
+    """Return the key a Modbus transaction is replayed by."""
+    return (operation, address, slave)
+
+
+class RecordingModbusClient:
+    """A pymodbus client wrapper recording each transaction in a cassette."""
+
+    def __init__(self, cassette: MasterthermCassette, client: Any) -> None:
+        """Initialise the Recorder."""
+        self._cassette = cassette
+        self._client = client
+
+    def __getattr__(self, name: str) -> Any:
+        """Pass anything not recorded to the client."""
+        return getattr(self._client, name)
+
+    async def connect(self) -> bool:
+        """Connect the client."""
+        return await self._client.connect()
+
+    def close(self) -> None:
+        """Close the client."""
+        self._client.close()
+
+    async def _record(
+        self,
+        operation: str,
+        address: int,
+        slave: int,
+        count: int | None = None,
+        values: list | None = None,
+    ) -> Any:
+        """Make and record a transaction."""
+        from pymodbus.exceptions import ModbusException
+
+        interaction: dict[str, Any] = {
+            "transport": "modbus",
+            "offset": self._cassette._offset(),
+            "operation": operation,
+            "address": address,
+            "slave": slave,
+            "count": count,
+            "values": [int(value) for value in values] if values else None,
+        }
+        start = time.perf_counter()
+        try:
+            if values is None:
+                result = await getattr(self._client, operation)(
+                    address, count=count, slave=slave
+                )
+            else:
+                result = await getattr(self._client, operation)(
+                    address, values, slave=slave
+                )
+        except ModbusException as ex:
+            interaction["elapsed"] = time.perf_counter() - start
+            interaction["exception"] = str(ex)
+            self._cassette._interactions.append(interaction)
+            raise
+
+        interaction["elapsed"] = time.perf_counter() - start
+        interaction["error"] = result.isError()
+        interaction["registers"] = list(getattr(result, "registers", None) or [])
+        interaction["bits"] = [bool(bit) for bit in getattr(result, "bits", None) or []]
+        self._cassette._interactions.append(interaction)
+        return result
+
+    async def read_holding_registers(
+        self, address: int, count: int = 1, slave: int = 1
+    ) -> Any:
+        """Read and record holding registers."""
+        return await self._record("read_holding_registers", address, slave, count)
+
+    async def read_coils(self, address: int, count: int = 1, slave: int = 1) -> Any:
+        """Read and record coils."""
+        return await self._record("read_coils", address, slave, count)
+
+    async def write_registers(self, address: int, values: list, slave: int = 1) -> Any:
+        """Write and record holding registers."""
+        return await self._record("write_registers", address, slave, values=values)
+
+    async def write_coils(self, address: int, values: list, slave: int = 1) -> Any:
+        """Write and record coils."""
+        return await self._record("write_coils", address, slave, values=values)
+
+
+class _Player:
+    """Hand out the recorded interactions in order per key, with their delay."""
+
+    def __init__(self, interactions: list[dict[str, Any]], key: Any, speed: float):
+        """Group the interactions by key."""
+        self.speed = speed
+        self._queues: dict[Any, list[dict[str, Any]]] = {}
+        self._next: dict[Any, int] = {}
+        for interaction in interactions:
+            self._queues.setdefault(key(interaction), []).append(interaction)
+
+    async def play(self, key: Any) -> dict[str, Any] | None:
+        """Return the next interaction for a key after its recorded delay.
+
+        Once all are used the last is repeated, None if none were recorded.
+        """
+        queue = self._queues.get(key)
+        if not queue:
+            return None
+
+        index = self._next.get(key, 0)
+        self._next[key] = index + 1
+        interaction = queue[min(index, len(queue) - 1)]
+        if self.speed > 0:
+            await asyncio.sleep(interaction["elapsed"] / self.speed)
+        return interaction
+
+
+class _ReplayResult:
+    """A recorded pymodbus response."""
+
+    def __init__(self, interaction: dict[str, Any]) -> None:
+        """Initialise from an interaction."""
+        self.registers = interaction["registers"]
+        self.bits = interaction["bits"]
+        self._error = interaction["error"]
+
+    def isError(self) -> bool:  # noqa: N802
+        """Return True if the response was an error."""
+        return self._error
+
+
+class ReplayModbusClient:
+    """A pymodbus compatible client answering from a cassette.
+
+    Transactions are matched by function, address and slave and replayed in
+    the order recorded, the last repeated once all are used.
+    """
+
+    def __init__(self, cassette: MasterthermCassette, speed: float = 1.0) -> None:
+        """Initialise the Replay.
+
+        Args:
+            cassette: The recorded cassette
+            speed: 1 for the recorded response times, 10 for ten times faster,
+                0 for no delays
+
+        """
+        self._player = _Player(
+            cassette.matching("modbus"),
+            lambda item: _modbus_key(item["operation"], item["address"], item["slave"]),
+            speed,
+        )
+        self.transactions = 0
+
+    async def connect(self) -> bool:
+        """Connect, always succeeds."""
+        return True
+
+    def close(self) -> None:
+        """Close, nothing to do."""
+
+    async def _replay(self, operation: str, address: int, slave: int) -> Any:
+        """Return the recorded response, raising a recorded exception."""
+        from pymodbus.exceptions import ModbusException
+
+        self.transactions += 1
+        interaction = await self._player.play(_modbus_key(operation, address, slave))
+        if interaction is None:
+            raise ModbusException(f"No recorded {operation} at {address}")
+        if "exception" in interaction:
+            raise ModbusException(interaction["exception"])
+        return _ReplayResult(interaction)
+
+    async def read_holding_registers(
+        self, address: int, count: int = 1, slave: int = 1
+    ) -> Any:
+        """Replay reading holding registers."""
+        return await self._replay("read_holding_registers", address, slave)
+
+    async def read_coils(self, address: int, count: int = 1, slave: int = 1) -> Any:
+        """Replay reading coils."""
+        return await self._replay("read_coils", address, slave)
+
+    async def write_registers(self, address: int, values: list, slave: int = 1) -> Any:
+        """Replay writing holding registers."""
+        return await self._replay("write_registers", address, slave)
+
+    async def write_coils(self, address: int, values: list, slave: int = 1) -> Any:
+        """Replay writing coils."""
+        return await self._replay("write_coils", address, slave)
+
+
+def _api_key(method: str, path: str, params: str) -> tuple:
+    """Return the key an API request is replayed by, the method, path and device."""
+    values = dict(parse_qsl(params, keep_blank_values=True))
+    return (method, path) + tuple(values.get(param) for param in DEVICE_PARAMS)
+
+
+class MasterthermReplayServer:
+    """HTTP server answering API requests from a cassette.
+
+    Requests are matched by method, path and device and answered in the
+    order recorded, the last repeated once all are used. Cookies are sent
+    with the recorded lifetime from now, so tokens do not expire early.
+    """
+
+    def __init__(
+        self,
+        cassette: MasterthermCassette,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        speed: float = 1.0,
+    ) -> None:
+        """Initialise the Server.
+
+        Args:
+            cassette: The recorded cassette
+            host: The address to listen on
+            port: The port to listen on, 0 to use any free port
+            speed: 1 for the recorded response times, 10 for ten times faster,
+                0 for no delays
+
+        """
+        self._host = host
+        self._port = port
+        self._player = _Player(
+            cassette.matching("api"),
+            lambda item: _api_key(
+                item["method"], item["path"], f"{item['query']}&{item['params']}"
+            ),
+            speed,
+        )
+        self._runner: web.AppRunner | None = None
+        self.requests = 0
+        self.unmatched = 0
+
+    @property
+    def port(self) -> int:
+        """Return the port the server is listening on."""
+        if self._runner and self._runner.addresses:
+            return self._runner.addresses[0][1]
+        return self._port
+
+    @property
+    def url(self) -> str:
+        """Return the base URL to pass to the API."""
+        return f"http://{self._host}:{self.port}"
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        """Answer a request with the next recorded response."""
+        self.requests += 1
+        body = (await request.read()).decode("utf-8", errors="replace")
+        interaction = await self._player.play(
+            _api_key(request.method, request.path, f"{request.query_string}&{body}")
+        )
+        if interaction is None:
+            self.unmatched += 1
+            _LOGGER.warning(
+                "No recorded response for %s %s", request.method, request.path
+            )
+            return web.Response(status=404, text="No recorded response")
+
+        response = web.Response(
+            status=interaction["status"],
+            body=interaction["body"].encode(),
+            headers={"Content-Type": interaction["content_type"]},
+        )
+        for name, cookie in interaction["cookies"].items():
+            expires = None
+            if cookie["expires_in"] is not None:
+                expires = time.strftime(
+                    DATE_FORMAT.replace("%Z", "GMT"),
+                    time.gmtime(time.time() + cookie["expires_in"]),
+                )
+            response.set_cookie(name, cookie["value"], expires=expires)
+        return response
+
+    async def start(self) -> None:
+        """Start listening in the background."""
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self._host, self._port).start()
+        _LOGGER.info("Replay server listening on %s", self.url)
+
+    async def stop(self) -> None:
+        """Stop the server."""
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "MasterthermReplayServer":
+        """Start the server as a context manager."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        """Stop the server."""
+        await self.stop()
@@ -0,0 +1,53 @@
+"""Track the device versions published to send only what changed."""
+
+from masterthermconnect.controller import MasterthermController
+
+
+class ChangeTracker:
+    """The device version last published per device.
+
+    Devices are only checked when their version has moved on, the registers
+    changed since the version last published are read from the controller,
+    so changes made by several refreshes between publishes are all returned.
+    """
+
+    def __init__(self, controller: MasterthermController) -> None:
+        """Initialise the Tracker.
+
+        Args:
+            controller: The controller holding the devices
+
+        """
+        self._controller = controller
+        self._published: dict[str, int] = {}
+
+    def __contains__(self, device_id: str) -> bool:
+        """Return True if the device has been published."""
+        return device_id in self._published
+
+    def changed(self, module_id: str, unit_id: str) -> list[str] | None:
+        """Return the registers changed since the last call and record the version.
+
+        Args:
+            module_id: The id of the module
+            unit_id: The id of the unit
+
+        Returns:
+            changed (list): The new or changed registers, all of them the first
+                time, empty if only the info changed, None if nothing changed.
+
+        """
+        device_id = f"{module_id}_{unit_id}"
+        version = self._controller.get_device_version(module_id, unit_id)
+        published = self._published.get(device_id, -1)
+        if version == published:
+            return None
+
+        self._published[device_id] = version
+        return self._controller.get_device_changes(
+            module_id, unit_id, since_version=published
+        )
+
+    def forget(self, device_id: str) -> None:
+        """Forget a device, the next call returns all its registers."""
+        self._published.pop(device_id, None)
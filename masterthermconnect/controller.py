@@ -1,9 +1,104 @@
 """Mastertherm Controller, for handling Mastertherm Data."""
 
-from aiohttp import ClientSession
+import asyncio
+import gzip
+import importlib
+import json
+import logging
+import os
+import random
+import sys
+from collections.abc import Awaitable, Callable
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+from functools import partial
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, NamedTuple
 
-from masterthermconnect.api import MasterthermAPI
-from masterthermconnect.modbus import MasterthermModbus
+from masterthermconnect.const import DEVICE_INFO_MAP
+from masterthermconnect.datamap import normalize_registers
+from masterthermconnect.deadline import within
+from masterthermconnect.exceptions import (
+    MasterthermConnectionError,
+    MasterthermDeadlineError,
+    MasterthermError,
+    MasterthermPumpError,
+    MasterthermServerTimeoutError,
+    MasterthermUnsupportedType,
+)
+from masterthermconnect.modbusmap import CONROLLER_MAP, MAPPING
+
+if TYPE_CHECKING:
+    from aiohttp import ClientSession
+
+    from masterthermconnect.api import MasterthermAPI
+    from masterthermconnect.modbus import MasterthermModbus
+    from masterthermconnect.profiling import MasterthermProfiler
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+# Errors of a single device, returned per device by a refresh. Any other error,
+# e.g. failing to log in, is for the whole account and is raised.
+DEVICE_ERRORS = (
+    MasterthermPumpError,
+    MasterthermServerTimeoutError,
+    MasterthermDeadlineError,
+)
+
+# The transports are imported when first enabled, their dependencies are the
+# optional extras of the same name.
+TRANSPORTS = {
+    "api": ("masterthermconnect.api", "MasterthermAPI"),
+    "modbus": ("masterthermconnect.modbus", "MasterthermModbus"),
+}
+
+SOURCE_API = "api"
+SOURCE_MODBUS = "modbus"
+
+# Registers showing the heat pump is running, the compressor and circulation
+# pump, watched by the adaptive refresh.
+STATE_REGISTERS = ["D_5", "D_10"]
+
+# Snapshot format version and the device values saved, the next_ schedule is
+# rebuilt from the last_ times when loaded.
+SNAPSHOT_VERSION = 2
+SNAPSHOT_DATES = ["last_data_update", "last_info_update", "last_full_load"]
+SNAPSHOT_VALUES = [
+    "last_update_time",
+    "info",
+    "registers",
+    "register_source",
+    "api_info",
+]
+
+
+def load_transport(name: str) -> Any:
+    """Import and return the client class of a transport, api or modbus.
+
+    Raises:
+        ImportError: The optional dependencies of the transport are missing.
+
+    """
+    module, attr = TRANSPORTS[name]
+    try:
+        return getattr(importlib.import_module(module), attr)
+    except ImportError as ex:
+        raise ImportError(
+            f"The {name} transport is not installed, "
+            f"install masterthermconnect[{name}]: {ex}"
+        ) from ex
+
+
+class DeviceView(NamedTuple):
+    """Read only view of a device, the mappings are live and never copied.
+
+    Compare version with get_device_version to check if anything changed.
+    """
+
+    version: int
+    info: MappingProxyType
+    registers: MappingProxyType
+    changes: tuple[str, ...]
 
 
 class MasterthermController:
@@ -13,7 +108,7 @@ class MasterthermController:
         self,
         username: str | None = None,
         password: str | None = None,
-        session: ClientSession | None = None,
+        session: "ClientSession | None" = None,
         api_version: str = "v1",
     ) -> None:
         """Initialize the MasterthermController.
@@ -44,6 +139,37 @@ class MasterthermController:
         self._api_configured = False
         self._modbus_configured = False
 
+        # Local Modbus connection details, the device it serves and when to retry.
+        self._modbus_addr: str | None = None
+        self._modbus_port = 502
+        self._modbus_slave = 1
+        self._modbus_timeout: float = 3
+        self._modbus_client: Any = None
+        self._modbus_type: str | None = None
+        self._modbus_device: tuple[str | None, str] = (None, "1")
+        self._modbus_device_id: str | None = None
+        self._modbus_connected = False
+        self._modbus_retry: datetime | None = None
+        self.modbus_retry_interval = timedelta(seconds=60)
+
+        # Refresh intervals, a random offset up to jitter of the interval is
+        # added so many devices don't all come due at the same time.
+        self._data_refresh = timedelta(seconds=60)
+        self._info_refresh = timedelta(hours=4)
+        # A failed info refresh is retried after this, doubled per failure.
+        self.info_retry_interval = timedelta(seconds=60)
+        self._full_load_refresh = timedelta(hours=1)
+        self._refresh_jitter = 0.1
+        self._max_concurrent = 4
+
+        # Adaptive data refresh, used instead of _data_refresh when set.
+        self._active_refresh: timedelta | None = None
+        self._idle_refresh: timedelta | None = None
+        self._state_registers = STATE_REGISTERS
+
+        # Set by MasterthermProfiler to capture the refreshes.
+        self.profiler: MasterthermProfiler | None = None
+
         # Check we have all parameters.
         if username:
             if not (password and session):
@@ -51,6 +177,9 @@ class MasterthermController:
                     "Provide username, password and session together or no parameters."
                 )
             else:
+                self._api = load_transport("api")(
+                    username, password, session, api_version
+                )
                 self._api_configured = True
 
         # The device structure is held as a dictionary with the following format:
@@ -60,21 +189,46 @@ class MasterthermController:
         #       "last_info_update": <datetime>,
         #       "last_full_load": <datetime>,
         #       "last_update_time": "1192282722"
+        #       "next_data_update": <datetime>,
+        #       "next_info_update": <datetime>,
+        #       "next_full_load": <datetime>,
+        #       "info_failures": 0, info refreshes failed in a row,
         #       "info": { Various Information },
-        #       "data": { Normalized Data Information },
+        #       "registers": { A_, D_ and I_ Registers from all sources },
+        #       "last_changes": [ Registers changed by the last update ],
+        #       "version": 0, increased when the info or registers change,
+        #       "register_versions": { Version each register last changed in,
+        #           only registers changed after they were first loaded },
+        #       "added_version": 0, version registers were last added in,
+        #       "register_source": { Source for each register if local },
+        #       "source_updates": { Last successful update for each source },
         #       "api_info": { All Info retrieved from the API },
-        #       "api_update_data": { All Updated Data since last update },
-        #       "api_full_data": { Full Data including last updated },
         #   }
         # }
+        # The registers are the only copy of the data, normalized data is
+        # computed from them when requested.
         self.__devices = {}
+        self.__version = 0
+
+    @property
+    def version(self) -> int:
+        """Return the version, increased when any device changes."""
+        return self.__version
+
+    def __changed(self, device: dict) -> None:
+        """Increase the device and controller versions."""
+        device["version"] += 1
+        self.__version += 1
 
     async def enable_api(
         self,
         username: str,
         password: str,
-        session: ClientSession,
+        session: "ClientSession",
         api_version: str = "v1",
+        base_url: str | None = None,
+        fresh_seconds: float = 0.0,
+        max_stale_seconds: float = 0.0,
     ) -> bool:
         """Enable the API Interface.
 
@@ -88,6 +242,12 @@ class MasterthermController:
                 "v1"  : Original version, data response in varfile_mt1_config1
                 "v1b" : Original version, datalast_info_update response in varfile_mt1_config2
                 "v2"  : New version since 2022 response in varFileData
+            base_url: Optional, the server URL to use instead of the one for the
+                version, e.g. a local stand-in server
+            fresh_seconds: Optional, seconds device data is answered from the
+                API cache, 0 to disable the cache
+            max_stale_seconds: Optional, seconds older device data is answered
+                from the API cache while it is refreshed in the background
 
         Returns:
             The MasterthermController object
@@ -96,19 +256,50 @@ class MasterthermController:
             MasterthermUnsupportedVersion: API Version is not supported.
 
         """
+        self._api = load_transport("api")(
+            username,
+            password,
+            session,
+            api_version,
+            base_url=base_url,
+            fresh_seconds=fresh_seconds,
+            max_stale_seconds=max_stale_seconds,
+        )
         self._api_configured = True
         return True
 
-    async def enable_modbus(self, modbus_addr: str, hp_type: str | None = None) -> bool:
+    async def enable_modbus(
+        self,
+        modbus_addr: str,
+        hp_type: str | None = None,
+        module_id: str | None = None,
+        unit_id: str = "1",
+        port: int = 502,
+        slave: int = 1,
+        timeout: float = 3,
+        client: Any = None,
+    ) -> bool:
         """Enable the Modbus IP Interface.
 
         Provide the details for local connect, requires static IP on heatpump.
+        Registers are read locally when the heat pump is reachable and from the
+        API when it is not.
 
         Args:
             modbus_addr: The Modbus IP Address
             hp_type: str: The HeatPump Type, known types:
                 "pco5" : Older HP Type Before 2022
                 "uPC" : Newer After 2022
+                If not provided the type is taken from the API device info.
+            module_id: Optional, the API module of the heat pump, if not provided
+                and the API has a single device that device is used.
+            unit_id: Optional, the API unit of the heat pump, default 1
+            port: Optional, the Modbus port, default 502
+            slave: Optional, the Modbus slave id, default 1
+            timeout: Optional, seconds to wait for a Modbus response, default 3
+            client: Optional, a pymodbus compatible client to use instead of
+                connecting, e.g. a cassette recorder or replay
+
         Returns:
             The MasterthermController object
 
@@ -116,12 +307,148 @@ class MasterthermController:
             MasterthermUnsupportedType: Heat Pump Type is not supported.
 
         """
+        self._modbus_addr = modbus_addr
+        self._modbus_port = port
+        self._modbus_slave = slave
+        self._modbus_timeout = timeout
+        self._modbus_client = client
+        self._modbus_device = (module_id, unit_id)
+        self._modbus_type = None
+        self._modbus = None
+
+        if hp_type is not None:
+            self._modbus_type = self.__modbus_type(hp_type)
+            self._modbus = load_transport("modbus")(
+                modbus_addr,
+                self._modbus_type,
+                port=self._modbus_port,
+                timeout=self._modbus_timeout,
+                client=self._modbus_client,
+            )
+
         self._modbus_configured = True
         return True
 
+    def __modbus_type(self, hp_type: str) -> str:
+        """Return the register mapping for a heat pump or controller type."""
+        if hp_type in MAPPING:
+            return hp_type
+
+        for controller, mt_type in CONROLLER_MAP.items():
+            if hp_type in (controller, controller.split("_")[0]):
+                return mt_type
+
+        raise MasterthermUnsupportedType("1", f"Unsupported HP Type {hp_type}")
+
+    def __new_device(self, info: dict) -> dict:
+        """Return a new empty device structure."""
+        return {
+            "last_data_update": None,
+            "last_info_update": None,
+            "last_full_load": None,
+            "last_update_time": "0",
+            "next_data_update": None,
+            "next_info_update": None,
+            "next_full_load": None,
+            "info_failures": 0,
+            "info": info,
+            "registers": {},
+            "last_changes": [],
+            "version": 0,
+            "register_versions": {},
+            "added_version": 0,
+            "register_source": {},
+            "source_updates": {},
+            "api_info": {},
+        }
+
+    def set_refresh_rate(
+        self,
+        data_refresh_seconds: float = 60,
+        info_refresh_seconds: int = 14400,
+        full_load_seconds: int = 3600,
+        jitter: float = 0.1,
+    ) -> None:
+        """Set the intervals used by refresh to decide what work is due.
+
+        Args:
+            data_refresh_seconds: Seconds between data updates, default 60, not
+                used while set_adaptive_refresh is on
+            info_refresh_seconds: Seconds between info updates, default 4 hours
+            full_load_seconds: Seconds between full data loads, default 1 hour
+            jitter: Fraction of the interval used for a random offset, default 0.1
+
+        """
+        self._data_refresh = timedelta(seconds=data_refresh_seconds)
+        self._info_refresh = timedelta(seconds=info_refresh_seconds)
+        self._full_load_refresh = timedelta(seconds=full_load_seconds)
+        self._refresh_jitter = jitter
+
+        for device in self.__devices.values():
+            self.__reschedule(device)
+
+    def set_adaptive_refresh(
+        self,
+        active_seconds: int | None = 15,
+        idle_seconds: int = 300,
+        state_registers: list[str] | None = None,
+    ) -> None:
+        """Refresh data faster while a device runs or changes state, slower idle.
+
+        A device is active while any state register is on, or changed in the
+        last update, e.g. the compressor starting. The intervals are used
+        instead of data_refresh_seconds set with set_refresh_rate.
+
+        Args:
+            active_seconds: Seconds between data updates while active, default
+                15, None to turn the adaptive refresh off
+            idle_seconds: Seconds between data updates while idle, default 300
+            state_registers: Optional, the registers watched, default
+                STATE_REGISTERS, the compressor and circulation pump
+
+        """
+        if active_seconds is None:
+            self._active_refresh = None
+            self._idle_refresh = None
+        else:
+            self._active_refresh = timedelta(seconds=active_seconds)
+            self._idle_refresh = timedelta(seconds=idle_seconds)
+        self._state_registers = (
+            STATE_REGISTERS if state_registers is None else state_registers
+        )
+
+        for device in self.__devices.values():
+            self.__reschedule(device)
+
+    def __data_interval(self, device: dict) -> timedelta:
+        """Return the data refresh interval for the state of the device."""
+        if self._active_refresh is None:
+            return self._data_refresh
+
+        registers = device["registers"]
+        for register in self._state_registers:
+            if registers.get(register) or register in device["last_changes"]:
+                return self._active_refresh
+
+        return self._idle_refresh
+
+    def set_max_concurrent(self, max_concurrent: int = 4) -> None:
+        """Set the maximum number of devices refreshed at the same time.
+
+        Args:
+            max_concurrent: The maximum devices refreshed at once, default 4
+
+        """
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be at least 1")
+        self._max_concurrent = max_concurrent
+
     async def connect(self, reload_modules: bool = False) -> bool:
         """Connect to the API, check the supported roles and update if required.
 
+        The API and the local Modbus are connected if configured, if one is
+        not available the other is used.
+
         Args:
             reload_modules: Optional, default False, True to reload modules.
 
@@ -135,4 +462,831 @@ class MasterthermController:
             MasterthermServerTimeoutError: Server Timed Out more than once.
 
         """
+        api_error: MasterthermError | None = None
+        if self._api_configured and (reload_modules or not self.__devices):
+            try:
+                await self.__connect_api()
+            except MasterthermError as ex:
+                if not self._modbus_configured:
+                    raise
+                _LOGGER.warning("API Connect failed, continuing local: %s", ex)
+                api_error = ex
+
+        if self._modbus_configured:
+            self.__setup_modbus()
+            if not await self.__connect_modbus():
+                if api_error is not None:
+                    raise api_error
+                if not self._api_configured:
+                    raise MasterthermConnectionError("3", "Modbus Connection Error")
+
+        return True
+
+    async def close(self) -> None:
+        """Close the local Modbus connection, the API session is the callers."""
+        if self._modbus is not None:
+            self._modbus.close()
+        self._modbus_connected = False
+
+    async def __connect_api(self) -> None:
+        """Connect to the API and load the devices and their info."""
+        response = await self._api.connect()
+        for module in response.get("modules", []):
+            for unit in module.get("config", []):
+                module_id = str(module["id"])
+                unit_id = str(unit["mb_addr"])
+                device_id = f"{module_id}_{unit_id}"
+
+                info = {
+                    "module_id": module_id,
+                    "module_name": module.get("module_name", ""),
+                    "unit_id": unit_id,
+                    "unit_name": unit.get("mb_name", ""),
+                }
+                if device_id not in self.__devices:
+                    self.__devices[device_id] = self.__new_device(info)
+                else:
+                    self.__devices[device_id]["info"].update(info)
+
+        await self.refresh_info()
+
+    def __setup_modbus(self) -> None:
+        """Bind the local Modbus to a device and work out its type."""
+        module_id, unit_id = self._modbus_device
+        api_devices = [
+            device_id
+            for device_id, device in self.__devices.items()
+            if device["info"]["module_id"] != "local"
+        ]
+        if module_id is not None:
+            device_id = f"{module_id}_{unit_id}"
+        elif len(api_devices) == 1:
+            device_id = api_devices[0]
+        else:
+            device_id = f"local_{unit_id}"
+
+        if device_id not in self.__devices:
+            self.__devices[device_id] = self.__new_device(
+                {
+                    "module_id": module_id or "local",
+                    "module_name": self._modbus_addr,
+                    "unit_id": unit_id,
+                    "unit_name": "",
+                }
+            )
+        self._modbus_device_id = device_id
+
+        if self._modbus is None:
+            # Controller and Exp from the API Info give the mapping, e.g. pco5_0
+            info = self.__devices[device_id]["info"]
+            if "controller" not in info:
+                raise MasterthermUnsupportedType(
+                    "1", "HP Type not provided and not available from the API"
+                )
+
+            self._modbus_type = self.__modbus_type(
+                f"{info['controller']}_{info.get('exp', '0')}"
+            )
+            self._modbus = load_transport("modbus")(
+                self._modbus_addr,
+                self._modbus_type,
+                port=self._modbus_port,
+                timeout=self._modbus_timeout,
+                client=self._modbus_client,
+            )
+
+    async def __connect_modbus(self) -> bool:
+        """Connect the local Modbus, not retried before the retry interval."""
+        now = datetime.now()
+        if self._modbus_retry is not None and now < self._modbus_retry:
+            return False
+
+        self._modbus_connected = await self._modbus.connect()
+        if self._modbus_connected:
+            self._modbus_retry = None
+        else:
+            _LOGGER.warning("Modbus %s not reachable", self._modbus_addr)
+            self._modbus_retry = now + self.modbus_retry_interval
+
+        return self._modbus_connected
+
+    def __update_registers(
+        self, device: dict, registers: dict[str, Any], source: str
+    ) -> None:
+        """Merge registers from a source in to the shared key space.
+
+        Only changed values are written and recorded in last_changes, the
+        source per register is only held for devices with a local connection.
+        """
+        current = device["registers"]
+        changes = [
+            register
+            for register, value in registers.items()
+            if register not in current or current[register] != value
+        ]
+        changed = [register for register in changes if register in current]
+        for register in changes:
+            current[register] = registers[register]
+        device["last_changes"] = changes
+        if changes:
+            self.__changed(device)
+            # New registers only record the version they were added in, so a
+            # full load does not hold a version for every register.
+            if len(changed) < len(changes):
+                device["added_version"] = device["version"]
+            device["register_versions"].update(
+                dict.fromkeys(changed, device["version"])
+            )
+
+        if device is self.__devices.get(self._modbus_device_id):
+            device["register_source"].update(dict.fromkeys(registers, source))
+        device["source_updates"][source] = datetime.now()
+        device["last_data_update"] = datetime.now()
+        self.__schedule(device, "next_data_update", self.__data_interval(device))
+
+    def __schedule(
+        self,
+        device: dict,
+        task: str,
+        interval: timedelta,
+        since: datetime | None = None,
+    ) -> None:
+        """Set when a task is next due, with a random offset."""
+        offset = random.uniform(0, interval.total_seconds() * self._refresh_jitter)
+        device[task] = (since or datetime.now()) + interval + timedelta(seconds=offset)
+
+    def __reschedule(self, device: dict) -> None:
+        """Schedule all tasks from the last time each task ran."""
+        for task, last, interval in (
+            ("next_data_update", "last_data_update", self.__data_interval(device)),
+            ("next_info_update", "last_info_update", self._info_refresh),
+            ("next_full_load", "last_full_load", self._full_load_refresh),
+        ):
+            if device[last] is not None:
+                self.__schedule(device, task, interval, device[last])
+
+    def __is_due(self, device: dict, task: str, now: datetime) -> bool:
+        """Return True if the task is due, never run tasks are due."""
+        return device[task] is None or device[task] <= now
+
+    def __convert_api_value(self, register: str, value: Any) -> Any:
+        """Convert an API string value to the Modbus type for the register."""
+        try:
+            match register[:2]:
+                case "A_":
+                    return float(value)
+                case "D_":
+                    return str(value) not in ("0", "false", "False", "")
+                case "I_":
+                    return int(value)
+        except (TypeError, ValueError):
+            pass
+
+        return value
+
+    def __store_written(
+        self, device: dict, register: str, value: Any, source: str
+    ) -> None:
+        """Store a written value as the heat pump holds it.
+
+        Only the register is changed, the data schedule, the source freshness
+        and last_changes stay those of the last read.
+        """
+        value = self.__convert_api_value(register, value)
+        if register.startswith("A_") and isinstance(value, float):
+            # Analog values are held in tenths.
+            value = round(value * 10) / 10
+
+        if device["registers"].get(register) != value:
+            device["registers"][register] = value
+            self.__changed(device)
+            device["register_versions"][register] = device["version"]
+        if device is self.__devices.get(self._modbus_device_id):
+            device["register_source"][register] = source
+
+    def __modbus_cancelled(self) -> None:
+        """Drop the Modbus connection, a cancelled response may still arrive."""
+        self._modbus.close()
+        self._modbus_connected = False
+
+    async def __refresh_modbus_data(
+        self, device: dict, deadline: float | None = None
+    ) -> bool:
+        """Refresh the device registers from the local Modbus."""
+        if not self._modbus_connected and not await self.__connect_modbus():
+            return False
+
+        from pymodbus.exceptions import ModbusException
+
+        try:
+            registers = await self._modbus.get_registers(self._modbus_slave, deadline)
+        except MasterthermDeadlineError:
+            self.__modbus_cancelled()
+            raise
+        except (MasterthermConnectionError, ModbusException) as ex:
+            _LOGGER.warning("Modbus read failed, using API: %s", ex)
+            self._modbus.close()
+            self._modbus_connected = False
+            self._modbus_retry = datetime.now() + self.modbus_retry_interval
+            return False
+
+        # A local read is always all registers so counts as a full load.
+        device["last_full_load"] = datetime.now()
+        self.__schedule(device, "next_full_load", self._full_load_refresh)
+        self.__update_registers(device, registers, SOURCE_MODBUS)
+        return True
+
+    async def __refresh_api_data(
+        self, device: dict, full_load: bool, deadline: float | None = None
+    ) -> bool:
+        """Refresh the device registers from the API."""
+        module_id = device["info"]["module_id"]
+        unit_id = device["info"]["unit_id"]
+
+        full_load = full_load or device["last_update_time"] == "0"
+        response = await self._api.get_device_data(
+            module_id,
+            unit_id,
+            last_update_time=None if full_load else device["last_update_time"],
+            deadline=deadline,
+        )
+
+        device["last_update_time"] = str(
+            response.get("timestamp", device["last_update_time"])
+        )
+        if full_load:
+            device["last_full_load"] = datetime.now()
+            self.__schedule(device, "next_full_load", self._full_load_refresh)
+
+        if response["data"] == {}:
+            device["last_changes"] = []
+            self.__schedule(device, "next_data_update", self.__data_interval(device))
+            return True
+
+        update = response["data"]["varData"][str(unit_id).zfill(3)]
+
+        self.__update_registers(
+            device,
+            {
+                register: self.__convert_api_value(register, value)
+                for register, value in update.items()
+            },
+            SOURCE_API,
+        )
+        return True
+
+    async def __refresh_device_info(
+        self, device: dict, deadline: float | None = None
+    ) -> bool:
+        """Refresh the information for a device from the API.
+
+        A failure is retried after info_retry_interval, doubled per failure up
+        to the info refresh interval, rather than on every refresh.
+        """
+        if device["info"]["module_id"] == "local":
+            self.__schedule(device, "next_info_update", self._info_refresh)
+            return False
+
+        try:
+            api_info = await self._api.get_device_info(
+                device["info"]["module_id"], device["info"]["unit_id"], deadline
+            )
+        except MasterthermDeadlineError:
+            raise
+        except MasterthermError:
+            self.__info_failed(device)
+            raise
+        if api_info.get("returncode", 0) != 0:
+            self.__info_failed(device)
+            return False
+
+        changed = False
+        device["api_info"] = api_info
+        info = device["info"]
+        for key, item in DEVICE_INFO_MAP.items():
+            if item in api_info and info.get(key) != api_info[item]:
+                info[key] = api_info[item]
+                changed = True
+        if changed:
+            self.__changed(device)
+        device["last_info_update"] = datetime.now()
+        device["info_failures"] = 0
+        self.__schedule(device, "next_info_update", self._info_refresh)
         return True
+
+    def __info_failed(self, device: dict) -> None:
+        """Schedule the next info refresh after a failure, backing off."""
+        retry = self.info_retry_interval * 2 ** device["info_failures"]
+        device["info_failures"] += 1
+        self.__schedule(device, "next_info_update", min(retry, self._info_refresh))
+
+    async def refresh_info(self, deadline: float | None = None) -> bool:
+        """Refresh the device information from the API, devices concurrently.
+
+        Args:
+            deadline: Optional, the loop time to finish by, see deadline.within
+
+        Returns:
+            success (bool): True if no device failed with an error.
+
+        """
+        if not self._api_configured:
+            return False
+
+        results = await self.__run_devices(
+            {
+                device_id: partial(self.__refresh_device_info, device, deadline)
+                for device_id, device in self.__devices.items()
+            },
+            deadline,
+        )
+        return not any(isinstance(r, MasterthermError) for r in results.values())
+
+    async def refresh_data(
+        self, full_load: bool = False, deadline: float | None = None
+    ) -> bool:
+        """Refresh the registers for all devices, local first then the API.
+
+        Devices are refreshed concurrently, see refresh_devices.
+
+        Args:
+            full_load: Optional, default False, True to reload all API data.
+            deadline: Optional, the loop time to finish by, see deadline.within
+
+        Returns:
+            success (bool): True if all devices refreshed.
+
+        """
+        results = await self.refresh_devices(full_load, deadline=deadline)
+        return all(result is True for result in results.values())
+
+    async def refresh_devices(
+        self,
+        full_load: bool = False,
+        device_ids: list[str] | None = None,
+        deadline: float | None = None,
+    ) -> dict[str, bool | MasterthermError]:
+        """Refresh the registers for many devices at the same time.
+
+        At most max_concurrent devices are refreshed at once, set with
+        set_max_concurrent. A failing device does not stop the others, an
+        error for the whole account stops them all and is raised.
+
+        Args:
+            full_load: Optional, default False, True to reload all API data.
+            device_ids: Optional, the devices to refresh, default all devices.
+            deadline: Optional, the loop time to finish by, see deadline.within,
+                a device still waiting or refreshing then fails with
+                MasterthermDeadlineError.
+
+        Returns:
+            results (dict): device id and True if refreshed, False if no source
+                was available or the DEVICE_ERRORS error raised for the device.
+
+        Raises:
+            MasterthermError: An error for the whole account, e.g. the login.
+
+        """
+        return await self.__run_devices(
+            {
+                device_id: partial(
+                    self.refresh_device_data, device_id, full_load, deadline
+                )
+                for device_id in (
+                    list(self.__devices) if device_ids is None else device_ids
+                )
+            },
+            deadline,
+        )
+
+    async def __run_devices(
+        self,
+        work: dict[str, Callable[[], Awaitable[bool]]],
+        deadline: float | None = None,
+    ) -> dict[str, bool | MasterthermError]:
+        """Run the work for each device concurrently, bounded by max_concurrent."""
+        semaphore = asyncio.Semaphore(self._max_concurrent)
+
+        async def run(device_id: str, func: Callable[[], Awaitable[bool]]) -> Any:
+            try:
+                async with within(deadline, f"refresh of {device_id}"), semaphore:
+                    return await func()
+            except DEVICE_ERRORS as ex:
+                _LOGGER.warning(
+                    "Refresh failed for %s: %s:%s", device_id, ex.status, ex.message
+                )
+                return ex
+
+        tasks = [
+            asyncio.ensure_future(run(device_id, func))
+            for device_id, func in work.items()
+        ]
+        with self.profiler.refresh() if self.profiler else nullcontext():
+            try:
+                results = await asyncio.gather(*tasks)
+            except BaseException:
+                # An account error fails them all, stop the other devices.
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+        return dict(zip(work, results))
+
+    async def refresh_device_data(
+        self, device_id: str, full_load: bool = False, deadline: float | None = None
+    ) -> bool:
+        """Refresh the registers for one device, local first then the API.
+
+        Args:
+            device_id: The device id, module_id_unit_id
+            full_load: Optional, default False, True to reload all API data.
+            deadline: Optional, the loop time to finish by, see deadline.within
+
+        Returns:
+            success (bool): True if refreshed from any source.
+
+        """
+        device = self.__devices[device_id]
+        if device_id == self._modbus_device_id and await self.__refresh_modbus_data(
+            device, deadline
+        ):
+            return True
+
+        if not self._api_configured or device["info"]["module_id"] == "local":
+            return False
+
+        return await self.__refresh_api_data(device, full_load, deadline)
+
+    async def set_device_register(
+        self,
+        module_id: str,
+        unit_id: str,
+        register: str,
+        value: Any,
+        deadline: float | None = None,
+    ) -> bool:
+        """Set a register on a device, locally if reachable otherwise the API.
+
+        Updating any registry setting can cause the system to stop working,
+        the local Modbus rejects registers known to be read only.
+
+        Args:
+            module_id: The id of the module
+            unit_id: The id of the unit
+            register: The register to set, e.g. A_191
+            value: The value to set
+            deadline: Optional, the loop time to finish by, see deadline.within
+
+        Returns:
+            success (bool): True if the value was set.
+
+        Raises:
+            ValueError: Register is read only or unknown for the local Modbus.
+            MasterthermConnectionError: Failed to Connect
+            MasterthermTokenInvalid: Token has expired or is invalid
+            MasterthermServerTimeoutError: Server Timed Out more than once.
+            MasterthermDeadlineError: The deadline passed.
+
+        """
+        device_id = f"{module_id}_{unit_id}"
+        device = self.__devices[device_id]
+
+        if device_id == self._modbus_device_id and (
+            self._modbus_connected or await self.__connect_modbus()
+        ):
+            from pymodbus.exceptions import ModbusException
+
+            try:
+                if await self._modbus.set_registers(
+                    self._modbus_slave, {register: value}, deadline=deadline
+                ):
+                    self.__store_written(device, register, value, SOURCE_MODBUS)
+                    return True
+            except MasterthermDeadlineError:
+                self.__modbus_cancelled()
+                raise
+            except (MasterthermConnectionError, ModbusException) as ex:
+                _LOGGER.warning("Modbus write failed, using API: %s", ex)
+
+        if not self._api_configured or module_id == "local":
+            return False
+
+        if not await self._api.set_device_data(
+            module_id, unit_id, register, value, deadline
+        ):
+            return False
+
+        self.__store_written(device, register, value, SOURCE_API)
+        return True
+
+    async def refresh(
+        self, deadline: float | None = None
+    ) -> dict[str, bool | MasterthermError]:
+        """Refresh only the info, full loads and data that are due.
+
+        Call regularly, e.g. every few seconds, intervals are set with
+        set_refresh_rate. Devices with work due are refreshed concurrently.
+
+        Args:
+            deadline: Optional, the loop time the cycle finishes by, see
+                deadline.within, devices not done fail with
+                MasterthermDeadlineError and stay due.
+
+        Returns:
+            results (dict): for each device with work due, True if refreshed,
+                False if no source was available or the DEVICE_ERRORS error raised.
+
+        Raises:
+            MasterthermError: An error for the whole account, e.g. the login.
+
+        """
+        now = datetime.now()
+        work = {}
+        for device_id, device in self.__devices.items():
+            info_due = self._api_configured and self.__is_due(
+                device, "next_info_update", now
+            )
+            full_load = self.__is_due(device, "next_full_load", now)
+            data_due = full_load or self.__is_due(device, "next_data_update", now)
+            if info_due or data_due:
+                work[device_id] = partial(
+                    self.__refresh_due,
+                    device_id,
+                    info_due,
+                    data_due,
+                    full_load,
+                    deadline,
+                )
+
+        return await self.__run_devices(work, deadline)
+
+    async def __refresh_due(
+        self,
+        device_id: str,
+        info_due: bool,
+        data_due: bool,
+        full_load: bool,
+        deadline: float | None = None,
+    ) -> bool:
+        """Refresh the info and then the data for a device, each only if due."""
+        refreshed = True
+        if info_due:
+            refreshed = await self.__refresh_device_info(
+                self.__devices[device_id], deadline
+            )
+        if data_due:
+            refreshed = await self.refresh_device_data(device_id, full_load, deadline)
+        return refreshed
+
+    def save_state(self, path: str) -> None:
+        """Save the device state to a compact snapshot file.
+
+        Args:
+            path: The snapshot file, gzip compressed json.
+
+        """
+        devices = {}
+        for device_id, device in self.__devices.items():
+            snapshot = {key: device[key] for key in SNAPSHOT_VALUES}
+            for key in SNAPSHOT_DATES:
+                snapshot[key] = device[key].isoformat() if device[key] else None
+            snapshot["source_updates"] = {
+                source: updated.isoformat()
+                for source, updated in device["source_updates"].items()
+            }
+            devices[device_id] = snapshot
+
+        data = json.dumps(
+            {"version": SNAPSHOT_VERSION, "devices": devices}, separators=(",", ":")
+        ).encode("utf-8")
+
+        # Write to a temporary file and replace so a crash never leaves half a file.
+        with open(f"{path}.tmp", "wb") as file:
+            file.write(gzip.compress(data))
+        os.replace(f"{path}.tmp", path)
+
+    def load_state(self, path: str) -> bool:
+        """Restore the device state from a snapshot file saved by save_state.
+
+        Call before connect, restored devices continue with delta updates from
+        the saved last_update_time and the registers are available at once.
+
+        Args:
+            path: The snapshot file, gzip compressed json.
+
+        Returns:
+            loaded (bool): True if the snapshot was restored.
+
+        """
+        try:
+            with open(path, "rb") as file:
+                snapshot = json.loads(gzip.decompress(file.read()))
+        except (OSError, ValueError) as ex:
+            _LOGGER.warning("Unable to load snapshot %s: %s", path, ex)
+            return False
+
+        if snapshot.get("version") != SNAPSHOT_VERSION:
+            _LOGGER.warning("Unsupported snapshot version in %s", path)
+            return False
+
+        for device_id, saved in snapshot["devices"].items():
+            device = self.__new_device(saved["info"])
+            for key in SNAPSHOT_VALUES:
+                device[key] = saved[key]
+            for key in SNAPSHOT_DATES:
+                device[key] = datetime.fromisoformat(saved[key]) if saved[key] else None
+            device["source_updates"] = {
+                source: datetime.fromisoformat(updated)
+                for source, updated in saved["source_updates"].items()
+            }
+            self.__reschedule(device)
+            self.__changed(device)
+            device["added_version"] = device["version"]
+            self.__devices[device_id] = device
+
+        return True
+
+    def get_devices(self) -> dict[str, MappingProxyType]:
+        """Return a list of the devices and their info.
+
+        Returns:
+            devices (dict): device id and the read only information.
+
+        """
+        return {
+            device_id: MappingProxyType(device["info"])
+            for device_id, device in self.__devices.items()
+        }
+
+    def get_device_info(self, module_id: str, unit_id: str) -> MappingProxyType:
+        """Return the information for a device.
+
+        Args:
+            module_id: The id of the module
+            unit_id: The id of the unit
+
+        Returns:
+            info (mapping): Read only device information, empty if not found.
+
+        """
+        return MappingProxyType(
+            self.__devices.get(f"{module_id}_{unit_id}", {}).get("info", {})
+        )
+
+    def get_device_registers(self, module_id: str, unit_id: str) -> MappingProxyType:
+        """Return the A_, D_ and I_ registers for a device from all sources.
+
+        Args:
+            module_id: The id of the module
+            unit_id: The id of the unit
+
+        Returns:
+            registers (mapping): Read only registers, empty if not found.
+
+        """
+        return MappingProxyType(
+            self.__devices.get(f"{module_id}_{unit_id}", {}).get("registers", {})
+        )
+
+    def get_device_version(self, module_id: str, unit_id: str) -> int:
+        """Return the version of a device, increased on every change.
+
+        Args:
+            module_id: The id of the module
+            unit_id: The id of the unit
+
+        Returns:
+            version (int): The device version, -1 if not found.
+
+        """
+        return self.__devices.get(f"{module_id}_{unit_id}", {}).get("version", -1)
+
+    def get_device_view(self, module_id: str, unit_id: str) -> DeviceView | None:
+        """Return a read only view of a device without copying.
+
+        The info and registers are live read only mappings of the controller
+        state, check version against get_device_version to skip reprocessing
+        when nothing has changed.
+
+        Args:
+            module_id: The id of the module
+            unit_id: The id of the unit
+
+        Returns:
+            view (DeviceView): The device view, None if not found.
+
+        """
+        device = self.__devices.get(f"{module_id}_{unit_id}")
+        if device is None:
+            return None
+
+        return DeviceView(
+            device["version"],
+            MappingProxyType(device["info"]),
+            MappingProxyType(device["registers"]),
+            tuple(device["last_changes"]),
+        )
+
+    def get_device_register_sources(self, module_id: str, unit_id: str) -> dict:
+        """Return the source and freshness of each register for a device.
+
+        Args:
+            module_id: The id of the module
+            unit_id: The id of the unit
+
+        Returns:
+            sources (dict): register: {"source": api or modbus, "updated": datetime}
+                updated is None if no update from the source is recorded, e.g.
+                registers restored by load_state.
+
+        """
+        device = self.__devices.get(f"{module_id}_{unit_id}")
+        if device is None:
+            return {}
+
+        sources = device["register_source"]
+        updates = device["source_updates"]
+        return {
+            register: {
+                "source": sources.get(register, SOURCE_API),
+                "updated": updates.get(sources.get(register, SOURCE_API)),
+            }
+            for register in device["registers"]
+        }
+
+    def get_device_changes(
+        self, module_id: str, unit_id: str, since_version: int | None = None
+    ) -> list[str]:
+        """Return the registers changed by the last update of a device.
+
+        Args:
+            module_id: The id of the module
+            unit_id: The id of the unit
+            since_version: Optional, return the registers changed, read or
+                written, after this device version instead, all registers if
+                any were added since, -1 for all
+
+        Returns:
+            changes (list): The registers that changed, empty if not found.
+
+        """
+        device = self.__devices.get(f"{module_id}_{unit_id}")
+        if device is None:
+            return []
+        if since_version is None:
+            return device["last_changes"]
+
+        if since_version < device["added_version"]:
+            return list(device["registers"])
+        return [
+            register
+            for register, version in device["register_versions"].items()
+            if version > since_version
+        ]
+
+    def get_device_data(self, module_id: str, unit_id: str) -> dict:
+        """Return the normalized data for a device, computed from the registers.
+
+        Args:
+            module_id: The id of the module
+            unit_id: The id of the unit
+
+        Returns:
+            data (dict): The normalized data, empty if not found.
+
+        """
+        device = self.__devices.get(f"{module_id}_{unit_id}")
+        if device is None:
+            return {}
+
+        return normalize_registers(device["registers"], device["info"])
+
+    def get_memory_usage(self) -> dict[str, int]:
+        """Return the approximate memory used by each device in bytes.
+
+        Returns:
+            usage (dict): device id and the bytes used by the device state.
+
+        """
+        return {
+            device_id: _deep_size(device, set())
+            for device_id, device in self.__devices.items()
+        }
+
+
+def _deep_size(value: Any, seen: set[int]) -> int:
+    """Return the size of a value and its contents, shared objects counted once."""
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(
+            _deep_size(key, seen) + _deep_size(item, seen)
+            for key, item in value.items()
+        )
+    elif isinstance(value, list | tuple | set):
+        size += sum(_deep_size(item, seen) for item in value)
+
+    return size
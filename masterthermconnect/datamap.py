@@ -0,0 +1,84 @@
+"""Mapping of the A_, D_ and I_ Registers to the Normalized Device Data."""
+
+from typing import Any
+
+from masterthermconnect.const import CHAR_MAP, HC_MAP
+
+# Normalized data, the value is the register or a nested group of values.
+DEVICE_DATA_MAP = {
+    "hp_power_state": "D_3",
+    "hp_function": "I_51",
+    "season": "I_50",
+    "compressor_running": "D_5",
+    "circulation_pump_running": "D_10",
+    "outside_temp": "A_3",
+    "requested_temp": "A_1",
+    "actual_temp": "A_90",
+    "runtime_info": {
+        "compressor_run_time": "I_11",
+        "compressor_start_counter": "I_12",
+        "pump_runtime": "I_13",
+    },
+    "domestic_hot_water": {
+        "current_temp": "A_126",
+        "required_temp": "A_129",
+    },
+    "hc0": {
+        "ambient_temp": "A_211",
+        "ambient_requested": "A_191",
+    },
+}
+
+# The name of the main heating circuit is held as letters, each register is an
+# index in to CHAR_MAP.
+HC0_NAME_REGISTERS = ["I_211", "I_212", "I_213", "I_214", "I_215", "I_216"]
+
+
+def decode_name(registers: dict[str, Any], name_registers: list[str]) -> str:
+    """Decode a name held as CHAR_MAP indexes in registers, "" if not set."""
+    name = ""
+    for register in name_registers:
+        index = int(registers.get(register, 0))
+        if 0 < index < len(CHAR_MAP):
+            name += CHAR_MAP[index]
+        else:
+            name += " "
+
+    return name.strip()
+
+
+def _map_values(registers: dict[str, Any], data_map: dict) -> dict:
+    """Return the values for a map, registers not yet loaded are None."""
+    return {
+        key: (
+            _map_values(registers, item)
+            if isinstance(item, dict)
+            else registers.get(item)
+        )
+        for key, item in data_map.items()
+    }
+
+
+def normalize_registers(registers: dict[str, Any], info: dict) -> dict:
+    """Compute the normalized device data from the registers and info.
+
+    Args:
+        registers: The A_, D_ and I_ registers for the device
+        info: The device information
+
+    Returns:
+        data (dict): The normalized device data.
+
+    """
+    data = _map_values(registers, DEVICE_DATA_MAP)
+
+    for hc_id, hc in HC_MAP.items():
+        name = info.get(hc["pad"], "") or hc["default"]
+        if hc_id == 0:
+            name = decode_name(registers, HC0_NAME_REGISTERS) or name
+
+        data.setdefault(hc["id"], {})
+        data[hc["id"]]["enabled"] = registers.get(hc["register"])
+        data[hc["id"]]["name"] = name
+
+    return data
@@ -0,0 +1,50 @@
+"""Deadlines for controller, API and Modbus calls.
+
+A deadline is an absolute time of the running event loop, as used by
+asyncio.timeout_at, e.g. asyncio.get_running_loop().time() + 5. None is no
+deadline.
+"""
+
+import asyncio
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+import logging
+
+from masterthermconnect.exceptions import MasterthermDeadlineError
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+
+def remaining(deadline: float | None) -> float | None:
+    """Return the seconds left before the deadline, None if there is none."""
+    if deadline is None:
+        return None
+
+    return deadline - asyncio.get_running_loop().time()
+
+
+@asynccontextmanager
+async def within(deadline: float | None, operation: str) -> AsyncIterator[None]:
+    """Cancel the work in the block when the deadline passes.
+
+    Args:
+        deadline: The loop time to finish by, None for no deadline
+        operation: The work done, used in the error message
+
+    Raises:
+        MasterthermDeadlineError: The deadline passed before the block finished.
+
+    """
+    scope = asyncio.timeout_at(deadline)
+    try:
+        async with scope:
+            yield
+    except TimeoutError as ex:
+        # A timeout of the session or client is not the deadline passing.
+        if not scope.expired():
+            raise
+
+        _LOGGER.info("Deadline passed during %s", operation)
+        raise MasterthermDeadlineError(
+            "timeout", f"Deadline passed during {operation}"
+        ) from ex
@@ -15,6 +15,10 @@ class MasterthermUnsupportedVersion(MasterthermError):
     """Raised when a version that is not supported is used."""
 
 
+class MasterthermUnsupportedType(MasterthermError):
+    """Raised when a heat pump type that is not supported is used."""
+
+
 class MasterthermAuthenticationError(MasterthermError):
     """Raised when login returns wrong result."""
 
@@ -48,3 +52,7 @@ class MasterthermPumpError(MasterthermError):
 
 class MasterthermServerTimeoutError(MasterthermError):
     """Raised if there is a server timeout error."""
+
+
+class MasterthermDeadlineError(MasterthermError):
+    """Raised when a call does not finish before the deadline given."""
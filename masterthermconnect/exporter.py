@@ -0,0 +1,257 @@
+"""Prometheus Exporter, serves the controller cache and library metrics."""
+
+import asyncio
+import logging
+from collections.abc import Iterator
+from typing import Any
+
+from aiohttp import web
+
+from masterthermconnect.controller import MasterthermController
+from masterthermconnect.metrics import LATENCY_BUCKETS, METRICS, MasterthermMetrics
+from masterthermconnect.polling import poll_forever
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+PREFIX = "masterthermconnect"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Rendered text is sent once this many characters are buffered.
+CHUNK_SIZE = 65536
+
+# Device info labels, from the controller info keys.
+INFO_LABELS = [
+    "module_name",
+    "unit_name",
+    "hp_type",
+    "controller",
+    "exp",
+    "serial_number",
+]
+
+
+def _escape(value: Any) -> str:
+    """Escape a label value."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: Any) -> str:
+    """Return the labels formatted for a sample."""
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+def _number(value: Any) -> str | None:
+    """Return a sample value, None if the value is not numeric."""
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int | float):
+        return repr(float(value)) if isinstance(value, float) else str(value)
+    return None
+
+
+def _flatten(data: dict, prefix: str = "") -> Iterator[tuple[str, Any]]:
+    """Yield the normalized fields as field names and values, e.g. hc0_enabled."""
+    for key, value in data.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}_")
+        else:
+            yield f"{prefix}{key}", value
+
+
+class MasterthermExporter:
+    """HTTP server exposing the controller state in the Prometheus format.
+
+    Scrapes only read the controller cache, they never call the API or
+    Modbus. The text is rendered per device and sent in chunks while it is
+    rendered, the text of a device is reused until its version changes.
+    """
+
+    def __init__(
+        self,
+        controller: MasterthermController,
+        host: str = "0.0.0.0",
+        port: int = 9586,
+        poll_interval: float | None = None,
+        metrics: MasterthermMetrics = METRICS,
+    ) -> None:
+        """Initialise the Exporter.
+
+        Args:
+            controller: The connected controller to export
+            host: The address to listen on
+            port: The port to listen on, 0 for any
+            poll_interval: Optional, seconds between calls to controller.refresh,
+                None if the controller is refreshed elsewhere
+            metrics: The library metrics to export
+
+        """
+        self._controller = controller
+        self._host = host
+        self._port = port
+        self.poll_interval = poll_interval
+        self._metrics = metrics
+
+        self._runner: web.AppRunner | None = None
+        self._poll_task: asyncio.Task | None = None
+        self._cache: dict[str, tuple[int, str, str]] = {}
+        self.scrapes = 0
+
+    @property
+    def port(self) -> int:
+        """Return the port the exporter is listening on."""
+        if self._runner and self._runner.addresses:
+            return self._runner.addresses[0][1]
+        return self._port
+
+    def _device_text(self, device_id: str, info: dict) -> tuple[str, str]:
+        """Return the register and normalized samples of a device, cached."""
+        module_id, unit_id = info["module_id"], info["unit_id"]
+        version = self._controller.get_device_version(module_id, unit_id)
+        cached = self._cache.get(device_id)
+        if cached is not None and cached[0] == version:
+            return cached[1], cached[2]
+
+        registers = [
+            f"{PREFIX}_register{{{_labels(device=device_id, register=register)}}} {sample}\n"
+            for register, value in self._controller.get_device_registers(
+                module_id, unit_id
+            ).items()
+            if (sample := _number(value)) is not None
+        ]
+        data = [
+            f"{PREFIX}_data{{{_labels(device=device_id, field=field)}}} {sample}\n"
+            for field, value in _flatten(
+                self._controller.get_device_data(module_id, unit_id)
+            )
+            if (sample := _number(value)) is not None
+        ]
+
+        self._cache[device_id] = (version, "".join(registers), "".join(data))
+        return self._cache[device_id][1], self._cache[device_id][2]
+
+    def render(self) -> Iterator[str]:
+        """Yield the exposition text, metric family by family."""
+        devices = self._controller.get_devices()
+        for device_id in list(self._cache):
+            if device_id not in devices:
+                del self._cache[device_id]
+
+        yield (
+            f"# HELP {PREFIX}_device_info Device information.\n"
+            f"# TYPE {PREFIX}_device_info gauge\n"
+        )
+        for device_id, info in devices.items():
+            labels = _labels(
+                device=device_id, **{key: info.get(key, "") for key in INFO_LABELS}
+            )
+            yield f"{PREFIX}_device_info{{{labels}}} 1\n"
+
+        yield (
+            f"# HELP {PREFIX}_device_version Device version, increased on change.\n"
+            f"# TYPE {PREFIX}_device_version gauge\n"
+        )
+        for device_id, info in devices.items():
+            version = self._controller.get_device_version(
+                info["module_id"], info["unit_id"]
+            )
+            yield f"{PREFIX}_device_version{{{_labels(device=device_id)}}} {version}\n"
+
+        texts = {
+            device_id: self._device_text(device_id, info)
+            for device_id, info in devices.items()
+        }
+        yield (
+            f"# HELP {PREFIX}_register Heat pump register value.\n"
+            f"# TYPE {PREFIX}_register gauge\n"
+        )
+        for registers, _ in texts.values():
+            yield registers
+
+        yield (
+            f"# HELP {PREFIX}_data Normalized heat pump value.\n"
+            f"# TYPE {PREFIX}_data gauge\n"
+        )
+        for _, data in texts.values():
+            yield data
+
+        yield from self._render_metrics()
+
+    def _render_metrics(self) -> Iterator[str]:
+        """Yield the library counters and histograms."""
+        for name, series in self._metrics.counters.items():
+            yield f"# TYPE {PREFIX}_{name} counter\n"
+            for key, value in series.items():
+                yield f"{PREFIX}_{name}{{{_labels(**dict(key))}}} {value}\n"
+
+        for name, series in self._metrics.histograms.items():
+            yield f"# TYPE {PREFIX}_{name} histogram\n"
+            for key, histogram in series.items():
+                labels = dict(key)
+                for bound, count in zip(LATENCY_BUCKETS, histogram.buckets):
+                    yield f"{PREFIX}_{name}_bucket{{{_labels(**labels, le=bound)}}} {count}\n"
+                yield (
+                    f"{PREFIX}_{name}_bucket{{{_labels(**labels, le='+Inf')}}} "
+                    f"{histogram.count}\n"
+                    f"{PREFIX}_{name}_sum{{{_labels(**labels)}}} {histogram.total}\n"
+                    f"{PREFIX}_{name}_count{{{_labels(**labels)}}} {histogram.count}\n"
+                )
+
+        yield (
+            f"# TYPE {PREFIX}_exporter_scrapes_total counter\n"
+            f"{PREFIX}_exporter_scrapes_total {self.scrapes}\n"
+        )
+
+    async def _handle_metrics(self, request: web.Request) -> web.StreamResponse:
+        """Stream the metrics, sending each chunk as it fills."""
+        self.scrapes += 1
+        response = web.StreamResponse(headers={"Content-Type": CONTENT_TYPE})
+        response.enable_chunked_encoding()
+        await response.prepare(request)
+
+        buffer: list[str] = []
+        size = 0
+        for text in self.render():
+            buffer.append(text)
+            size += len(text)
+            if size >= CHUNK_SIZE:
+                await response.write("".join(buffer).encode())
+                buffer, size = [], 0
+
+        if buffer:
+            await response.write("".join(buffer).encode())
+        await response.write_eof()
+        return response
+
+    async def start(self) -> None:
+        """Start serving /metrics, and polling if an interval is set."""
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle_metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self._host, self._port).start()
+
+        if self.poll_interval is not None:
+            self._poll_task = asyncio.create_task(
+                poll_forever(self._controller.refresh, self.poll_interval, "Exporter")
+            )
+        _LOGGER.info(
+            "Exporter listening on http://%s:%s/metrics", self._host, self.port
+        )
+
+    async def stop(self) -> None:
+        """Stop polling and serving."""
+        if self._poll_task:
+            self._poll_task.cancel()
+            self._poll_task = None
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "MasterthermExporter":
+        """Start the exporter as a context manager."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        """Stop the exporter."""
+        await self.stop()
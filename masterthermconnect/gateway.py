@@ -0,0 +1,287 @@
+"""Modbus TCP Caching Gateway, shares one heat pump connection with many clients."""
+
+import asyncio
+import ctypes
+import logging
+from typing import Any
+
+from pymodbus.datastore import ModbusBaseSlaveContext, ModbusServerContext
+from pymodbus.exceptions import ModbusException
+from pymodbus.pdu import ExceptionResponse
+from pymodbus.server import ModbusTcpServer
+
+from masterthermconnect.exceptions import MasterthermConnectionError
+from masterthermconnect.modbus import MasterthermModbus
+from masterthermconnect.modbusmap import ADDRESS_SPACE, MAPPING
+from masterthermconnect.polling import poll_forever
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+
+class GatewayContext(ModbusBaseSlaveContext):
+    """Slave context answering reads from the gateway cache."""
+
+    def __init__(self, gateway: "MasterthermModbusGateway") -> None:
+        """Initialise the cache."""
+        self._gateway = gateway
+        self.hold: list[int] = [0] * ADDRESS_SPACE
+        self.coil: list[bool] = [False] * ADDRESS_SPACE
+
+    def reset(self) -> None:
+        """Reset the cache to zero."""
+        self.hold = [0] * ADDRESS_SPACE
+        self.coil = [False] * ADDRESS_SPACE
+
+    def _store_type(self, fc_as_hex: int) -> str:
+        """Return coil or hold for the function code."""
+        return "coil" if self.decode(fc_as_hex) in ("c", "d") else "hold"
+
+    def getValues(self, fc_as_hex: int, address: int, count: int = 1) -> Any:
+        """Get count values from the cache, error code if out of range."""
+        if address < 0 or address + count > ADDRESS_SPACE:
+            return ExceptionResponse.ILLEGAL_ADDRESS
+
+        store = self.coil if self._store_type(fc_as_hex) == "coil" else self.hold
+        return store[address : address + count]
+
+    def setValues(self, fc_as_hex: int, address: int, values: Any) -> None | int:
+        """Update the cache, writes are only made through async_setValues."""
+        self.update(self._store_type(fc_as_hex), address, values)
+        return None
+
+    def update(self, reg_type: str, address: int, values: Any) -> None:
+        """Update the cached coil or hold values from address."""
+        if reg_type == "coil":
+            self.coil[address : address + len(values)] = [bool(v) for v in values]
+        else:
+            self.hold[address : address + len(values)] = list(values)
+
+    async def async_getValues(
+        self, fc_as_hex: int, address: int, count: int = 1
+    ) -> Any:
+        """Get values from the cache, refreshing first if too stale."""
+        if not await self._gateway.ensure_fresh():
+            return ExceptionResponse.GATEWAY_NO_RESPONSE
+
+        self._gateway.cache_hits += 1
+        return self.getValues(fc_as_hex, address, count)
+
+    async def async_setValues(
+        self, fc_as_hex: int, address: int, values: Any
+    ) -> None | int:
+        """Pass the write through to the heat pump, then update the cache."""
+        return await self._gateway.write(
+            self._store_type(fc_as_hex), address, list(values)
+        )
+
+
+class MasterthermModbusGateway:
+    """Caching Modbus TCP Gateway in front of a single heat pump.
+
+    The gateway owns the only upstream connection and polls all registers on
+    an interval, downstream Modbus TCP clients are answered from the cache.
+    Writes are passed through to the heat pump in the order received.
+    """
+
+    def __init__(
+        self,
+        addr: str,
+        mt_type: str,
+        upstream_port: int = 502,
+        slave: int = 1,
+        host: str = "0.0.0.0",
+        port: int = 5020,
+        poll_interval: float = 10.0,
+        max_staleness: float = 30.0,
+    ) -> None:
+        """Initialise the Gateway.
+
+        Args:
+            addr: The heat pump IP Address
+            mt_type: The register mapping of the heat pump, mt_0 or mt_1
+            upstream_port: The heat pump Modbus port
+            slave: The slave id of the heat pump, also served downstream
+            host: The address to listen on for downstream clients
+            port: The port to listen on for downstream clients, 0 for any
+            poll_interval: Seconds between polls of the heat pump
+            max_staleness: Maximum age in seconds of cached values served,
+                older values are refreshed before answering
+
+        Raises:
+            ValueError: Invalid type, must be one of mt_0 or mt_1
+
+        """
+        self._modbus = MasterthermModbus(addr, mt_type, port=upstream_port)
+        self._reg_map = MAPPING[mt_type]
+        self._slave = slave
+        self._host = host
+        self._port = port
+        self.poll_interval = poll_interval
+        self.max_staleness = max_staleness
+
+        self.context = GatewayContext(self)
+        self._server: ModbusTcpServer | None = None
+        self._poll_task: asyncio.Task | None = None
+        self._lock = asyncio.Lock()
+        self._last_poll: float | None = None
+
+        self.cache_hits = 0
+        self.upstream_polls = 0
+        self.upstream_writes = 0
+
+    @property
+    def port(self) -> int:
+        """Return the port the gateway is listening on."""
+        if self._server and self._server.transport:
+            return self._server.transport.sockets[0].getsockname()[1]
+        return self._port
+
+    def age(self) -> float | None:
+        """Return the age in seconds of the cache, None if never polled."""
+        if self._last_poll is None:
+            return None
+        return asyncio.get_running_loop().time() - self._last_poll
+
+    async def poll(self) -> bool:
+        """Read all registers from the heat pump in to the cache.
+
+        Returns:
+            success (bool): True if the cache was updated.
+
+        """
+        async with self._lock:
+            return await self._poll()
+
+    async def _poll(self) -> bool:
+        """Poll the heat pump, the lock must be held."""
+        try:
+            raw = await self._modbus.read_raw_registers(self._slave)
+        except (MasterthermConnectionError, ModbusException) as ex:
+            _LOGGER.warning("Gateway poll failed: %s", ex)
+            return False
+
+        for prefix, values in raw.items():
+            reg = self._reg_map[prefix]
+            self.context.update(reg["type"], reg["start"], values)
+
+        self.upstream_polls += 1
+        self._last_poll = asyncio.get_running_loop().time()
+        return True
+
+    async def ensure_fresh(self) -> bool:
+        """Make sure the cache is within the maximum staleness.
+
+        Concurrent callers share a single poll of the heat pump.
+
+        Returns:
+            fresh (bool): True if the cache can be served.
+
+        """
+        age = self.age()
+        if age is not None and age <= self.max_staleness:
+            return True
+
+        async with self._lock:
+            # Another caller may have refreshed while waiting for the lock.
+            age = self.age()
+            if age is not None and age <= self.max_staleness:
+                return True
+
+            return await self._poll()
+
+    def _register(
+        self, reg_type: str, address: int, raw: int | bool
+    ) -> tuple[str, Any]:
+        """Return the register name and value for a raw value at an address."""
+        for prefix, reg in self._reg_map.items():
+            index = address - reg["start"]
+            if reg["type"] == reg_type and 0 <= index < 600:
+                match prefix:
+                    case "A":
+                        value: Any = float(ctypes.c_short(raw).value) / 10.0
+                    case "I":
+                        value = ctypes.c_short(raw).value
+                    case _:
+                        value = bool(raw)
+                return f"{prefix}_{index}", value
+
+        raise ValueError(f"Address {address} is not mapped")
+
+    async def write(
+        self, reg_type: str, address: int, values: list[int | bool]
+    ) -> None | int:
+        """Write raw values through to the heat pump, in the order received.
+
+        Args:
+            reg_type: coil or hold
+            address: The start address
+            values: The raw values to write
+
+        Returns:
+            None if success or the Modbus exception code.
+
+        """
+        try:
+            registers = dict(
+                self._register(reg_type, address + i, raw)
+                for i, raw in enumerate(values)
+            )
+        except ValueError as ex:
+            _LOGGER.warning("Gateway write rejected: %s", ex)
+            return ExceptionResponse.ILLEGAL_ADDRESS
+
+        async with self._lock:
+            try:
+                success = await self._modbus.set_registers(
+                    self._slave, registers, verify=False
+                )
+            except ValueError as ex:
+                _LOGGER.warning("Gateway write rejected: %s", ex)
+                return ExceptionResponse.ILLEGAL_ADDRESS
+            except (MasterthermConnectionError, ModbusException) as ex:
+                _LOGGER.warning("Gateway write failed: %s", ex)
+                return ExceptionResponse.GATEWAY_NO_RESPONSE
+
+            if not success:
+                return ExceptionResponse.SLAVE_FAILURE
+
+            self.upstream_writes += 1
+            self.context.update(reg_type, address, values)
+
+        return None
+
+    async def start(self) -> None:
+        """Connect to the heat pump and start serving downstream clients."""
+        if not await self._modbus.connect():
+            _LOGGER.warning("Gateway failed to connect, will keep retrying.")
+
+        self._server = ModbusTcpServer(
+            context=ModbusServerContext(
+                slaves={self._slave: self.context}, single=False
+            ),
+            address=(self._host, self._port),
+        )
+        await self._server.serve_forever(background=True)
+        self._poll_task = asyncio.create_task(
+            poll_forever(self.poll, self.poll_interval, "Gateway")
+        )
+        _LOGGER.info("Gateway listening on %s:%s", self._host, self.port)
+
+    async def stop(self) -> None:
+        """Stop polling and serving, closes the heat pump connection."""
+        if self._poll_task:
+            self._poll_task.cancel()
+            self._poll_task = None
+        if self._server:
+            await self._server.shutdown()
+            self._server = None
+        self._modbus.close()
+
+    async def __aenter__(self) -> "MasterthermModbusGateway":
+        """Start the gateway as a context manager."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        """Stop the gateway."""
+        await self.stop()
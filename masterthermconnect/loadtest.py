@@ -0,0 +1,306 @@
+"""Load test the controller polling path with many accounts against a stand-in."""
+
+import asyncio
+import logging
+import platform
+import threading
+import time
+from typing import Any
+
+from aiohttp import ClientSession, ClientTimeout, TCPConnector
+
+from masterthermconnect.__version__ import __version__
+from masterthermconnect.apisimulator import MasterthermAPISimulator
+from masterthermconnect.bench import percentile
+from masterthermconnect.controller import MasterthermController
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+# Seconds between loop lag samples.
+LAG_INTERVAL = 0.05
+
+# Accounts connected at the same time when a step adds accounts.
+CONNECT_CONCURRENCY = 50
+
+# Random offset added to each refresh, as a fraction of the interval.
+JITTER = 0.1
+
+
+class _StandInThread:
+    """Run the API stand-in on its own thread and loop.
+
+    The stand-in then does not add to the loop lag of the controllers, it
+    still shares the interpreter so the CPU use of both is measured.
+    """
+
+    def __init__(self, **kwargs: Any) -> None:
+        """Initialise with the MasterthermAPISimulator arguments."""
+        self._kwargs = kwargs
+        self._started = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self.simulator: MasterthermAPISimulator | None = None
+
+    def _run(self) -> None:
+        """Serve until stopped."""
+
+        async def serve() -> None:
+            async with MasterthermAPISimulator(**self._kwargs) as simulator:
+                self.simulator = simulator
+                self._started.set()
+                while not self._stop.is_set():
+                    await asyncio.sleep(0.05)
+
+        asyncio.run(serve())
+
+    def __enter__(self) -> MasterthermAPISimulator:
+        """Start the stand-in and return it."""
+        self._thread.start()
+        if not self._started.wait(10):
+            raise RuntimeError("The API stand-in did not start")
+        return self.simulator
+
+    def __exit__(self, *args: Any) -> None:
+        """Stop the stand-in."""
+        self._stop.set()
+        self._thread.join()
+
+
+async def _lag_monitor(lags: list[float]) -> None:
+    """Record how late the loop wakes a sleeping task, until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(max(loop.time() - start - LAG_INTERVAL, 0.0))
+
+
+async def _add_controllers(
+    controllers: list[MasterthermController],
+    count: int,
+    session: ClientSession,
+    url: str,
+    api_version: str,
+    data_refresh: int,
+) -> None:
+    """Connect new accounts and load their devices, outside the measurement."""
+    semaphore = asyncio.Semaphore(CONNECT_CONCURRENCY)
+
+    async def add(index: int) -> MasterthermController:
+        async with semaphore:
+            controller = MasterthermController()
+            await controller.enable_api(
+                f"load{index}", "load", session, api_version, base_url=url
+            )
+            controller.set_refresh_rate(
+                data_refresh_seconds=data_refresh, jitter=JITTER
+            )
+            await controller.connect()
+            await controller.refresh_devices(full_load=True)
+            return controller
+
+    first = len(controllers)
+    controllers.extend(
+        await asyncio.gather(*(add(first + index) for index in range(count)))
+    )
+
+
+async def _poll(
+    controller: MasterthermController,
+    end: float,
+    tick: float,
+    totals: dict[str, int],
+    poll_times: list[float],
+    intervals: list[float],
+) -> None:
+    """Call refresh every tick until the end, as an integration would.
+
+    The seconds between refreshes of each device are recorded, unlike a
+    count over the window they do not depend on when the window started.
+    """
+    loop = asyncio.get_running_loop()
+    last: dict[str, float] = {}
+    while loop.time() < end:
+        start = time.perf_counter()
+        results = await controller.refresh()
+        if results:
+            poll_times.append(time.perf_counter() - start)
+        for device_id, result in results.items():
+            if result is not True:
+                totals["errors"] += 1
+                continue
+
+            totals["refreshes"] += 1
+            if device_id in last:
+                intervals.append(loop.time() - last[device_id])
+            last[device_id] = loop.time()
+        await asyncio.sleep(tick)
+
+
+async def _measure(
+    controllers: list[MasterthermController],
+    duration: float,
+    tick: float,
+    simulator: MasterthermAPISimulator,
+) -> dict[str, Any]:
+    """Poll all controllers for the duration and return the measurements."""
+    lags: list[float] = []
+    poll_times: list[float] = []
+    intervals: list[float] = []
+    totals = {"refreshes": 0, "errors": 0}
+    requests = simulator.requests
+
+    loop = asyncio.get_running_loop()
+    monitor = asyncio.create_task(_lag_monitor(lags))
+    start = time.perf_counter()
+    end = loop.time() + duration
+    await asyncio.gather(
+        *(
+            _poll(controller, end, tick, totals, poll_times, intervals)
+            for controller in controllers
+        )
+    )
+    elapsed = time.perf_counter() - start
+    monitor.cancel()
+
+    return {
+        "elapsed": elapsed,
+        "refreshes": totals["refreshes"],
+        "errors": totals["errors"],
+        "requests": simulator.requests - requests,
+        "lags": lags,
+        "poll_times": poll_times,
+        "intervals": intervals,
+    }
+
+
+async def run_load(
+    steps: list[int],
+    modules: int = 1,
+    units: int = 1,
+    api_version: str = "v1",
+    data_refresh: int = 10,
+    duration: float | None = None,
+    tick: float = 1.0,
+    latency: float = 0.0,
+    drift: float = 0.0,
+    register_count: int = 600,
+    connections: int = 100,
+    behind_ratio: float = 0.8,
+    stop_when_behind: bool = True,
+) -> dict[str, Any]:
+    """Poll an increasing number of accounts and find where polling falls behind.
+
+    Every account is its own controller sharing one ClientSession, polled
+    with refresh every tick as an integration would. Each step adds accounts
+    up to the step total and measures for the duration. A step falls behind
+    when the mean seconds between refreshes of a device is longer than
+    expected, the interval with the average jitter and tick added, divided
+    by behind_ratio.
+
+    Args:
+        steps: The total accounts for each step, e.g. [10, 100, 1000]
+        modules: The modules per account
+        units: The units per module
+        api_version: The API version, v1 or v2
+        data_refresh: Seconds between data refreshes of a device
+        duration: Seconds measured per step, default three times data_refresh
+        tick: Seconds between refresh calls of a controller
+        latency: Seconds added to every stand-in request
+        drift: Maximum change of the stand-in analog values per request
+        register_count: The A_, D_ and I_ registers per unit
+        connections: The connection limit of the shared ClientSession
+        behind_ratio: The fraction of the expected refresh rate below which
+            polling is behind
+        stop_when_behind: Optional, skip the steps after the first behind
+
+    Returns:
+        results (dict): Per step the loop lag, throughput and memory per
+            device, and falls_behind_at, the accounts of the first step behind.
+
+    """
+    duration = duration if duration is not None else data_refresh * 3.0
+    expected = data_refresh * (1 + JITTER / 2) + tick / 2
+    results: dict[str, Any] = {
+        "version": __version__,
+        "python": platform.python_version(),
+        "api_version": api_version,
+        "modules": modules,
+        "units": units,
+        "data_refresh": data_refresh,
+        "expected_interval_s": expected,
+        "duration": duration,
+        "steps": [],
+        "falls_behind_at": None,
+    }
+
+    controllers: list[MasterthermController] = []
+    with _StandInThread(
+        api_version=api_version,
+        modules=modules,
+        units=units,
+        register_count=register_count,
+        latency=latency,
+        drift=drift,
+    ) as simulator:
+        async with ClientSession(
+            connector=TCPConnector(limit=connections),
+            timeout=ClientTimeout(total=30),
+        ) as session:
+            for accounts in steps:
+                setup = time.perf_counter()
+                await _add_controllers(
+                    controllers,
+                    accounts - len(controllers),
+                    session,
+                    simulator.url,
+                    api_version,
+                    data_refresh,
+                )
+                setup = time.perf_counter() - setup
+
+                measured = await _measure(controllers, duration, tick, simulator)
+                devices = sum(len(c.get_devices()) for c in controllers)
+                memory = sum(sum(c.get_memory_usage().values()) for c in controllers)
+                intervals = measured["intervals"]
+                interval = sum(intervals) / len(intervals) if intervals else None
+                step = {
+                    "accounts": len(controllers),
+                    "devices": devices,
+                    "setup_seconds": setup,
+                    "refreshes_due_per_s": devices / expected,
+                    "refreshes_per_s": devices / interval if interval else 0.0,
+                    "refresh_interval_s": {
+                        "mean": interval,
+                        "p99": percentile(intervals, 99),
+                    },
+                    "requests_per_s": measured["requests"] / measured["elapsed"],
+                    "refresh_errors": measured["errors"],
+                    "loop_lag_ms": {
+                        "p50": percentile(measured["lags"], 50) * 1000,
+                        "p99": percentile(measured["lags"], 99) * 1000,
+                        "max": max(measured["lags"], default=0.0) * 1000,
+                    },
+                    "poll_ms": {
+                        "p50": percentile(measured["poll_times"], 50) * 1000,
+                        "p99": percentile(measured["poll_times"], 99) * 1000,
+                    },
+                    "memory_per_device_bytes": memory / devices if devices else 0,
+                    "behind": interval is None or interval * behind_ratio > expected,
+                }
+                results["steps"].append(step)
+                _LOGGER.info(
+                    "%s accounts, %s devices: %.1f/%.1f refreshes/s, lag p99 %.1fms",
+                    step["accounts"],
+                    devices,
+                    step["refreshes_per_s"],
+                    step["refreshes_due_per_s"],
+                    step["loop_lag_ms"]["p99"],
+                )
+
+                if step["behind"]:
+                    results["falls_behind_at"] = results["falls_behind_at"] or accounts
+                    if stop_when_behind:
+                        break
+
+    return results
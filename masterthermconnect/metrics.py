@@ -0,0 +1,111 @@
+"""Request, Byte and Latency Counters for the API and Modbus transports."""
+
+from typing import Any
+
+# Upper bounds in seconds of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = tuple[tuple[str, str], ...]
+
+
+class Histogram:
+    """Count, sum and cumulative bucket counts of observed values."""
+
+    __slots__ = ("count", "total", "buckets")
+
+    def __init__(self) -> None:
+        """Initialise an empty histogram."""
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+
+    def observe(self, value: float) -> None:
+        """Add a value to the histogram."""
+        self.count += 1
+        self.total += value
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+
+
+class MasterthermMetrics:
+    """Counters and histograms updated by the transports as requests are made.
+
+    Values are keyed by name and labels, e.g. requests_total for
+    transport=api and operation=/api/v1/hp_data. Updating only touches a
+    dictionary so it is cheap enough to stay enabled.
+    """
+
+    def __init__(self) -> None:
+        """Initialise the metrics."""
+        self.counters: dict[str, dict[Labels, float]] = {}
+        self.histograms: dict[str, dict[Labels, Histogram]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        """Increase a counter by value."""
+        series = self.counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Add an observation, e.g. a latency in seconds, to a histogram."""
+        series = self.histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        if key not in series:
+            series[key] = Histogram()
+        series[key].observe(value)
+
+    def total(self, name: str, **labels: str) -> float:
+        """Return the sum of a counter, or histogram values, matching the labels.
+
+        Args:
+            name: The counter or histogram name
+            labels: Only series with these label values are included
+
+        Returns:
+            total (float): The sum over all matching series.
+
+        """
+        wanted = set(labels.items())
+        total = 0.0
+        for key, value in self.counters.get(name, {}).items():
+            if wanted <= set(key):
+                total += value
+        for key, histogram in self.histograms.get(name, {}).items():
+            if wanted <= set(key):
+                total += histogram.total
+
+        return total
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return a copy of all values, labels as dictionaries."""
+        return {
+            "counters": {
+                name: [
+                    {"labels": dict(key), "value": value}
+                    for key, value in series.items()
+                ]
+                for name, series in self.counters.items()
+            },
+            "histograms": {
+                name: [
+                    {
+                        "labels": dict(key),
+                        "count": histogram.count,
+                        "sum": histogram.total,
+                        "buckets": dict(zip(LATENCY_BUCKETS, histogram.buckets)),
+                    }
+                    for key, histogram in series.items()
+                ]
+                for name, series in self.histograms.items()
+            },
+        }
+
+    def reset(self) -> None:
+        """Clear all counters and histograms."""
+        self.counters.clear()
+        self.histograms.clear()
+
+
+# Shared by all clients in the process.
+METRICS = MasterthermMetrics()
@@ -2,120 +2,317 @@
 
 import ctypes
 import logging
+import time
 from typing import Any
 
 from pymodbus.client import AsyncModbusTcpClient
+from pymodbus.exceptions import ModbusException
 
-from masterthermconnect.modbusmap import MAPPING
+from masterthermconnect.deadline import within
+from masterthermconnect.exceptions import MasterthermConnectionError
+from masterthermconnect.metrics import METRICS
+from masterthermconnect.modbusmap import MAPPING, READ_ONLY
 
 _LOGGER: logging.Logger = logging.getLogger(__name__)
 
+# Modbus limits for the number of values in a single write multiple request.
+MAX_WRITE_REGISTERS = 123
+MAX_WRITE_COILS = 1968
+
 
 class MasterthermModbus:
     """Modbus API for Mastertherm Heatpumps."""
 
-    def __init__(self, addr: str, mt_type: str) -> None:
-        """Initialise the Modbus API."""
+    def __init__(
+        self,
+        addr: str,
+        mt_type: str,
+        port: int = 502,
+        timeout: float = 3,
+        client: Any = None,
+    ) -> None:
+        """Initialise the Modbus API.
+
+        Args:
+            addr: The heat pump IP Address
+            mt_type: The register mapping, mt_0 or mt_1
+            port: The Modbus port
+            timeout: Seconds to wait for a Modbus response
+            client: Optional, a pymodbus compatible client to use instead of
+                connecting to addr, e.g. a cassette recorder or replay
+
+        """
         if mt_type not in ["mt_0", "mt_1"]:
             _LOGGER.error("Invalid type %s, must be one of mt_0 or mt_1", type)
             raise ValueError("Invalid type, must be one of mt_0 or mt_1")
 
         self._reg_map = MAPPING[mt_type]
-        self._client = AsyncModbusTcpClient(addr)
+        self._client = client or AsyncModbusTcpClient(
+            addr, port=port, timeout=timeout, trace_packet=self._trace_packet
+        )
+
+    def _trace_packet(self, sending: bool, data: bytes) -> bytes:
+        """Count the bytes sent and received, the packet is not changed."""
+        METRICS.inc(
+            "bytes_sent_total" if sending else "bytes_received_total",
+            len(data),
+            transport="modbus",
+        )
+        return data
+
+    async def _request(self, operation: str, call: Any) -> Any:
+        """Await a client request, recording the count, latency and errors."""
+        METRICS.inc("requests_total", transport="modbus", operation=operation)
+        start = time.perf_counter()
+        try:
+            result = await call
+        except ModbusException:
+            METRICS.inc("request_errors_total", transport="modbus", operation=operation)
+            raise
+
+        METRICS.observe(
+            "request_seconds",
+            time.perf_counter() - start,
+            transport="modbus",
+            operation=operation,
+        )
+        if result.isError():
+            METRICS.inc("request_errors_total", transport="modbus", operation=operation)
+        return result
 
     async def connect(self) -> bool:
         """Connect to the Modbus Client."""
         try:
-            await self._client.connect()
+            return await self._client.connect()
         except Exception as e:
             _LOGGER.error(f"Error connecting to Modbus: {e}")
             return False
 
-        return True
-
     def close(self) -> None:
         """Close the Modbus Client connection."""
         self._client.close()
 
-    async def _read_a_registers(self, slave: int) -> dict[str, Any]:
-        """Read all A registers from the slave."""
-        reg: dict[str, Any] = {}
-
-        start = self._reg_map["A"]["start"]
-        for i in range(0, 6):
-            result = await self._client.read_holding_registers(
-                (i * 100) + start, count=100, slave=slave
-            )
-            for j in range(0, 100):
-                reg[f"A_{(i * 100) + j}"] = (
-                    float(ctypes.c_short(result.registers[j]).value) / 10.0
+    async def _read_block(
+        self, slave: int, reg_type: str, address: int, count: int
+    ) -> list[int | bool]:
+        """Read a block of raw holding register or coil values from the slave."""
+        match reg_type:
+            case "hold":
+                result = await self._request(
+                    "read_holding_registers",
+                    self._client.read_holding_registers(
+                        address, count=count, slave=slave
+                    ),
+                )
+            case "coil":
+                result = await self._request(
+                    "read_coils",
+                    self._client.read_coils(address, count=count, slave=slave),
                 )
 
-        return reg
+        if result.isError():
+            _LOGGER.error("Modbus read error at %s: %s", address, result)
+            raise MasterthermConnectionError("4", f"Modbus read error at {address}")
 
-    async def _read_i_registers(self, slave: int) -> dict[str, Any]:
-        """Read all I registers from the slave."""
-        reg: dict[str, Any] = {}
+        return result.registers if reg_type == "hold" else result.bits[:count]
 
-        start = self._reg_map["I"]["start"]
-        for i in range(0, 6):
-            result = await self._client.read_holding_registers(
-                (i * 100) + start, count=100, slave=slave
-            )
-            for j in range(0, 100):
-                reg[f"I_{(i * 100) + j}"] = ctypes.c_short(result.registers[j]).value
+    async def read_raw_registers(
+        self, slave: int, deadline: float | None = None
+    ) -> dict[str, list[int | bool]]:
+        """Read the raw values of all A, D and I Registers.
 
-        return reg
+        Args:
+            slave: The Modbus slave id
+            deadline: Optional, the loop time all blocks are read by, the
+                block being read is cancelled when it passes
 
-    async def _read_d_registers(self, slave: int) -> dict[str, Any]:
-        """Read all D registers from the slave."""
-        reg: dict[str, Any] = {}
-        start = self._reg_map["D"]["start"]
-        reg_type = self._reg_map["D"]["type"]
-        for i in range(0, 6):
-            match reg_type:
-                case "hold":
-                    result = await self._client.read_holding_registers(
-                        (i * 100) + start, count=100, slave=slave
-                    )
-                case "coil":
-                    result = await self._client.read_coils(
-                        (i * 100) + start, count=100, slave=slave
+        Returns:
+            registers (dict): The raw values for A, D and I, indexed by number.
+
+        Raises:
+            MasterthermConnectionError: The slave returned an error.
+            MasterthermDeadlineError: The deadline passed.
+
+        """
+        raw: dict[str, list[int | bool]] = {}
+        async with within(deadline, "read_raw_registers"):
+            for prefix, reg in self._reg_map.items():
+                raw[prefix] = []
+                for i in range(0, 6):
+                    raw[prefix].extend(
+                        await self._read_block(
+                            slave, reg["type"], (i * 100) + reg["start"], 100
+                        )
                     )
 
-            for j in range(0, 100):
-                reg[f"D_{(i * 100) + j}"] = result.bits[j]
+        return raw
+
+    def _decode_registers(self, raw: dict[str, list[int | bool]]) -> dict[str, Any]:
+        """Convert raw values to A, D and I registers."""
+        reg: dict[str, Any] = {}
+        for j, value in enumerate(raw["A"]):
+            reg[f"A_{j}"] = float(ctypes.c_short(value).value) / 10.0
+        for j, value in enumerate(raw["D"]):
+            reg[f"D_{j}"] = bool(value)
+        for j, value in enumerate(raw["I"]):
+            reg[f"I_{j}"] = ctypes.c_short(value).value
 
         return reg
 
-    async def _read_registers(
-        self, slave: int, reg_type: str, start: int
+    async def get_registers(
+        self, slave: int, deadline: float | None = None
     ) -> dict[str, Any]:
-        """Read all registers from the slave."""
-        reg: dict[str, Any] = {}
+        """Read All A, D and I Registers and return, see read_raw_registers."""
+        raw = await self.read_raw_registers(slave, deadline)
 
-        for i in range(0, 6):
-            match reg_type:
-                case "hold":
-                    result = await self._client.read_holding_registers(
-                        (i * 100) + start, count=100, slave=slave
-                    )
-                case "coil":
-                    result = await self._client.read_coils(
-                        (i * 100) + start, count=100, slave=slave
-                    )
+        start = time.perf_counter()
+        registers = self._decode_registers(raw)
+        METRICS.inc(
+            "decode_seconds_total", time.perf_counter() - start, transport="modbus"
+        )
+        return registers
 
-            for j in range(0, 100):
-                reg[f"I_{(i * 100) + j}"] = ctypes.c_short(result.registers[j]).value
+    def _register_address(self, register: str) -> tuple[str, int]:
+        """Return the function type and address for a register, e.g. A_191.
 
-        return reg
+        Raises:
+            ValueError: Register is unknown or marked read only.
 
-    async def get_registers(self, slave: int) -> dict[str, Any]:
-        """Read All A, D and I Registers and return."""
-        reg: dict[str, Any] = {}
+        """
+        prefix, _, number = register.partition("_")
+        if prefix not in self._reg_map or not number.isdigit():
+            raise ValueError(f"Unknown register {register}")
 
-        reg.update(await self._read_a_registers(slave))
-        reg.update(await self._read_d_registers(slave))
-        reg.update(await self._read_i_registers(slave))
+        index = int(number)
+        if index >= 600:
+            raise ValueError(f"Register {register} is out of range")
 
-        return reg
+        for first, last in READ_ONLY[prefix]:
+            if first <= index <= last:
+                raise ValueError(f"Register {register} is read only")
+
+        return self._reg_map[prefix]["type"], self._reg_map[prefix]["start"] + index
+
+    def _encode_value(self, register: str, reg_type: str, value: Any) -> int | bool:
+        """Convert a register value into the raw value written to the slave."""
+        match register[0]:
+            case "A":
+                raw = round(float(value) * 10)
+            case "I":
+                raw = int(value)
+            case _:
+                return bool(value) if reg_type == "coil" else int(bool(value))
+
+        if not -32768 <= raw <= 32767:
+            raise ValueError(f"Value {value} out of range for {register}")
+
+        return raw & 0xFFFF
+
+    def _group_writes(
+        self, values: dict[str, Any]
+    ) -> list[tuple[str, int, list[int | bool]]]:
+        """Group register values into runs of adjacent addresses per function type."""
+        writes: dict[tuple[str, int], int | bool] = {}
+        for register, value in values.items():
+            reg_type, address = self._register_address(register)
+            writes[(reg_type, address)] = self._encode_value(register, reg_type, value)
+
+        runs: list[tuple[str, int, list[int | bool]]] = []
+        for (reg_type, address), raw in sorted(writes.items()):
+            limit = MAX_WRITE_COILS if reg_type == "coil" else MAX_WRITE_REGISTERS
+            if runs:
+                last_type, last_address, last_values = runs[-1]
+                if (
+                    last_type == reg_type
+                    and last_address + len(last_values) == address
+                    and len(last_values) < limit
+                ):
+                    last_values.append(raw)
+                    continue
+
+            runs.append((reg_type, address, [raw]))
+
+        return runs
+
+    async def set_registers(
+        self,
+        slave: int,
+        values: dict[str, Any],
+        verify: bool = True,
+        deadline: float | None = None,
+    ) -> bool:
+        """Set one or more registers, e.g. {"A_191": 21.5, "D_3": True}.
+
+        Adjacent registers of the same type are sent as a single write multiple
+        request, the written runs are then read back to verify the values.
+
+        Updating any registry setting can cause the system to stop working,
+        registers known to be read only are rejected.
+
+        Args:
+            slave: The Modbus slave id
+            values: The registers and values to set
+            verify: Optional, default True, read back the written registers.
+            deadline: Optional, the loop time to finish by, see deadline.within
+
+        Returns:
+            success (bool): True if all writes succeeded and verified.
+
+        Raises:
+            ValueError: A register is unknown, read only or the value out of range.
+            MasterthermDeadlineError: The deadline passed, some runs may have
+                been written.
+
+        """
+        runs = self._group_writes(values)
+        async with within(deadline, "set_registers"):
+            return await self._write_runs(slave, runs, verify)
+
+    async def _write_runs(
+        self, slave: int, runs: list[tuple[str, int, list[int | bool]]], verify: bool
+    ) -> bool:
+        """Write the runs of raw values and optionally read them back."""
+        for reg_type, address, raw in runs:
+            _LOGGER.info("Write %s %s registers at %s", len(raw), reg_type, address)
+            # Copy the values, pymodbus pads coil values in place.
+            if reg_type == "coil":
+                result = await self._request(
+                    "write_coils",
+                    self._client.write_coils(address, list(raw), slave=slave),
+                )
+            else:
+                result = await self._request(
+                    "write_registers",
+                    self._client.write_registers(address, list(raw), slave=slave),
+                )
+
+            if result.isError():
+                _LOGGER.error("Modbus write error at %s: %s", address, result)
+                return False
+
+        if not verify:
+            return True
+
+        for reg_type, address, raw in runs:
+            if reg_type == "coil":
+                result = await self._request(
+                    "read_coils",
+                    self._client.read_coils(address, count=len(raw), slave=slave),
+                )
+                read = result.bits[: len(raw)] if not result.isError() else None
+            else:
+                result = await self._request(
+                    "read_holding_registers",
+                    self._client.read_holding_registers(
+                        address, count=len(raw), slave=slave
+                    ),
+                )
+                read = result.registers if not result.isError() else None
+
+            if read != raw:
+                _LOGGER.error(
+                    "Modbus verify failed at %s: %s != %s", address, read, raw
+                )
+                return False
+
+        return True
@@ -27,3 +27,15 @@ MAPPING = {
         "I": {"type": "hold", "start": 5003},
     },
 }
+
+# Size of the Modbus address space used, covers the highest register mapped.
+ADDRESS_SPACE = 5610
+
+# Registers that are read by the heat pump but must never be written locally,
+# these are the measurements, status flags and counters known so far. Ranges
+# are inclusive register numbers and apply to all mappings.
+READ_ONLY = {
+    "A": [(1, 128), (211, 211)],
+    "D": [(5, 32)],
+    "I": [(10, 16), (100, 101), (405, 405)],
+}
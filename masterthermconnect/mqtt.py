@@ -0,0 +1,357 @@
+"""MQTT Bridge, publishes device changes and applies set commands."""
+
+import asyncio
+import importlib
+import json
+import logging
+from collections.abc import Iterator
+from contextlib import AsyncExitStack
+from typing import Any
+
+from masterthermconnect.changes import ChangeTracker
+from masterthermconnect.const import HC_MAP
+from masterthermconnect.controller import MasterthermController
+from masterthermconnect.datamap import DEVICE_DATA_MAP, HC0_NAME_REGISTERS
+from masterthermconnect.exceptions import MasterthermError
+from masterthermconnect.polling import poll_forever
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+TOPICS_REGISTER = "register"
+TOPICS_FIELD = "field"
+
+
+def load_mqtt() -> Any:
+    """Import and return the MQTT client module.
+
+    Raises:
+        ImportError: The optional MQTT dependency is missing.
+
+    """
+    try:
+        return importlib.import_module("aiomqtt")
+    except ImportError as ex:
+        raise ImportError(
+            f"The MQTT bridge is not installed, install masterthermconnect[mqtt]: {ex}"
+        ) from ex
+
+
+def _flatten(data: dict, prefix: str = "") -> Iterator[tuple[str, Any]]:
+    """Yield the normalized fields as topic paths and values, e.g. hc0/enabled."""
+    for key, value in data.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{key}/")
+        else:
+            yield f"{prefix}{key}", value
+
+
+def _field_registers(
+    data_map: dict, prefix: str = ""
+) -> Iterator[tuple[str, tuple[str, ...]]]:
+    """Yield the normalized fields as topic paths and the registers they read."""
+    for key, item in data_map.items():
+        if isinstance(item, dict):
+            yield from _field_registers(item, f"{prefix}{key}/")
+        else:
+            yield f"{prefix}{key}", (item,)
+
+
+# The registers each normalized field is computed from, the circuit names
+# other than hc0 come from the device info.
+FIELD_REGISTERS = {
+    **dict(_field_registers(DEVICE_DATA_MAP)),
+    **{f"{hc['id']}/enabled": (hc["register"],) for hc in HC_MAP.values()},
+    "hc0/name": tuple(HC0_NAME_REGISTERS),
+}
+
+
+def _payload(value: Any) -> str:
+    """Return the payload for a value, strings are sent as they are."""
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _value(payload: Any) -> Any:
+    """Return the value of a set payload, a number, bool or string."""
+    if isinstance(payload, bytes | bytearray):
+        payload = payload.decode()
+    if not isinstance(payload, str):
+        return payload
+    try:
+        return json.loads(payload)
+    except ValueError:
+        return payload
+
+
+class MasterthermMQTTBridge:
+    """Bridge the controller to an MQTT broker.
+
+    Values are published retained, only when they change, to
+    prefix/device_id/register/A_3 or prefix/device_id/data/hc0/enabled
+    depending on topics. With batch, every refresh also publishes the changes
+    of a device as one JSON object to prefix/device_id/state.
+
+    Set commands are taken from prefix/device_id/register/A_191/set, the
+    payload is the value, and written with controller.set_device_register
+    over Modbus or the API.
+
+    Discovery messages for Home Assistant are published retained when a
+    device is first seen.
+    """
+
+    def __init__(
+        self,
+        controller: MasterthermController,
+        host: str = "localhost",
+        port: int = 1883,
+        username: str | None = None,
+        password: str | None = None,
+        prefix: str = "masterthermconnect",
+        topics: str = TOPICS_REGISTER,
+        batch: bool = False,
+        discovery_prefix: str | None = "homeassistant",
+        poll_interval: float | None = None,
+        client: Any = None,
+    ) -> None:
+        """Initialise the Bridge.
+
+        Args:
+            controller: The connected controller to bridge
+            host: The MQTT broker address
+            port: The MQTT broker port
+            username: Optional, the MQTT username
+            password: Optional, the MQTT password
+            prefix: The topic prefix
+            topics: register or field, publish raw registers or normalized fields
+            batch: Optional, also publish the changes per refresh as JSON
+            discovery_prefix: The discovery topic prefix, None to not publish
+            poll_interval: Optional, seconds between calls to controller.refresh,
+                None to call publish after refreshing elsewhere
+            client: Optional, a connected aiomqtt style client, by default
+                one is created for host and port
+
+        Raises:
+            ValueError: Unknown topics, must be register or field
+
+        """
+        if topics not in (TOPICS_REGISTER, TOPICS_FIELD):
+            raise ValueError("Unknown topics, must be register or field")
+
+        self._controller = controller
+        self._host = host
+        self._port = port
+        self._username = username
+        self._password = password
+        self.prefix = prefix
+        self.topics = topics
+        self.batch = batch
+        self.discovery_prefix = discovery_prefix
+        self.poll_interval = poll_interval
+
+        self._client = client
+        self._stack: AsyncExitStack | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._tracker = ChangeTracker(controller)
+        self._discovered: set[str] = set()
+        self._lock = asyncio.Lock()
+        self.messages = 0
+        self.commands = 0
+
+    def _values(
+        self, module_id: str, unit_id: str, changes: list[str] | None = None
+    ) -> dict[str, Any]:
+        """Return the registers or normalized fields of a device.
+
+        Args:
+            module_id: The id of the module
+            unit_id: The id of the unit
+            changes: Optional, only the values read from these registers, all
+                values if not given, all fields if empty as the info changed
+
+        """
+        if self.topics == TOPICS_REGISTER:
+            registers = self._controller.get_device_registers(module_id, unit_id)
+            if changes is None:
+                return dict(registers)
+            return {register: registers[register] for register in changes}
+
+        fields = _flatten(self._controller.get_device_data(module_id, unit_id))
+        if not changes:
+            return dict(fields)
+        return {
+            field: value
+            for field, value in fields
+            if not set(FIELD_REGISTERS.get(field, ())).isdisjoint(changes)
+        }
+
+    async def _send(self, topic: str, payload: str, retain: bool = True) -> None:
+        """Publish a message."""
+        await self._client.publish(topic, payload, qos=0, retain=retain)
+        self.messages += 1
+
+    async def _discover(self, device_id: str, info: dict, values: dict) -> None:
+        """Publish the retained discovery config for every value of a device."""
+        device = {
+            "identifiers": [f"masterthermconnect_{device_id}"],
+            "name": info.get("unit_name") or device_id,
+            "manufacturer": "Mastertherm",
+            "model": info.get("hp_type", ""),
+        }
+        kind = "register" if self.topics == TOPICS_REGISTER else "data"
+        for key in values:
+            object_id = f"{device_id}_{key.replace('/', '_')}"
+            config = {
+                "name": key,
+                "unique_id": f"masterthermconnect_{object_id}",
+                "state_topic": f"{self.prefix}/{device_id}/{kind}/{key}",
+                "availability_topic": f"{self.prefix}/status",
+                "device": device,
+            }
+            await self._send(
+                f"{self.discovery_prefix}/sensor/masterthermconnect/{object_id}/config",
+                json.dumps(config),
+            )
+
+    async def publish(self) -> int:
+        """Publish the values changed since the last publish.
+
+        Call after refreshing the controller, done by the poll loop if
+        poll_interval is set.
+
+        Returns:
+            devices (int): The number of devices with changes.
+
+        """
+        async with self._lock:
+            kind = "register" if self.topics == TOPICS_REGISTER else "data"
+            devices = 0
+            for device_id, info in self._controller.get_devices().items():
+                module_id, unit_id = info["module_id"], info["unit_id"]
+                first = device_id not in self._tracker
+                changes = self._tracker.changed(module_id, unit_id)
+                if changes is None:
+                    continue
+
+                changed = self._values(module_id, unit_id, None if first else changes)
+                if not changed:
+                    continue
+
+                devices += 1
+                if self.discovery_prefix and device_id not in self._discovered:
+                    await self._discover(device_id, info, changed)
+                    self._discovered.add(device_id)
+
+                for key, value in changed.items():
+                    await self._send(
+                        f"{self.prefix}/{device_id}/{kind}/{key}", _payload(value)
+                    )
+                if self.batch:
+                    await self._send(
+                        f"{self.prefix}/{device_id}/state",
+                        json.dumps(changed),
+                        retain=False,
+                    )
+
+            return devices
+
+    async def handle_command(self, topic: str, payload: Any) -> bool:
+        """Apply a set command and publish the change.
+
+        Args:
+            topic: The topic, prefix/device_id/register/A_191/set
+            payload: The value to set
+
+        Returns:
+            success (bool): True if the register was set.
+
+        """
+        parts = topic[len(self.prefix) + 1 :].split("/")
+        if (
+            not topic.startswith(f"{self.prefix}/")
+            or len(parts) != 4
+            or parts[1] != "register"
+            or parts[3] != "set"
+        ):
+            _LOGGER.warning("Ignored MQTT command on %s", topic)
+            return False
+
+        self.commands += 1
+        device_id, register = parts[0], parts[2]
+        device = self._controller.get_devices().get(device_id)
+        if device is None:
+            _LOGGER.warning("Ignored MQTT command for unknown device %s", device_id)
+            return False
+
+        try:
+            result = await self._controller.set_device_register(
+                device["module_id"], device["unit_id"], register, _value(payload)
+            )
+        except (ValueError, MasterthermError) as ex:
+            _LOGGER.warning("MQTT set %s %s failed: %s", device_id, register, ex)
+            return False
+
+        if result:
+            await self.publish()
+        return result
+
+    async def _listen(self) -> None:
+        """Apply the set commands received."""
+        await self._client.subscribe(f"{self.prefix}/+/register/+/set")
+        async for message in self._client.messages:
+            await self.handle_command(str(message.topic), message.payload)
+
+    async def _poll(self) -> None:
+        """Refresh the due devices and publish the changes."""
+        await self._controller.refresh()
+        await self.publish()
+
+    async def start(self) -> None:
+        """Connect, publish the current values and listen for commands.
+
+        Raises:
+            ImportError: No client was given and aiomqtt is not installed.
+
+        """
+        self._stack = AsyncExitStack()
+        if self._client is None:
+            # The broker marks the bridge offline if the connection is lost.
+            mqtt = load_mqtt()
+            self._client = await self._stack.enter_async_context(
+                mqtt.Client(
+                    self._host,
+                    self._port,
+                    username=self._username,
+                    password=self._password,
+                    will=mqtt.Will(f"{self.prefix}/status", "offline", retain=True),
+                )
+            )
+
+        await self._send(f"{self.prefix}/status", "online")
+        await self.publish()
+        self._tasks.append(asyncio.create_task(self._listen()))
+        if self.poll_interval is not None:
+            self._tasks.append(
+                asyncio.create_task(
+                    poll_forever(self._poll, self.poll_interval, "MQTT")
+                )
+            )
+        _LOGGER.info("MQTT bridge publishing to %s/", self.prefix)
+
+    async def stop(self) -> None:
+        """Stop polling and listening, then disconnect."""
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+        if self._stack is not None:
+            await self._send(f"{self.prefix}/status", "offline")
+            await self._stack.aclose()
+            self._stack = None
+
+    async def __aenter__(self) -> "MasterthermMQTTBridge":
+        """Start the bridge as a context manager."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        """Stop the bridge."""
+        await self.stop()
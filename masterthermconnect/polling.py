@@ -0,0 +1,41 @@
+"""The poll loop shared by the servers, refreshes on an interval until cancelled."""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+import logging
+from typing import Any
+
+from masterthermconnect.exceptions import MasterthermError
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+# Longest wait between polls while they fail, in seconds.
+MAX_BACKOFF = 300
+
+
+async def poll_forever(
+    poll: Callable[[], Awaitable[Any]], interval: float, name: str
+) -> None:
+    """Call poll every interval seconds until cancelled.
+
+    A poll returning False or raising is logged and the wait doubles per
+    failure, up to MAX_BACKOFF, the loop never ends on an error so a server
+    does not keep serving stale data.
+
+    Args:
+        poll: The poll to call, e.g. refresh the controller and publish
+        interval: Seconds between polls
+        name: The server polling, used in the log messages
+
+    """
+    failures = 0
+    while True:
+        try:
+            failures = 0 if await poll() is not False else failures + 1
+        except MasterthermError as ex:
+            _LOGGER.warning("%s refresh failed: %s:%s", name, ex.status, ex.message)
+            failures += 1
+        except Exception:
+            _LOGGER.exception("%s poll failed", name)
+            failures += 1
+        await asyncio.sleep(min(interval * 2**failures, max(interval, MAX_BACKOFF)))
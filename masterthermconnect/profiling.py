@@ -0,0 +1,201 @@
+"""Opt-in CPU and Allocation Profiling scoped to controller refreshes."""
+
+import cProfile
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from types import FrameType
+from typing import Any
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+
+class MasterthermProfiler:
+    """Profile the refreshes made by a MasterthermController.
+
+    Used as a context manager the profiler attaches to the controller, every
+    refresh (refresh, refresh_devices, refresh_data and refresh_info) made
+    inside is then captured with:
+
+    - cProfile, exported as pstats for snakeviz, gprof2dot or flameprof.
+    - A stack sampler on the refreshing thread, exported as collapsed stacks
+      for flamegraph.pl, speedscope or inferno.
+    - tracemalloc, the peak per refresh and a snapshot at the start of the
+      first and end of the last refresh, exported as a tracemalloc dump.
+
+    Other tasks running on the event loop while a refresh awaits are included,
+    profile a quiet loop for the clearest results.
+    """
+
+    def __init__(
+        self,
+        controller: Any = None,
+        cpu: bool = True,
+        memory: bool = True,
+        sample_interval: float = 0.005,
+        frames: int = 25,
+    ) -> None:
+        """Initialise the Profiler.
+
+        Args:
+            controller: The MasterthermController to profile, optional if
+                attached with controller.profiler
+            cpu: Optional, capture cProfile and stack samples, default True
+            memory: Optional, trace allocations, default True
+            sample_interval: Seconds between stack samples, 0 to not sample
+            frames: The number of frames stored per tracemalloc trace
+
+        """
+        self._controller = controller
+        self.cpu = cpu
+        self.memory = memory
+        self.sample_interval = sample_interval
+        self.frames = frames
+
+        self.profile = cProfile.Profile()
+        self.stacks: Counter[str] = Counter()
+        self.refreshes: list[dict[str, float]] = []
+        self.first_snapshot: tracemalloc.Snapshot | None = None
+        self.last_snapshot: tracemalloc.Snapshot | None = None
+
+        self._depth = 0
+        self._started_tracemalloc = False
+        self._sampler: threading.Thread | None = None
+        self._sampling = threading.Event()
+
+    @contextmanager
+    def refresh(self) -> Iterator[None]:
+        """Capture a refresh, nested refreshes are part of the outer one."""
+        self._depth += 1
+        if self._depth > 1:
+            try:
+                yield
+            finally:
+                self._depth -= 1
+            return
+
+        current = 0
+        if self.memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(self.frames)
+                self._started_tracemalloc = True
+            if self.first_snapshot is None:
+                self.first_snapshot = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+
+        if self.cpu:
+            if self.sample_interval > 0:
+                self._start_sampler(threading.get_ident())
+            self.profile.enable()
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if self.cpu:
+                self.profile.disable()
+                self._stop_sampler()
+
+            peak = 0
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1] - current
+                self.last_snapshot = tracemalloc.take_snapshot()
+
+            self.refreshes.append({"seconds": seconds, "alloc_peak_bytes": peak})
+            self._depth -= 1
+
+    def _start_sampler(self, thread_id: int) -> None:
+        """Sample the stack of the refreshing thread in the background."""
+        self._sampling.set()
+        self._sampler = threading.Thread(
+            target=self._sample, args=(thread_id,), daemon=True
+        )
+        self._sampler.start()
+
+    def _stop_sampler(self) -> None:
+        """Stop the stack sampler."""
+        if self._sampler is not None:
+            self._sampling.clear()
+            self._sampler.join()
+            self._sampler = None
+
+    def _sample(self, thread_id: int) -> None:
+        """Count the collapsed stacks of a thread until stopped."""
+        while self._sampling.is_set():
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                self.stacks[_collapse(frame)] += 1
+            time.sleep(self.sample_interval)
+
+    def dump_stats(self, path: str) -> None:
+        """Write the CPU profile in the pstats format."""
+        self.profile.dump_stats(path)
+
+    def write_collapsed(self, path: str) -> None:
+        """Write the sampled stacks in the collapsed format, one per line."""
+        with open(path, "w", encoding="utf-8") as output:
+            for stack, count in self.stacks.most_common():
+                output.write(f"{stack} {count}\n")
+
+    def dump_allocations(self, path: str) -> None:
+        """Write the last allocation snapshot, load with tracemalloc.Snapshot.load."""
+        if self.last_snapshot is not None:
+            self.last_snapshot.dump(path)
+
+    def allocation_growth(self, limit: int = 10) -> list[tracemalloc.StatisticDiff]:
+        """Return the lines with the most memory growth over the refreshes."""
+        if self.first_snapshot is None or self.last_snapshot is None:
+            return []
+        return self.last_snapshot.compare_to(self.first_snapshot, "lineno")[:limit]
+
+    def export(self, prefix: str) -> list[str]:
+        """Write all captured profiles, e.g. prefix.pstats and prefix.collapsed.
+
+        Args:
+            prefix: The path and file name the extensions are added to
+
+        Returns:
+            paths (list): The files written.
+
+        """
+        paths = []
+        if self.cpu:
+            self.dump_stats(f"{prefix}.pstats")
+            self.write_collapsed(f"{prefix}.collapsed")
+            paths += [f"{prefix}.pstats", f"{prefix}.collapsed"]
+        if self.memory and self.last_snapshot is not None:
+            self.dump_allocations(f"{prefix}.tracemalloc")
+            paths.append(f"{prefix}.tracemalloc")
+
+        return paths
+
+    def __enter__(self) -> "MasterthermProfiler":
+        """Attach to the controller."""
+        if self._controller is not None:
+            self._controller.profiler = self
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Detach from the controller and stop tracing allocations."""
+        if self._controller is not None and self._controller.profiler is self:
+            self._controller.profiler = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+
+def _collapse(frame: FrameType | None) -> str:
+    """Return a stack as root first frames joined with semicolons."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_qualname} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
@@ -0,0 +1,310 @@
+"""WebSocket Push Server, sends device changes to clients as they happen."""
+
+import asyncio
+import json
+import logging
+from typing import Any
+
+from aiohttp import WSMsgType, web
+
+from masterthermconnect.changes import ChangeTracker
+from masterthermconnect.controller import MasterthermController
+from masterthermconnect.polling import poll_forever
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+# Sent in place of queued updates when a client falls behind.
+RESYNC = "resync"
+
+
+class PushClient:
+    """A connected client, its filter and queue of messages to send."""
+
+    def __init__(
+        self,
+        devices: set[str] | None = None,
+        prefixes: tuple[str, ...] = (),
+        queue_size: int = 16,
+    ) -> None:
+        """Initialise the client.
+
+        Args:
+            devices: Only send these devices, None for all
+            prefixes: Only send registers starting with these, e.g. A_, empty for all
+            queue_size: The messages queued before the client is resynced
+
+        """
+        self.devices = devices
+        self.prefixes = prefixes
+        self.queue: asyncio.Queue[str] = asyncio.Queue(queue_size)
+        self.resyncs = 0
+
+    @property
+    def key(self) -> tuple:
+        """Return the filter, clients with the same filter share messages."""
+        return (frozenset(self.devices) if self.devices else None, self.prefixes)
+
+    def wants(self, device_id: str) -> bool:
+        """Return True if the client wants the device."""
+        return self.devices is None or device_id in self.devices
+
+    def offer(self, message: str) -> None:
+        """Queue a message without waiting.
+
+        A client too slow to keep up has its queued updates replaced by a
+        single resync, the sender then sends a fresh snapshot, so a slow
+        client never holds back the others or grows without bound.
+        """
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(RESYNC)
+            self.resyncs += 1
+
+
+class MasterthermPushServer:
+    """WebSocket server pushing a snapshot and then only the changes.
+
+    Clients connect to /ws, optionally filtering with the query parameters
+    devices=10021_1,10022_1 and prefixes=A_,D_. The first message is a
+    snapshot of the filtered registers, every refresh then sends one update
+    message with the registers that changed. A client may send
+    {"devices": [...], "prefixes": [...]} to change its filter, a new
+    snapshot follows.
+    """
+
+    def __init__(
+        self,
+        controller: MasterthermController,
+        host: str = "0.0.0.0",
+        port: int = 8765,
+        poll_interval: float | None = None,
+        queue_size: int = 16,
+    ) -> None:
+        """Initialise the Server.
+
+        Args:
+            controller: The connected controller to push from
+            host: The address to listen on
+            port: The port to listen on, 0 for any
+            poll_interval: Optional, seconds between calls to controller.refresh,
+                None to call publish after refreshing elsewhere
+            queue_size: The messages queued per client before it is resynced
+
+        """
+        self._controller = controller
+        self._host = host
+        self._port = port
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+
+        self._runner: web.AppRunner | None = None
+        self._poll_task: asyncio.Task | None = None
+        self._clients: set[PushClient] = set()
+        self._tracker = ChangeTracker(controller)
+        self.updates = 0
+
+    @property
+    def port(self) -> int:
+        """Return the port the server is listening on."""
+        if self._runner and self._runner.addresses:
+            return self._runner.addresses[0][1]
+        return self._port
+
+    @property
+    def clients(self) -> int:
+        """Return the number of connected clients."""
+        return len(self._clients)
+
+    def _filtered(self, registers: Any, prefixes: tuple[str, ...]) -> dict[str, Any]:
+        """Return the registers starting with one of the prefixes."""
+        if not prefixes:
+            return dict(registers)
+        return {
+            register: value
+            for register, value in registers.items()
+            if register.startswith(prefixes)
+        }
+
+    def snapshot(self, client: PushClient) -> str:
+        """Return the snapshot message for a client."""
+        devices = {}
+        for device_id, info in self._controller.get_devices().items():
+            if not client.wants(device_id):
+                continue
+
+            view = self._controller.get_device_view(info["module_id"], info["unit_id"])
+            devices[device_id] = {
+                "version": view.version,
+                "info": dict(view.info),
+                "registers": self._filtered(view.registers, client.prefixes),
+            }
+
+        return json.dumps(
+            {
+                "type": "snapshot",
+                "version": self._controller.version,
+                "devices": devices,
+            }
+        )
+
+    def _changes(self) -> dict[str, tuple[int, dict[str, Any]]]:
+        """Return the registers changed per device since the last publish."""
+        changes = {}
+        for device_id, info in self._controller.get_devices().items():
+            module_id, unit_id = info["module_id"], info["unit_id"]
+            changed = self._tracker.changed(module_id, unit_id)
+            if changed:
+                view = self._controller.get_device_view(module_id, unit_id)
+                changes[device_id] = (
+                    view.version,
+                    {register: view.registers[register] for register in changed},
+                )
+
+        return changes
+
+    def publish(self) -> int:
+        """Queue one update per client with the changes since the last publish.
+
+        Call after refreshing the controller, done by the poll loop if
+        poll_interval is set. Never waits for clients.
+
+        Returns:
+            devices (int): The number of devices with changes.
+
+        """
+        changes = self._changes()
+        if not changes:
+            return 0
+
+        self.updates += 1
+        messages: dict[tuple, str | None] = {}
+        for client in self._clients:
+            if client.key not in messages:
+                devices = {
+                    device_id: {
+                        "version": version,
+                        "registers": self._filtered(changed, client.prefixes),
+                    }
+                    for device_id, (version, changed) in changes.items()
+                    if client.wants(device_id)
+                }
+                devices = {
+                    device_id: update
+                    for device_id, update in devices.items()
+                    if update["registers"]
+                }
+                messages[client.key] = (
+                    json.dumps(
+                        {
+                            "type": "update",
+                            "version": self._controller.version,
+                            "devices": devices,
+                        }
+                    )
+                    if devices
+                    else None
+                )
+
+            if messages[client.key] is not None:
+                client.offer(messages[client.key])
+
+        return len(changes)
+
+    def _client(self, devices: Any, prefixes: Any) -> PushClient:
+        """Return a client for the filter values, lists or comma separated."""
+        if isinstance(devices, str):
+            devices = [device for device in devices.split(",") if device]
+        if isinstance(prefixes, str):
+            prefixes = [prefix for prefix in prefixes.split(",") if prefix]
+        return PushClient(
+            set(devices) if devices else None,
+            tuple(prefixes or ()),
+            self.queue_size,
+        )
+
+    async def _send(self, ws: web.WebSocketResponse, client: PushClient) -> None:
+        """Send the queued messages, a snapshot when resynced."""
+        await ws.send_str(self.snapshot(client))
+        while True:
+            message = await client.queue.get()
+            if message == RESYNC:
+                message = self.snapshot(client)
+            await ws.send_str(message)
+
+    async def _handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        """Serve a client until it disconnects."""
+        ws = web.WebSocketResponse(heartbeat=30)
+        await ws.prepare(request)
+
+        client = self._client(
+            request.query.get("devices", ""), request.query.get("prefixes", "")
+        )
+        self._clients.add(client)
+        sender = asyncio.create_task(self._send(ws, client))
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    subscribe = json.loads(msg.data)
+                    new_client = self._client(
+                        subscribe.get("devices"), subscribe.get("prefixes")
+                    )
+                except (ValueError, AttributeError):
+                    await ws.send_str(json.dumps({"type": "error", "error": "invalid"}))
+                    continue
+
+                # Swap the filter and send a new snapshot.
+                sender.cancel()
+                self._clients.discard(client)
+                client = new_client
+                self._clients.add(client)
+                sender = asyncio.create_task(self._send(ws, client))
+        finally:
+            sender.cancel()
+            self._clients.discard(client)
+
+        return ws
+
+    async def _poll(self) -> None:
+        """Refresh the due devices and publish the changes."""
+        await self._controller.refresh()
+        self.publish()
+
+    async def start(self) -> None:
+        """Start serving /ws, and polling if an interval is set."""
+        # Devices already loaded are in the first snapshot, not an update.
+        self._changes()
+
+        app = web.Application()
+        app.router.add_get("/ws", self._handle_ws)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self._host, self._port).start()
+
+        if self.poll_interval is not None:
+            self._poll_task = asyncio.create_task(
+                poll_forever(self._poll, self.poll_interval, "Push")
+            )
+        _LOGGER.info("Push server listening on ws://%s:%s/ws", self._host, self.port)
+
+    async def stop(self) -> None:
+        """Stop polling and serving, disconnects the clients."""
+        if self._poll_task:
+            self._poll_task.cancel()
+            self._poll_task = None
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> "MasterthermPushServer":
+        """Start the server as a context manager."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        """Stop the server."""
+        await self.stop()
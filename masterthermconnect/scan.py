@@ -0,0 +1,162 @@
+"""Find Mastertherm Heat Pumps on a network and detect their register mapping."""
+
+import asyncio
+import contextlib
+import ctypes
+import ipaddress
+import logging
+from typing import Any
+
+from pymodbus.client import AsyncModbusTcpClient
+from pymodbus.exceptions import ModbusException
+
+from masterthermconnect.modbusmap import CONROLLER_MAP, MAPPING
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+# Registers with a known plausible range when the heat pump is running, a
+# mapping scores a point for each register read as non zero and in range.
+KNOWN_REGISTERS = {
+    "A_1": (5.0, 80.0),  # Requested Temperature
+    "A_3": (-40.0, 50.0),  # Outside Temperature
+    "A_90": (5.0, 80.0),  # Actual Temperature
+    "I_50": (1, 4),  # Season
+    "I_51": (1, 10),  # HP Function
+}
+
+# Holding registers read per probe, covering the known A and I registers at
+# the start address of every mapping.
+PROBE_BLOCKS = {"A": (0, 100), "I": (5001, 100)}
+
+# The controller type to configure for a detected mapping, e.g. pco5_0.
+HP_TYPES = {mt_type: controller for controller, mt_type in CONROLLER_MAP.items()}
+
+
+def _score(blocks: dict[str, list[int]], mt_type: str) -> int:
+    """Return the number of known registers plausible for a mapping."""
+    score = 0
+    for register, (low, high) in KNOWN_REGISTERS.items():
+        prefix, _, number = register.partition("_")
+        start, _ = PROBE_BLOCKS[prefix]
+        index = MAPPING[mt_type][prefix]["start"] + int(number) - start
+        if not 0 <= index < len(blocks[prefix]):
+            continue
+
+        value: float = ctypes.c_short(blocks[prefix][index]).value
+        if prefix == "A":
+            value = value / 10.0
+        if value != 0 and low <= value <= high:
+            score += 1
+
+    return score
+
+
+def detect_type(blocks: dict[str, list[int]]) -> tuple[str | None, dict[str, int]]:
+    """Return the best matching mapping for the probe blocks and all scores.
+
+    The type is None when no mapping scores better than the others.
+    """
+    scores = {mt_type: _score(blocks, mt_type) for mt_type in MAPPING}
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    if ranked[0][1] == 0 or ranked[0][1] == ranked[1][1]:
+        return None, scores
+    return ranked[0][0], scores
+
+
+async def _port_open(host: str, port: int, timeout: float) -> bool:
+    """Return True if a TCP connection to the port can be made."""
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, TimeoutError):
+        return False
+
+    writer.close()
+    with contextlib.suppress(OSError):
+        await writer.wait_closed()
+    return True
+
+
+async def probe(
+    host: str, port: int = 502, slave: int = 1, timeout: float = 1.0
+) -> dict[str, Any] | None:
+    """Probe a host for a Modbus TCP heat pump.
+
+    Args:
+        host: The IP address to probe
+        port: The Modbus port
+        slave: The Modbus slave id
+        timeout: Seconds to wait for the connection and each response
+
+    Returns:
+        result (dict): The host, port, detected mt_type, hp_type and scores,
+            None if nothing is listening or it is not a Modbus device.
+
+    """
+    if not await _port_open(host, port, timeout):
+        return None
+
+    client = AsyncModbusTcpClient(host, port=port, timeout=timeout, retries=0)
+    try:
+        if not await client.connect():
+            return None
+
+        blocks: dict[str, list[int]] = {}
+        for prefix, (address, count) in PROBE_BLOCKS.items():
+            result = await client.read_holding_registers(
+                address, count=count, slave=slave
+            )
+            if result.isError():
+                _LOGGER.debug("%s:%s read error %s", host, port, result)
+                return None
+            blocks[prefix] = result.registers
+    except ModbusException as ex:
+        _LOGGER.debug("%s:%s not a Modbus device: %s", host, port, ex)
+        return None
+    finally:
+        client.close()
+
+    mt_type, scores = detect_type(blocks)
+    return {
+        "host": host,
+        "port": port,
+        "mt_type": mt_type,
+        "hp_type": HP_TYPES.get(mt_type),
+        "scores": scores,
+    }
+
+
+async def scan(
+    network: str,
+    port: int = 502,
+    slave: int = 1,
+    timeout: float = 1.0,
+    concurrency: int = 256,
+) -> list[dict[str, Any]]:
+    """Probe every host of a network concurrently, see probe.
+
+    Args:
+        network: The network, e.g. 192.168.1.0/24, or a single address
+        port: The Modbus port
+        slave: The Modbus slave id
+        timeout: Seconds to wait for each host
+        concurrency: The maximum hosts probed at the same time
+
+    Returns:
+        results (list): The Modbus devices found, ordered by address.
+
+    Raises:
+        ValueError: The network is not valid.
+
+    """
+    hosts = [str(host) for host in ipaddress.ip_network(network, strict=False)]
+    if len(hosts) > 2:
+        hosts = hosts[1:-1]  # Skip the network and broadcast addresses.
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def limited(host: str) -> dict[str, Any] | None:
+        async with semaphore:
+            return await probe(host, port, slave, timeout)
+
+    results = await asyncio.gather(*(limited(host) for host in hosts))
+    return [result for result in results if result is not None]
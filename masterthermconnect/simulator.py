@@ -0,0 +1,295 @@
+"""Modbus TCP Heat Pump Simulator, for testing and benchmarking offline."""
+
+import asyncio
+import logging
+import random
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+
+from pymodbus.datastore import ModbusBaseSlaveContext, ModbusServerContext
+from pymodbus.pdu import ExceptionResponse
+from pymodbus.server import ModbusTcpServer
+from pymodbus.server.requesthandler import ServerRequestHandler
+
+from masterthermconnect.modbusmap import ADDRESS_SPACE, MAPPING, READ_ONLY
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+# Typical values for a heat pump running in heating mode, all other registers
+# start at zero.
+DEFAULT_REGISTERS = {
+    "A_1": 35.0,  # Requested Temperature
+    "A_3": 5.5,  # Outside Temperature
+    "A_90": 34.2,  # Actual Temperature
+    "A_126": 48.0,  # Domestic Hot Water Temperature
+    "A_129": 50.0,  # Domestic Hot Water Required Temperature
+    "A_191": 21.0,  # HC0 Ambient Requested
+    "A_211": 20.8,  # HC0 Ambient Temperature
+    "D_3": True,  # HP Power State
+    "D_5": True,  # Compressor Running
+    "D_10": True,  # Circulation Pump Running
+    "I_11": 12450,  # Compressor Run Time
+    "I_12": 3120,  # Compressor Start Counter
+    "I_13": 15000,  # Pump Run Time
+    "I_50": 1,  # Season
+    "I_51": 2,  # HP Function
+}
+
+
+class SimulatorContext(ModbusBaseSlaveContext):
+    """Slave context holding the heat pump registers at the mapped addresses."""
+
+    def __init__(self, simulator: "MasterthermModbusSimulator") -> None:
+        """Initialise the register store."""
+        self._simulator = simulator
+        self.hold: list[int] = [0] * ADDRESS_SPACE
+        self.coil: list[bool] = [False] * ADDRESS_SPACE
+
+    def reset(self) -> None:
+        """Reset all registers to zero."""
+        self.hold = [0] * ADDRESS_SPACE
+        self.coil = [False] * ADDRESS_SPACE
+
+    def getValues(self, fc_as_hex: int, address: int, count: int = 1) -> Any:
+        """Get count values from the store, error code if out of range."""
+        if address < 0 or address + count > ADDRESS_SPACE:
+            return ExceptionResponse.ILLEGAL_ADDRESS
+
+        store = self.coil if self.decode(fc_as_hex) in ("c", "d") else self.hold
+        return store[address : address + count]
+
+    def setValues(self, fc_as_hex: int, address: int, values: Any) -> None | int:
+        """Set the values in the store, error code if out of range."""
+        if address < 0 or address + len(values) > ADDRESS_SPACE:
+            return ExceptionResponse.ILLEGAL_ADDRESS
+
+        if self.decode(fc_as_hex) in ("c", "d"):
+            self.coil[address : address + len(values)] = [bool(v) for v in values]
+        else:
+            self.hold[address : address + len(values)] = list(values)
+
+        return None
+
+    async def async_getValues(
+        self, fc_as_hex: int, address: int, count: int = 1
+    ) -> Any:
+        """Get values, applying the simulated latency and drift."""
+        async with self._simulator.transaction():
+            self._simulator.apply_drift()
+            return self.getValues(fc_as_hex, address, count)
+
+    async def async_setValues(
+        self, fc_as_hex: int, address: int, values: Any
+    ) -> None | int:
+        """Set values, applying the simulated latency."""
+        async with self._simulator.transaction():
+            return self.setValues(fc_as_hex, address, values)
+
+
+class SimulatorRequestHandler(ServerRequestHandler):
+    """Request handler that can drop the connection instead of answering."""
+
+    async def handle_request(self) -> None:
+        """Handle the request or randomly drop the connection."""
+        if self.last_pdu and self.server.simulator.should_drop():
+            _LOGGER.debug("Simulator dropping connection")
+            self.close()
+            return
+
+        await super().handle_request()
+
+
+class SimulatorServer(ModbusTcpServer):
+    """Modbus TCP Server that creates simulator request handlers."""
+
+    def __init__(self, simulator: "MasterthermModbusSimulator", **kwargs) -> None:
+        """Initialise the server."""
+        self.simulator = simulator
+        super().__init__(**kwargs)
+
+    def callback_new_connection(self) -> ServerRequestHandler:
+        """Handle incoming connect."""
+        return SimulatorRequestHandler(
+            self, self.trace_packet, self.trace_pdu, self.trace_connect
+        )
+
+
+class MasterthermModbusSimulator:
+    """Simulated Mastertherm Heat Pump served over Modbus TCP."""
+
+    def __init__(
+        self,
+        mt_type: str = "mt_0",
+        host: str = "127.0.0.1",
+        port: int = 5020,
+        slave: int = 1,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        drift: float = 0.0,
+        drop_rate: float = 0.0,
+        max_transactions: int | None = None,
+        registers: dict[str, Any] | None = None,
+        seed: int | None = None,
+    ) -> None:
+        """Initialise the Simulator.
+
+        Args:
+            mt_type: The register mapping to serve, mt_0 or mt_1
+            host: The address to listen on
+            port: The port to listen on, 0 to use any free port
+            slave: The slave id served
+            latency: Seconds added to every transaction
+            jitter: Random seconds, up to this value, added to the latency
+            drift: Maximum change of the measured analog values per read
+            drop_rate: Probability between 0 and 1 a request drops the connection
+            max_transactions: Maximum transactions processed at the same time
+            registers: Initial register values, defaults to DEFAULT_REGISTERS
+            seed: Optional seed for repeatable drift, jitter and drops
+
+        Raises:
+            ValueError: Invalid type, must be one of mt_0 or mt_1
+
+        """
+        if mt_type not in MAPPING:
+            raise ValueError("Invalid type, must be one of mt_0 or mt_1")
+
+        self._reg_map = MAPPING[mt_type]
+        self._host = host
+        self._port = port
+        self._slave = slave
+        self._server: SimulatorServer | None = None
+        self._random = random.Random(seed)
+
+        self.latency = latency
+        self.jitter = jitter
+        self.drift = drift
+        self.drop_rate = drop_rate
+        self._limit = asyncio.Semaphore(max_transactions) if max_transactions else None
+        self.transactions = 0
+        self.active_transactions = 0
+        self.peak_transactions = 0
+        self.dropped = 0
+
+        self.context = SimulatorContext(self)
+        self._baseline = dict(DEFAULT_REGISTERS if registers is None else registers)
+        for register, value in self._baseline.items():
+            self.set_register(register, value)
+
+        # Analog measurements drift, these are the read only A registers.
+        self._drifting = [
+            register
+            for register in self._baseline
+            if register[0] == "A"
+            and any(a <= int(register[2:]) <= b for a, b in READ_ONLY["A"])
+        ]
+
+    @property
+    def port(self) -> int:
+        """Return the port the simulator is listening on."""
+        if self._server and self._server.transport:
+            return self._server.transport.sockets[0].getsockname()[1]
+        return self._port
+
+    def _address(self, register: str) -> tuple[str, int]:
+        """Return the store type and address for a register."""
+        prefix, _, number = register.partition("_")
+        return (
+            self._reg_map[prefix]["type"],
+            self._reg_map[prefix]["start"] + int(number),
+        )
+
+    def set_register(self, register: str, value: Any) -> None:
+        """Set a register value, e.g. A_3 to 5.5."""
+        reg_type, address = self._address(register)
+        if reg_type == "coil":
+            self.context.coil[address] = bool(value)
+        elif register[0] == "A":
+            self.context.hold[address] = round(float(value) * 10) & 0xFFFF
+        else:
+            self.context.hold[address] = int(value) & 0xFFFF
+
+    def get_register(self, register: str) -> Any:
+        """Get a register value in the same format as MasterthermModbus."""
+        reg_type, address = self._address(register)
+        if reg_type == "coil":
+            return self.context.coil[address]
+
+        value = self.context.hold[address]
+        value = value - 0x10000 if value & 0x8000 else value
+        return value / 10.0 if register[0] == "A" else value
+
+    def apply_drift(self) -> None:
+        """Random walk the analog measurements, staying near the baseline."""
+        if not self.drift:
+            return
+
+        for register in self._drifting:
+            base = float(self._baseline[register])
+            value = self.get_register(register) + self._random.uniform(
+                -self.drift, self.drift
+            )
+            self.set_register(register, min(max(value, base - 5.0), base + 5.0))
+
+    def should_drop(self) -> bool:
+        """Return True if the current request should drop the connection."""
+        if self.drop_rate > 0 and self._random.random() < self.drop_rate:
+            self.dropped += 1
+            return True
+
+        return False
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        """Simulate one transaction, waiting for a free slot and the latency."""
+        if self._limit:
+            await self._limit.acquire()
+
+        self.transactions += 1
+        self.active_transactions += 1
+        self.peak_transactions = max(self.peak_transactions, self.active_transactions)
+        try:
+            delay = self.latency
+            if self.jitter:
+                delay += self._random.uniform(0, self.jitter)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            yield
+        finally:
+            self.active_transactions -= 1
+            if self._limit:
+                self._limit.release()
+
+    def drop_connections(self) -> None:
+        """Drop all connected clients."""
+        if self._server:
+            for connection in list(self._server.active_connections.values()):
+                connection.close()
+
+    async def start(self) -> None:
+        """Start listening in the background."""
+        self._server = SimulatorServer(
+            self,
+            context=ModbusServerContext(
+                slaves={self._slave: self.context}, single=False
+            ),
+            address=(self._host, self._port),
+        )
+        await self._server.serve_forever(background=True)
+        _LOGGER.info("Simulator listening on %s:%s", self._host, self.port)
+
+    async def stop(self) -> None:
+        """Stop the simulator."""
+        if self._server:
+            await self._server.shutdown()
+            self._server = None
+
+    async def __aenter__(self) -> "MasterthermModbusSimulator":
+        """Start the simulator as a context manager."""
+        await self.start()
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        """Stop the simulator."""
+        await self.stop()
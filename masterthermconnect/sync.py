@@ -0,0 +1,238 @@
+"""Synchronous Mastertherm Client, runs the controller on a background loop."""
+
+import asyncio
+import logging
+import threading
+from collections.abc import Callable, Coroutine
+from concurrent.futures import Future
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any
+
+from masterthermconnect.controller import DeviceView, MasterthermController
+from masterthermconnect.deadline import within
+from masterthermconnect.exceptions import MasterthermDeadlineError
+from masterthermconnect.polling import poll_forever
+
+if TYPE_CHECKING:
+    from aiohttp import ClientSession
+
+_LOGGER: logging.Logger = logging.getLogger(__name__)
+
+
+class MasterthermSyncClient:
+    """Thread safe synchronous client for the MasterthermController.
+
+    The controller, its HTTP session and Modbus connection live on a single
+    background event loop, so all callers share the pooled connections and
+    token refresh. Reads are copied from the cached controller state on the
+    loop, they never wait for a request, writes return a Future.
+    """
+
+    def __init__(self, timeout: float = 30.0) -> None:
+        """Initialise the client and start the background loop.
+
+        Args:
+            timeout: Seconds to wait for blocking calls, e.g. connect.
+
+        """
+        self._timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._run_loop, name="masterthermconnect", daemon=True
+        )
+        started = threading.Event()
+        self._loop.call_soon(started.set)
+        self._thread.start()
+        started.wait()
+
+        self._controller = MasterthermController()
+        self._session: ClientSession | None = None
+        self._poll_task: asyncio.Task | None = None
+
+    def _run_loop(self) -> None:
+        """Run the background event loop until stopped."""
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def _submit(self, coro: Coroutine) -> Future:
+        """Run a coroutine on the background loop and return its Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def _call(self, coro: Coroutine) -> Any:
+        """Run a coroutine on the background loop and wait for the result."""
+        return self._submit(coro).result(self._timeout)
+
+    def _read(self, read: Callable[[], Any], timeout: float | None = None) -> Any:
+        """Run a read of the cached state on the loop, the only thread changing it.
+
+        The read must return copies, the controller mappings are live.
+
+        Raises:
+            MasterthermDeadlineError: The loop did not run the read in time.
+
+        """
+        timeout = self._timeout if timeout is None else timeout
+        deadline = self._loop.time() + timeout
+
+        async def run() -> Any:
+            async with within(deadline, "read"):
+                # Let a deadline that passed while queued cancel the read.
+                await asyncio.sleep(0)
+                return read()
+
+        future = self._submit(run())
+        try:
+            return future.result(timeout)
+        except TimeoutError as ex:
+            future.cancel()
+            raise MasterthermDeadlineError(
+                "timeout", "Deadline passed during read"
+            ) from ex
+
+    @property
+    def controller(self) -> MasterthermController:
+        """Return the controller, only use it from the background loop."""
+        return self._controller
+
+    def enable_api(
+        self,
+        username: str,
+        password: str,
+        api_version: str = "v1",
+        base_url: str | None = None,
+    ) -> bool:
+        """Enable the API Interface, see MasterthermController.enable_api."""
+
+        from aiohttp import ClientSession, ClientTimeout
+
+        async def enable() -> bool:
+            if self._session is None:
+                self._session = ClientSession(timeout=ClientTimeout(total=30))
+            return await self._controller.enable_api(
+                username, password, self._session, api_version, base_url=base_url
+            )
+
+        return self._call(enable())
+
+    def enable_modbus(
+        self, modbus_addr: str, hp_type: str | None = None, **kwargs: Any
+    ) -> bool:
+        """Enable the Modbus Interface, see MasterthermController.enable_modbus."""
+        return self._call(
+            self._controller.enable_modbus(modbus_addr, hp_type, **kwargs)
+        )
+
+    def connect(self, reload_modules: bool = False) -> bool:
+        """Connect and wait for the result, see MasterthermController.connect."""
+        return self._call(self._controller.connect(reload_modules))
+
+    def refresh(self) -> Future:
+        """Refresh the devices that are due, returns a Future of the results."""
+        return self._submit(self._controller.refresh())
+
+    def start_polling(self, interval: float = 5.0) -> None:
+        """Call refresh in the background every interval seconds.
+
+        Args:
+            interval: Seconds between refresh calls, only due work is done.
+
+        """
+
+        def start() -> None:
+            if self._poll_task is None:
+                self._poll_task = self._loop.create_task(
+                    poll_forever(self._controller.refresh, interval, "Sync client")
+                )
+
+        self._loop.call_soon_threadsafe(start)
+
+    def set_device_register(
+        self, module_id: str, unit_id: str, register: str, value: Any
+    ) -> Future:
+        """Set a register, returns a Future of the success (bool).
+
+        See MasterthermController.set_device_register.
+        """
+        return self._submit(
+            self._controller.set_device_register(module_id, unit_id, register, value)
+        )
+
+    @property
+    def version(self) -> int:
+        """Return the controller version, increased when any device changes."""
+        return self._controller.version
+
+    def get_devices(self, timeout: float | None = None) -> dict:
+        """Return a copy of the devices and their info from the cache.
+
+        The reads wait up to timeout seconds, default the client timeout, for
+        the loop and raise MasterthermDeadlineError after.
+        """
+        return self._read(
+            lambda: {
+                device_id: dict(info)
+                for device_id, info in self._controller.get_devices().items()
+            },
+            timeout,
+        )
+
+    def get_device_view(
+        self, module_id: str, unit_id: str, timeout: float | None = None
+    ) -> DeviceView | None:
+        """Return a read only copy of a device view from the cache."""
+
+        def read() -> DeviceView | None:
+            view = self._controller.get_device_view(module_id, unit_id)
+            if view is None:
+                return None
+            return view._replace(
+                info=MappingProxyType(dict(view.info)),
+                registers=MappingProxyType(dict(view.registers)),
+            )
+
+        return self._read(read, timeout)
+
+    def get_device_registers(
+        self, module_id: str, unit_id: str, timeout: float | None = None
+    ) -> MappingProxyType:
+        """Return a read only copy of the registers of a device from the cache."""
+        return self._read(
+            lambda: MappingProxyType(
+                dict(self._controller.get_device_registers(module_id, unit_id))
+            ),
+            timeout,
+        )
+
+    def get_device_data(
+        self, module_id: str, unit_id: str, timeout: float | None = None
+    ) -> dict:
+        """Return the normalized data of a device from the cache."""
+        return self._read(
+            lambda: self._controller.get_device_data(module_id, unit_id), timeout
+        )
+
+    def close(self) -> None:
+        """Stop polling, close the connections and stop the background loop."""
+
+        async def shutdown() -> None:
+            if self._poll_task is not None:
+                self._poll_task.cancel()
+                self._poll_task = None
+            await self._controller.close()
+            if self._session is not None:
+                await self._session.close()
+                self._session = None
+
+        if self._loop.is_running():
+            self._call(shutdown())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(self._timeout)
+        self._loop.close()
+
+    def __enter__(self) -> "MasterthermSyncClient":
+        """Use the client as a context manager."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Close the client."""
+        self.close()
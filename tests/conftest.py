@@ -0,0 +1,36 @@
+"""Fixtures for the Mastertherm tests."""
+
+import asyncio
+import threading
+from collections.abc import Iterator
+
+import pytest
+
+from masterthermconnect.simulator import MasterthermModbusSimulator
+
+
+@pytest.fixture
+def simulator_thread() -> Iterator[MasterthermModbusSimulator]:
+    """Run a Modbus simulator on its own loop, for synchronous tests."""
+    started = threading.Event()
+    stop = threading.Event()
+    simulators: list[MasterthermModbusSimulator] = []
+
+    def run() -> None:
+        async def serve() -> None:
+            async with MasterthermModbusSimulator("mt_0", port=0) as simulator:
+                simulators.append(simulator)
+                started.set()
+                while not stop.is_set():
+                    await asyncio.sleep(0.01)
+
+        asyncio.run(serve())
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert started.wait(5)
+
+    yield simulators[0]
+
+    stop.set()
+    thread.join()
@@ -0,0 +1,137 @@
+"""Test the Mastertherm API against the stand-in."""
+
+import asyncio
+
+from aiohttp import ClientSession
+import pytest
+
+from masterthermconnect.api import MasterthermAPI
+from masterthermconnect.apisimulator import MasterthermAPISimulator
+from masterthermconnect.const import URL_PUMPDATA
+from masterthermconnect.controller import MasterthermController
+from masterthermconnect.exceptions import (
+    MasterthermDeadlineError,
+    MasterthermServerTimeoutError,
+)
+from masterthermconnect.metrics import METRICS
+
+
+async def test_reads_coalesce_until_write() -> None:
+    """Test identical reads share a request, but not one from before a write."""
+    async with MasterthermAPISimulator() as simulator, ClientSession() as session:
+        module_id = simulator.account("user")[0]
+        api = MasterthermAPI("user", "pass", session, "v1", simulator.url)
+        await api.connect()
+        coalesced = METRICS.total("requests_coalesced_total", transport="api")
+
+        simulator.latency = 0.3
+        first = asyncio.create_task(api.get_device_data(module_id, "1"))
+        await asyncio.sleep(0.05)
+        second = await api.get_device_data(module_id, "1")
+        assert second is await first
+        assert simulator.requests_by_path[URL_PUMPDATA] == 1
+        assert (
+            METRICS.total("requests_coalesced_total", transport="api") == coalesced + 1
+        )
+
+        stale = asyncio.create_task(api.get_device_data(module_id, "1"))
+        await asyncio.sleep(0.05)
+        simulator.latency = 0.0
+        assert await api.set_device_data(module_id, "1", "A_191", 23.5)
+
+        fresh = await api.get_device_data(module_id, "1")
+        assert not stale.done()
+        assert simulator.requests_by_path[URL_PUMPDATA] == 3
+        assert fresh["data"]["varData"]["001"]["A_191"] == "23.5"
+        await stale
+
+
+async def test_stale_while_revalidate() -> None:
+    """Test cached data is served fresh, then stale while refreshed and on timeout."""
+    async with MasterthermAPISimulator() as simulator, ClientSession() as session:
+        module_id = simulator.account("user")[0]
+        api = MasterthermAPI(
+            "user",
+            "pass",
+            session,
+            "v1",
+            simulator.url,
+            fresh_seconds=0.2,
+            max_stale_seconds=1.0,
+        )
+        await api.connect()
+
+        first = await api.get_device_data(module_id, "1")
+        assert await api.get_device_data(module_id, "1") is first
+        assert simulator.requests_by_path[URL_PUMPDATA] == 1
+
+        await asyncio.sleep(0.25)
+        stale = await api.get_device_data(module_id, "1")
+        assert stale["stale"] is True
+        assert stale["data"] == first["data"]
+        await asyncio.sleep(0.05)
+        assert simulator.requests_by_path[URL_PUMPDATA] == 2
+        assert "stale" not in await api.get_device_data(module_id, "1")
+
+        simulator.error_status = 504
+        await asyncio.sleep(1.1)
+        timed_out = await api.get_device_data(module_id, "1")
+        assert timed_out["stale"] is True
+        assert simulator.requests_by_path[URL_PUMPDATA] == 4
+
+
+async def test_cache_controller_refresh() -> None:
+    """Test the delta reads of a controller are answered from one entry per device."""
+    async with MasterthermAPISimulator() as simulator, ClientSession() as session:
+        simulator.account("user")
+        controller = MasterthermController()
+        await controller.enable_api(
+            "user", "pass", session, "v1", simulator.url, fresh_seconds=60
+        )
+        await controller.connect()
+        devices = len(controller.get_devices())
+        hits = METRICS.total("cache_hits_total", transport="api")
+
+        for _ in range(3):
+            assert all((await controller.refresh_devices()).values())
+        assert simulator.requests_by_path[URL_PUMPDATA] == devices
+        assert METRICS.total("cache_hits_total", transport="api") == hits + 2 * devices
+        assert controller._api.cached_devices == devices
+
+        # Changes since a time after the cached response need a request.
+        module_id = simulator.account("user")[0]
+        timestamp = (await controller._api.get_device_data(module_id, "1"))["timestamp"]
+        await controller._api.get_device_data(
+            module_id, "1", last_update_time=str(timestamp + 1)
+        )
+        assert simulator.requests_by_path[URL_PUMPDATA] == devices + 1
+        assert controller._api.cached_devices == devices
+
+
+async def test_deadline() -> None:
+    """Test a deadline cancels a slow read, not the read shared with others."""
+    async with MasterthermAPISimulator() as simulator, ClientSession() as session:
+        module_id = simulator.account("user")[0]
+        api = MasterthermAPI("user", "pass", session, "v1", simulator.url)
+        await api.connect()
+        loop = asyncio.get_running_loop()
+
+        simulator.latency = 1.0
+        start = loop.time()
+        with pytest.raises(MasterthermDeadlineError):
+            await api.get_device_data(module_id, "1", deadline=start + 0.1)
+        assert loop.time() - start < 0.5
+
+        simulator.latency = 0.0
+        simulator.error_status = 504
+        requests = simulator.requests_by_path[URL_PUMPDATA]
+        first = asyncio.create_task(
+            api.get_device_data(module_id, "1", deadline=loop.time() + 0.3)
+        )
+        second = asyncio.create_task(api.get_device_data(module_id, "1"))
+        with pytest.raises(MasterthermDeadlineError):
+            await first
+        # The caller without a deadline still gets the retry.
+        with pytest.raises(MasterthermServerTimeoutError):
+            await second
+        assert simulator.requests_by_path[URL_PUMPDATA] == requests + 2
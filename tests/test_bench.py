@@ -0,0 +1,90 @@
+"""Test the Benchmark, Load Test and API Stand-in."""
+
+import pstats
+import tracemalloc
+
+import pytest
+
+from masterthermconnect.bench import percentile, run_bench
+from masterthermconnect.loadtest import run_load
+from masterthermconnect.profiling import MasterthermProfiler
+
+
+def test_percentile() -> None:
+    """Test the nearest rank percentiles."""
+    values = [float(value) for value in range(1, 101)]
+    assert percentile(values, 50) == 50.0
+    assert percentile(values, 99) == 99.0
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) == 0.0
+
+
+@pytest.mark.parametrize("api_version", ["v1", "v2"])
+async def test_bench_api(api_version: str) -> None:
+    """Test incremental API polls are a single small request."""
+    results = await run_bench("api", polls=3, api_version=api_version, alloc_polls=1)
+
+    assert results["target"] == "stand-in"
+    assert results["poll_errors"] == 0
+    assert results["round_trips_per_poll"] == 1.0
+    assert results["bytes_received_per_poll"] > 0
+    assert results["alloc_peak_bytes_p50"] > 0
+
+    full = await run_bench(
+        "api", polls=2, api_version=api_version, full_load=True, alloc_polls=0
+    )
+    assert full["bytes_received_per_poll"] > results["bytes_received_per_poll"]
+    assert full["decode_ms_per_poll"] > 0
+
+
+async def test_bench_modbus() -> None:
+    """Test a Modbus poll reads all blocks of A, D and I."""
+    results = await run_bench("modbus", polls=2, alloc_polls=0)
+
+    assert results["poll_errors"] == 0
+    assert results["round_trips_per_poll"] == 18.0
+    assert results["bytes_received_per_poll"] > results["bytes_sent_per_poll"]
+
+
+async def test_profiler(tmp_path) -> None:
+    """Test the profiles captured from the polls are exported."""
+    with MasterthermProfiler() as profiler:
+        results = await run_bench("modbus", polls=3, alloc_polls=0, profiler=profiler)
+        paths = profiler.export(str(tmp_path / "bench"))
+
+    assert results["profiled"]
+    assert len(profiler.refreshes) == 3
+    assert [path.rsplit(".", 1)[1] for path in paths] == [
+        "pstats",
+        "collapsed",
+        "tracemalloc",
+    ]
+
+    stats = pstats.Stats(paths[0])
+    assert any(func[2] == "read_raw_registers" for func in stats.stats)
+    assert tracemalloc.Snapshot.load(paths[2]).traces
+    assert not tracemalloc.is_tracing()
+
+
+async def test_load_steps() -> None:
+    """Test the load steps keep up at a small scale and report each measure."""
+    results = await run_load(
+        [2, 4], data_refresh=1, duration=2.5, tick=0.1, register_count=50
+    )
+
+    assert [step["accounts"] for step in results["steps"]] == [2, 4]
+    assert results["falls_behind_at"] is None
+    step = results["steps"][-1]
+    assert step["devices"] == 4
+    assert step["refresh_errors"] == 0
+    assert step["refreshes_per_s"] > 0
+    assert step["requests_per_s"] > 0
+    assert step["memory_per_device_bytes"] > 0
+    assert step["loop_lag_ms"]["max"] >= step["loop_lag_ms"]["p50"]
+
+    # Requiring ten times the expected rate, the first step is behind.
+    results = await run_load(
+        [2, 4], data_refresh=1, duration=2.5, tick=0.1, behind_ratio=10
+    )
+    assert results["falls_behind_at"] == 2
+    assert len(results["steps"]) == 1
@@ -0,0 +1,107 @@
+"""Test recording and replaying cassettes."""
+
+from pathlib import Path
+import time
+
+from aiohttp import ClientSession
+from pymodbus.client import AsyncModbusTcpClient
+import pytest
+
+from masterthermconnect import MasterthermController
+from masterthermconnect.apisimulator import MasterthermAPISimulator
+from masterthermconnect.cassette import (
+    REDACTED,
+    MasterthermCassette,
+    MasterthermReplayServer,
+    ReplayModbusClient,
+    redact_body,
+)
+from masterthermconnect.simulator import MasterthermModbusSimulator
+
+
+@pytest.mark.parametrize("api_version", ["v1", "v2"])
+async def test_api_record_replay(api_version: str, tmp_path: Path) -> None:
+    """Test an API session replays through the client with no secrets saved."""
+    cassette = MasterthermCassette()
+    async with (
+        MasterthermAPISimulator(api_version, latency=0.05) as simulator,
+        ClientSession(trace_configs=[cassette.trace_config()]) as session,
+    ):
+        controller = MasterthermController()
+        await controller.enable_api(
+            "user@example.com", "secret-pass", session, api_version, simulator.url
+        )
+        await controller.connect()
+        await controller.refresh_devices(full_load=True)
+        recorded = dict(controller.get_device_registers("10000", "1"))
+
+    path = tmp_path / "api.json"
+    cassette.save(str(path))
+    saved = path.read_text()
+    assert "secret-pass" not in saved
+    assert "example.com" not in saved
+    assert REDACTED in saved
+    assert all(item["elapsed"] >= 0.05 for item in cassette.interactions)
+
+    replay = MasterthermCassette.load(str(path))
+    async with (
+        MasterthermReplayServer(replay, speed=0) as server,
+        ClientSession() as session,
+    ):
+        controller = MasterthermController()
+        await controller.enable_api(
+            "someone", "other", session, api_version, base_url=server.url
+        )
+        await controller.connect()
+        start = time.perf_counter()
+        await controller.refresh_devices(full_load=True)
+        assert time.perf_counter() - start < 0.05 * len(replay.interactions)
+
+        assert dict(controller.get_device_registers("10000", "1")) == recorded
+        assert server.unmatched == 0
+
+
+async def test_api_recorded_once_read() -> None:
+    """Test a response is only recorded once its body is fully read."""
+    cassette = MasterthermCassette()
+    async with (
+        MasterthermAPISimulator("v1") as simulator,
+        ClientSession(trace_configs=[cassette.trace_config()]) as session,
+        session.get(f"{simulator.url}/missing") as response,
+    ):
+        assert cassette.interactions == []
+        body = await response.read()
+
+    assert len(cassette.interactions) == 1
+    assert cassette.interactions[0]["body"] == redact_body(body)
+
+
+async def test_modbus_record_replay() -> None:
+    """Test Modbus reads and a write replay with the heat pump gone."""
+    cassette = MasterthermCassette()
+    async with MasterthermModbusSimulator(port=0) as simulator:
+        controller = MasterthermController()
+        await controller.enable_modbus(
+            "127.0.0.1",
+            "mt_0",
+            port=simulator.port,
+            client=cassette.record_modbus(
+                AsyncModbusTcpClient("127.0.0.1", port=simulator.port)
+            ),
+        )
+        await controller.connect()
+        await controller.refresh_devices()
+        assert await controller.set_device_register("local", "1", "A_191", 23.5)
+        recorded = dict(controller.get_device_registers("local", "1"))
+        await controller.close()
+
+    replay_client = ReplayModbusClient(cassette, speed=10)
+    controller = MasterthermController()
+    await controller.enable_modbus("127.0.0.1", "mt_0", client=replay_client)
+    await controller.connect()
+    await controller.refresh_devices()
+    assert await controller.set_device_register("local", "1", "A_191", 23.5)
+
+    assert dict(controller.get_device_registers("local", "1")) == recorded
+    assert replay_client.transactions == len(cassette.interactions)
+    await controller.close()
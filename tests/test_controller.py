@@ -0,0 +1,358 @@
+"""Test the Mastertherm Controller."""
+
+import asyncio
+import gzip
+import json
+from datetime import timedelta
+from typing import Any
+
+import pytest
+
+from masterthermconnect.controller import MasterthermController
+from masterthermconnect.exceptions import (
+    MasterthermDeadlineError,
+    MasterthermPumpError,
+    MasterthermServerTimeoutError,
+    MasterthermTokenInvalid,
+)
+from masterthermconnect.simulator import MasterthermModbusSimulator
+
+MODULES = {
+    "returncode": 0,
+    "role": "400",
+    "modules": [
+        {
+            "id": "1234",
+            "module_name": "Home",
+            "config": [{"mb_addr": "1", "mb_name": "Heat Pump"}],
+        }
+    ],
+}
+
+MANY_MODULES = {
+    "returncode": 0,
+    "role": "400",
+    "modules": [
+        {
+            "id": str(module_id),
+            "module_name": "Home",
+            "config": [{"mb_addr": "1", "mb_name": "Heat Pump"}],
+        }
+        for module_id in range(10)
+    ],
+}
+
+
+class FakeAPI:
+    """Stand in for the MasterthermAPI returning fixed responses."""
+
+    modules = MODULES
+    registers = {"A_3": "4.5", "D_3": "1", "I_51": "2"}
+    info_returncode = 0
+    delay = 0.0
+    account_error: Exception | None = None
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Initialise."""
+        self.data_calls: list[str | None] = []
+        self.info_calls = 0
+        self.active = 0
+        self.peak = 0
+
+    async def connect(self) -> dict:
+        """Return the modules."""
+        return self.modules
+
+    async def get_device_info(
+        self, module_id: str, unit_id: str, deadline: float | None = None
+    ) -> dict:
+        """Return the device info."""
+        self.info_calls += 1
+        return {
+            "returncode": self.info_returncode,
+            "regulation": "pco5",
+            "exp": "0",
+            "type": "AQI",
+        }
+
+    async def get_device_data(
+        self,
+        module_id: str,
+        unit_id: str,
+        last_update_time: str | None = None,
+        deadline: float | None = None,
+    ) -> dict:
+        """Return the device data."""
+        self.data_calls.append(last_update_time)
+        if module_id == "0" and self.account_error is not None:
+            raise self.account_error
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+
+        if module_id == "3":
+            raise MasterthermPumpError(MasterthermPumpError.OFFLINE, "Offline")
+        if module_id == "5":
+            raise MasterthermServerTimeoutError("500", "Timed out twice")
+
+        return {
+            "timestamp": 1700000000 + len(self.data_calls),
+            "error": {"errorId": 0, "errorMessage": ""},
+            "data": (
+                {"varData": {"001": dict(self.registers)}} if self.registers else {}
+            ),
+        }
+
+    async def set_device_data(self, *args: Any, **kwargs: Any) -> bool:
+        """Accept any register."""
+        return True
+
+
+@pytest.fixture
+def fake_api(monkeypatch) -> None:
+    """Replace the API with the fake."""
+    monkeypatch.setattr("masterthermconnect.api.MasterthermAPI", FakeAPI)
+
+
+async def test_hybrid_local_first(fake_api) -> None:
+    """Test registers are read locally and the API is used as fallback."""
+    async with MasterthermModbusSimulator("mt_0", port=0) as simulator:
+        controller = MasterthermController()
+        await controller.enable_api("user", "pass", object())
+        await controller.enable_modbus("127.0.0.1", port=simulator.port, timeout=0.2)
+        assert await controller.connect()
+        assert controller.get_device_info("1234", "1")["controller"] == "pco5"
+
+        assert await controller.refresh_data()
+        registers = controller.get_device_registers("1234", "1")
+        sources = controller.get_device_register_sources("1234", "1")
+        assert registers["A_3"] == 5.5
+        assert sources["A_3"]["source"] == "modbus"
+
+        simulator.drop_connections()
+        await simulator.stop()
+
+        assert await controller.refresh_data()
+        registers = controller.get_device_registers("1234", "1")
+        sources = controller.get_device_register_sources("1234", "1")
+        assert registers["A_3"] == 4.5
+        assert registers["D_3"] is True
+        assert sources["A_3"]["source"] == "api"
+        assert sources["A_500"]["source"] == "modbus"
+
+
+async def test_refresh_only_due(fake_api) -> None:
+    """Test refresh only does the work that is due."""
+    controller = MasterthermController("user", "pass", object())
+    assert await controller.connect()
+    api = controller._api
+
+    assert await controller.refresh() == {"1234_1": True}
+    assert api.data_calls == [None]
+
+    assert await controller.refresh() == {}
+    assert api.data_calls == [None]
+
+    controller.set_refresh_rate(data_refresh_seconds=0, jitter=0)
+    assert await controller.refresh() == {"1234_1": True}
+    assert api.data_calls == [None, "1700000001"]
+
+
+async def test_concurrent_refresh(fake_api, monkeypatch) -> None:
+    """Test devices refresh concurrently and a failing device is isolated."""
+    monkeypatch.setattr(FakeAPI, "modules", MANY_MODULES)
+    monkeypatch.setattr(FakeAPI, "delay", 0.01)
+    controller = MasterthermController("user", "pass", object())
+    controller.set_max_concurrent(3)
+    assert await controller.connect()
+
+    results = await controller.refresh_devices()
+    assert len(results) == 10
+    assert isinstance(results["3_1"], MasterthermPumpError)
+    assert isinstance(results["5_1"], MasterthermServerTimeoutError)
+    assert all(results[f"{i}_1"] is True for i in range(10) if i not in (3, 5))
+    assert controller._api.peak == 3
+    assert await controller.refresh_devices(device_ids=[]) == {}
+
+    # An account error is raised once and the other devices are stopped.
+    monkeypatch.setattr(FakeAPI, "delay", 5.0)
+    monkeypatch.setattr(
+        FakeAPI, "account_error", MasterthermTokenInvalid("401", "Token invalid")
+    )
+    controller.set_max_concurrent(10)
+    with pytest.raises(MasterthermTokenInvalid):
+        await controller.refresh_devices()
+    assert controller._api.active == 0
+
+
+async def test_refresh_deadline(fake_api, monkeypatch) -> None:
+    """Test a refresh cycle ends at the deadline and the devices stay due."""
+    monkeypatch.setattr(FakeAPI, "modules", MANY_MODULES)
+    controller = MasterthermController("user", "pass", object())
+    controller.set_max_concurrent(3)
+    assert await controller.connect()
+
+    monkeypatch.setattr(FakeAPI, "delay", 5.0)
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    results = await controller.refresh(deadline=start + 0.1)
+    assert loop.time() - start < 0.5
+    assert len(results) == 10
+    assert all(isinstance(r, MasterthermDeadlineError) for r in results.values())
+
+    monkeypatch.setattr(FakeAPI, "delay", 0.0)
+    results = await controller.refresh(deadline=loop.time() + 1.0)
+    assert len(results) == 10
+    assert all(results[f"{i}_1"] is True for i in range(10) if i not in (3, 5))
+
+
+async def test_adaptive_refresh(fake_api) -> None:
+    """Test data is refreshed at the active rate while running or changing."""
+    controller = MasterthermController("user", "pass", object())
+    assert await controller.connect()
+    controller.set_refresh_rate(data_refresh_seconds=3600, jitter=0)
+    controller.set_adaptive_refresh(0, 3600, state_registers=["D_3"])
+
+    assert await controller.refresh() == {"1234_1": True}
+    assert await controller.refresh() == {"1234_1": True}
+
+    controller.set_adaptive_refresh(0, 3600)
+    assert await controller.refresh() == {}
+
+    # A write is not a change read from the heat pump.
+    assert await controller.set_device_register("1234", "1", "D_5", True)
+    assert await controller.refresh() == {}
+
+    # The compressor stopping is active once, an update without changes is idle.
+    controller._api.registers = {"D_5": "0"}
+    assert await controller.refresh_devices() == {"1234_1": True}
+    controller._api.registers = {}
+    assert await controller.refresh() == {"1234_1": True}
+    assert await controller.refresh() == {}
+
+    # No state registers watched is always idle, even with the compressor on.
+    controller._api.registers = {"D_5": "1"}
+    assert await controller.refresh_devices() == {"1234_1": True}
+    controller._api.registers = {}
+    controller.set_adaptive_refresh(0, 3600, state_registers=[])
+    assert await controller.refresh() == {}
+
+
+async def test_info_refresh_backoff(fake_api, monkeypatch) -> None:
+    """Test info and data are each refreshed when due, failed info backs off."""
+    monkeypatch.setattr(FakeAPI, "info_returncode", 1)
+    controller = MasterthermController("user", "pass", object())
+    controller.set_refresh_rate(data_refresh_seconds=3600, jitter=0)
+    controller.info_retry_interval = timedelta(seconds=0.05)
+    assert await controller.connect()
+    api = controller._api
+    assert api.info_calls == 1
+
+    assert await controller.refresh() == {"1234_1": True}
+    assert await controller.refresh() == {}
+    assert (api.info_calls, len(api.data_calls)) == (1, 1)
+
+    await asyncio.sleep(0.06)
+    assert await controller.refresh() == {"1234_1": False}
+    assert await controller.refresh() == {}
+    assert (api.info_calls, len(api.data_calls)) == (2, 1)
+
+
+async def test_write_stores_held_value(fake_api) -> None:
+    """Test a write stores the value as held, without counting as a read."""
+    controller = MasterthermController("user", "pass", object())
+    assert await controller.connect()
+    assert await controller.refresh_data()
+    version = controller.get_device_version("1234", "1")
+    sources = controller.get_device_register_sources("1234", "1")
+
+    assert await controller.set_device_register("1234", "1", "A_191", 21.04)
+    assert await controller.set_device_register("1234", "1", "D_3", "0")
+    registers = controller.get_device_registers("1234", "1")
+    assert registers["A_191"] == 21.0
+    assert registers["D_3"] is False
+    assert controller.get_device_version("1234", "1") == version + 2
+    assert controller.get_device_changes("1234", "1") == ["A_3", "D_3", "I_51"]
+    assert controller.get_device_changes("1234", "1", since_version=version) == [
+        "A_191",
+        "D_3",
+    ]
+    assert (
+        controller.get_device_register_sources("1234", "1")["A_3"]["updated"]
+        == sources["A_3"]["updated"]
+    )
+
+
+async def test_snapshot_warm_start(fake_api, tmp_path) -> None:
+    """Test state saved to a snapshot resumes with delta updates."""
+    controller = MasterthermController("user", "pass", object())
+    assert await controller.connect()
+    assert await controller.refresh_data()
+    controller.save_state(str(tmp_path / "state.json.gz"))
+
+    restored = MasterthermController("user", "pass", object())
+    assert restored.load_state(str(tmp_path / "state.json.gz"))
+    assert restored.get_device_registers("1234", "1")["A_3"] == 4.5
+    assert restored.get_device_info("1234", "1")["controller"] == "pco5"
+
+    # A snapshot without the API update time has unknown freshness.
+    path = tmp_path / "unknown.json.gz"
+    snapshot = json.loads(gzip.decompress((tmp_path / "state.json.gz").read_bytes()))
+    snapshot["devices"]["1234_1"]["source_updates"] = {}
+    path.write_bytes(gzip.compress(json.dumps(snapshot).encode()))
+    unknown = MasterthermController()
+    assert unknown.load_state(str(path))
+    assert unknown.get_device_register_sources("1234", "1")["A_3"]["updated"] is None
+
+    assert await restored.connect()
+    assert await restored.refresh_data()
+    assert restored._api.data_calls == ["1700000001"]
+    assert restored.get_device_register_sources("1234", "1")["A_3"]["source"] == "api"
+
+
+async def test_changes_and_normalized_data(fake_api) -> None:
+    """Test updates record only changes and data is computed from registers."""
+    controller = MasterthermController("user", "pass", object())
+    assert await controller.connect()
+
+    assert await controller.refresh_data()
+    assert controller.get_device_changes("1234", "1") == ["A_3", "D_3", "I_51"]
+    version = controller.get_device_version("1234", "1")
+    assert await controller.refresh_data()
+    assert controller.get_device_changes("1234", "1") == []
+    assert controller.get_device_changes("1234", "1", since_version=version) == []
+    assert controller.get_device_changes("1234", "1", since_version=-1) == [
+        "A_3",
+        "D_3",
+        "I_51",
+    ]
+    controller._api.registers = {"A_3": "4.5", "D_3": "0"}
+    assert await controller.refresh_data()
+    assert controller.get_device_changes("1234", "1", since_version=version) == ["D_3"]
+
+    data = controller.get_device_data("1234", "1")
+    assert data["outside_temp"] == 4.5
+    assert data["hp_function"] == 2
+    assert data["hc0"]["name"] == "Home"
+    assert controller.get_memory_usage()["1234_1"] > 0
+
+
+async def test_device_view(fake_api) -> None:
+    """Test the read only device view and version."""
+    controller = MasterthermController("user", "pass", object())
+    assert await controller.connect()
+    assert await controller.refresh_data()
+
+    view = controller.get_device_view("1234", "1")
+    assert view.registers["A_3"] == 4.5
+    assert view.changes == ("A_3", "D_3", "I_51")
+    with pytest.raises(TypeError):
+        view.registers["A_3"] = 1.0
+    with pytest.raises(TypeError):
+        controller.get_devices()["1234_1"]["unit_name"] = "Changed"
+
+    assert await controller.refresh_data()
+    assert controller.get_device_version("1234", "1") == view.version
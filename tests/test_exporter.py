@@ -0,0 +1,53 @@
+"""Test the Prometheus Exporter."""
+
+from aiohttp import ClientSession
+
+from masterthermconnect import MasterthermController
+from masterthermconnect.exporter import MasterthermExporter
+from masterthermconnect.simulator import MasterthermModbusSimulator
+
+
+async def test_exporter_serves_cache() -> None:
+    """Test scrapes are served from the cache and follow refreshes."""
+    async with MasterthermModbusSimulator(port=0) as simulator:
+        controller = MasterthermController()
+        await controller.enable_modbus("127.0.0.1", "mt_0", port=simulator.port)
+        await controller.connect()
+        await controller.refresh_devices()
+
+        async with (
+            MasterthermExporter(controller, host="127.0.0.1", port=0) as exporter,
+            ClientSession() as session,
+        ):
+            url = f"http://127.0.0.1:{exporter.port}/metrics"
+            transactions = simulator.transactions
+            async with session.get(url) as response:
+                assert response.headers["Content-Type"].startswith("text/plain")
+                text = await response.text()
+            assert simulator.transactions == transactions
+
+            assert (
+                'masterthermconnect_register{device="local_1",register="A_3"} 5.5'
+                in text
+            )
+            assert (
+                'masterthermconnect_data{device="local_1",field="outside_temp"} 5.5'
+                in text
+            )
+            assert (
+                'masterthermconnect_data{device="local_1",field="hc0_name"}' not in text
+            )
+            assert "masterthermconnect_requests_total{" in text
+            assert text.count("# TYPE masterthermconnect_register gauge") == 1
+
+            simulator.set_register("A_3", -2.5)
+            await controller.refresh_devices()
+            async with session.get(url) as response:
+                text = await response.text()
+            assert (
+                'masterthermconnect_register{device="local_1",register="A_3"} -2.5'
+                in text
+            )
+            assert "masterthermconnect_exporter_scrapes_total 2" in text
+
+        await controller.close()
@@ -0,0 +1,113 @@
+"""Test the package imports fast and loads the transports lazily."""
+
+import json
+import subprocess
+import sys
+
+# Generous limit for the controller and CLI imports on a slow machine, they take
+# well under a tenth of it.
+IMPORT_SECONDS = 1.0
+
+CHECK = """
+import json, sys
+{code}
+print(json.dumps({{
+    "modules": sorted({{m.split(".")[0] for m in sys.modules}}),
+    "package": sorted(m for m in sys.modules if m.startswith("masterthermconnect.")),
+}}))
+"""
+
+
+def run_check(code: str) -> dict:
+    """Run code in a new interpreter and return the modules loaded."""
+    result = subprocess.run(
+        [sys.executable, "-c", CHECK.format(code=code)],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def import_seconds(code: str, module: str) -> float:
+    """Return the cumulative import time of a module, from python -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if line.count("|") != 2:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.strip() == module and not name.startswith("  "):
+            return int(cumulative) / 1e6
+    raise AssertionError(f"{module} not imported")
+
+
+def test_import_time() -> None:
+    """Test the controller and CLI import faster than a transport alone."""
+    transport = import_seconds("import aiohttp", "aiohttp")
+    for code, module in (
+        ("import masterthermconnect", "masterthermconnect"),
+        ("import masterthermconnect.controller", "masterthermconnect.controller"),
+        ("import masterthermconnect.__main__", "masterthermconnect.__main__"),
+    ):
+        seconds = import_seconds(code, module)
+        assert seconds < IMPORT_SECONDS, f"{module} took {seconds:.3f}s"
+        assert seconds < transport, f"{module} took longer than aiohttp"
+
+
+def test_import_package() -> None:
+    """Test importing the package loads nothing but the version."""
+    result = run_check("import masterthermconnect")
+
+    assert result["package"] == ["masterthermconnect.__version__"]
+    assert "aiohttp" not in result["modules"]
+    assert "pymodbus" not in result["modules"]
+
+
+def test_import_controller() -> None:
+    """Test creating a controller does not import either transport."""
+    result = run_check(
+        "from masterthermconnect import MasterthermController\nMasterthermController()"
+    )
+
+    assert result["package"] == [
+        "masterthermconnect.__version__",
+        "masterthermconnect.const",
+        "masterthermconnect.controller",
+        "masterthermconnect.datamap",
+        "masterthermconnect.deadline",
+        "masterthermconnect.exceptions",
+        "masterthermconnect.modbusmap",
+    ]
+    assert "aiohttp" not in result["modules"]
+    assert "pymodbus" not in result["modules"]
+    assert "natsort" not in result["modules"]
+
+
+def test_cli_version() -> None:
+    """Test the CLI version does not load the controller."""
+    result = run_check(
+        "from masterthermconnect.__main__ import main\nmain(['--version'])"
+    )
+
+    assert result["package"] == [
+        "masterthermconnect.__main__",
+        "masterthermconnect.__version__",
+    ]
+
+
+def test_enable_modbus_only() -> None:
+    """Test enabling Modbus only loads pymodbus."""
+    result = run_check(
+        "import asyncio\n"
+        "from masterthermconnect import MasterthermController\n"
+        "asyncio.run(MasterthermController().enable_modbus('127.0.0.1', 'mt_0'))"
+    )
+
+    assert "pymodbus" in result["modules"]
+    assert "aiohttp" not in result["modules"]
@@ -10,3 +10,18 @@ def test_help(capsys) -> None:
     out, err = capsys.readouterr()
     assert out.startswith("usage: masterthermconnect [-h] [--version]")
     assert err == ""
+
+
+def test_watch(capsys, tmp_path, simulator_thread) -> None:
+    """Test watch prints all registers then only the changes."""
+    config = tmp_path / "masterthermconnect.cfg"
+    config.write_text(
+        "[SETUP]\nconfigured = true\napi_configure = False\nlocal_configure = True\n"
+        "[LOCAL]\nlocal_ip = 127.0.0.1\n"
+        f"local_port = {simulator_thread.port}\nhp_type = pco5_0\n"
+    )
+
+    assert MasterthermConnect(["watch", "-c", str(config), "-i", "0", "-n", "1"]) == 0
+    out, err = capsys.readouterr()
+    assert "local_1 A_3=5.5" in out
+    assert len(out.splitlines()) == 1800
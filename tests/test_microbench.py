@@ -0,0 +1,177 @@
+"""Micro-benchmarks of the hot decode paths, compared to a stored baseline.
+
+The payloads are recorded responses checked in under fixtures, the API
+data responses as sent and the Modbus blocks as a cassette of two
+refreshes. Each path is timed relative to a fixed pure Python workload,
+so the baseline holds across machines, and fails when slower than the
+baseline by more than MASTERTHERM_BENCH_TOLERANCE. A tracer such as
+coverage slows some paths more than others, so traced and untraced runs
+have their own baselines.
+
+Update the baseline after an intended change with:
+    MASTERTHERM_BENCH_UPDATE=1 pytest tests/test_microbench.py
+"""
+
+import asyncio
+import gc
+import json
+import os
+import sys
+import timeit
+from collections.abc import Callable
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from masterthermconnect.api import sort_device_data
+from masterthermconnect.cassette import MasterthermCassette, ReplayModbusClient
+from masterthermconnect.controller import MasterthermController
+from masterthermconnect.datamap import HC0_NAME_REGISTERS, decode_name
+from masterthermconnect.modbus import MasterthermModbus
+
+BASELINE_FILE = Path(__file__).parent / "microbench_baseline.json"
+FIXTURES = Path(__file__).parent / "fixtures"
+TOLERANCE = float(os.environ.get("MASTERTHERM_BENCH_TOLERANCE", "2.0"))
+UPDATE = os.environ.get("MASTERTHERM_BENCH_UPDATE") == "1"
+
+REPEAT = 7
+
+
+async def _replay_modbus(cassette: MasterthermCassette) -> dict[str, Any]:
+    """Return the Modbus client, the raw blocks and a controller with changes.
+
+    The controller refreshes twice from the cassette, the version between the
+    refreshes is returned to diff against.
+    """
+    modbus = MasterthermModbus(
+        "127.0.0.1", "mt_0", client=ReplayModbusClient(cassette, speed=0)
+    )
+    raw = await modbus.read_raw_registers(1)
+
+    controller = MasterthermController()
+    await controller.enable_modbus(
+        "127.0.0.1", "mt_0", client=ReplayModbusClient(cassette, speed=0)
+    )
+    await controller.connect()
+    await controller.refresh_devices()
+    version = controller.get_device_version("local", "1")
+    await controller.refresh_devices()
+    await controller.close()
+    return {
+        "modbus_client": modbus,
+        "modbus": raw,
+        "controller": controller,
+        "version": version,
+    }
+
+
+@pytest.fixture(scope="module")
+def payloads() -> dict[str, Any]:
+    """Load the recorded v1, v2 and Modbus payloads."""
+    cassette = MasterthermCassette.load(str(FIXTURES / "modbus.json"))
+    return {
+        "v1_config1": (FIXTURES / "api_v1_config1.json").read_bytes(),
+        "v1_config2": (FIXTURES / "api_v1_config2.json").read_bytes(),
+        "v2": (FIXTURES / "api_v2.json").read_bytes(),
+        **asyncio.run(_replay_modbus(cassette)),
+    }
+
+
+def _response(decoded: dict) -> dict:
+    """Return a response to sort, the registers are shared, not copied."""
+    return {**decoded, "data": dict(decoded["data"])}
+
+
+def _calibration() -> None:
+    """Run a fixed workload the paths are measured against."""
+    values = {f"K_{index}": str(index) for index in range(2000)}
+    sorted(values.items(), key=lambda item: int(item[1]))
+
+
+def _cases(payloads: dict[str, Any]) -> dict[str, tuple[Callable[[], Any], int]]:
+    """Return the paths to time and the calls per timing."""
+    modbus = payloads["modbus_client"]
+    controller = payloads["controller"]
+    registers = controller.get_device_registers("local", "1")
+
+    decoded = {
+        name: json.loads(payloads[name]) for name in ("v1_config1", "v1_config2", "v2")
+    }
+    return {
+        "json_decode_v1": (lambda: json.loads(payloads["v1_config1"]), 20),
+        "json_decode_v2": (lambda: json.loads(payloads["v2"]), 20),
+        "sort_v1_config1": (
+            lambda: sort_device_data(_response(decoded["v1_config1"]), "v1", "1"),
+            5,
+        ),
+        "sort_v1_config2": (
+            lambda: sort_device_data(_response(decoded["v1_config2"]), "v1", "1"),
+            5,
+        ),
+        "sort_v2": (
+            lambda: sort_device_data(_response(decoded["v2"]), "v2", "1"),
+            5,
+        ),
+        "modbus_decode": (lambda: modbus._decode_registers(payloads["modbus"]), 20),
+        "char_map_decode": (
+            lambda: decode_name(registers, HC0_NAME_REGISTERS),
+            2000,
+        ),
+        "snapshot_diff": (
+            lambda: controller.get_device_changes(
+                "local", "1", since_version=payloads["version"]
+            ),
+            20,
+        ),
+    }
+
+
+def _timed(call: Callable[[], Any], number: int) -> float:
+    """Return the best seconds per call."""
+    return min(timeit.repeat(call, number=number, repeat=REPEAT)) / number
+
+
+def _relative(call: Callable[[], Any], number: int) -> float:
+    """Return the best time of a path over the calibration timed just before."""
+    gc.collect()
+    calibration = _timed(_calibration, 20)
+    return _timed(call, number) / calibration
+
+
+def test_payloads(payloads: dict[str, Any]) -> None:
+    """Test the recorded payloads hold what the paths are timed on."""
+    controller = payloads["controller"]
+    assert controller.get_device_changes(
+        "local", "1", since_version=payloads["version"]
+    )
+    assert decode_name(
+        controller.get_device_registers("local", "1"), HC0_NAME_REGISTERS
+    )
+    assert "varfile_mt1_config2" in json.loads(payloads["v1_config2"])["data"]
+
+
+def test_microbench(payloads: dict[str, Any]) -> None:
+    """Test no path is slower than the baseline, relative to the calibration."""
+    results = {
+        name: round(_relative(call, number), 4)
+        for name, (call, number) in _cases(payloads).items()
+    }
+
+    mode = "untraced" if sys.gettrace() is None else "traced"
+    baselines = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    if UPDATE:
+        baselines[mode] = results
+        BASELINE_FILE.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        return
+    if mode not in baselines:
+        pytest.skip(f"No {mode} baseline, record it with MASTERTHERM_BENCH_UPDATE=1")
+
+    baseline = baselines[mode]
+    slower = {
+        name: f"{ratio:.3f} > {baseline[name]:.3f}"
+        for name, ratio in results.items()
+        if name in baseline and ratio > baseline[name] * TOLERANCE
+    }
+    assert not slower, f"Slower than the baseline: {slower}"
+    assert set(results) <= set(baseline), "New paths, update the baseline"
@@ -0,0 +1,102 @@
+"""Test the Modbus local access."""
+
+import asyncio
+
+import pytest
+
+from masterthermconnect.gateway import MasterthermModbusGateway
+from masterthermconnect.modbus import MasterthermModbus
+from masterthermconnect.scan import detect_type, scan
+from masterthermconnect.simulator import MasterthermModbusSimulator
+
+
+async def test_group_writes() -> None:
+    """Test adjacent registers are grouped in to single writes."""
+    modbus = MasterthermModbus("127.0.0.1", "mt_1")
+    runs = modbus._group_writes(
+        {"A_192": 22.5, "A_191": -1.5, "D_3": True, "I_51": 2, "A_200": 50.0}
+    )
+
+    assert runs == [
+        ("coil", 5, [True]),
+        ("hold", 193, [0xFFF1, 225]),
+        ("hold", 202, [500]),
+        ("hold", 5054, [2]),
+    ]
+
+
+async def test_reject_read_only() -> None:
+    """Test read only and unknown registers are rejected."""
+    modbus = MasterthermModbus("127.0.0.1", "mt_0")
+
+    with pytest.raises(ValueError, match="read only"):
+        modbus._group_writes({"D_5": True})
+    with pytest.raises(ValueError, match="Unknown"):
+        modbus._group_writes({"X_1": 1})
+
+
+@pytest.mark.parametrize("mt_type", ["mt_0", "mt_1"])
+async def test_simulator_read_write(mt_type: str) -> None:
+    """Test reading and writing registers against the simulator."""
+    async with MasterthermModbusSimulator(mt_type, port=0) as simulator:
+        modbus = MasterthermModbus("127.0.0.1", mt_type, port=simulator.port)
+        assert await modbus.connect()
+
+        registers = await modbus.get_registers(1)
+        assert registers["A_3"] == 5.5
+        assert registers["D_3"] is True
+        assert registers["I_51"] == 2
+
+        assert await modbus.set_registers(1, {"A_191": 22.5, "D_3": False})
+        assert simulator.get_register("A_191") == 22.5
+        assert simulator.get_register("D_3") is False
+
+        modbus.close()
+
+
+async def test_gateway() -> None:
+    """Test the gateway answers many clients from one upstream poll."""
+    async with (
+        MasterthermModbusSimulator("mt_1", port=0) as simulator,
+        MasterthermModbusGateway(
+            "127.0.0.1", "mt_1", upstream_port=simulator.port, port=0
+        ) as gateway,
+    ):
+        clients = [
+            MasterthermModbus("127.0.0.1", "mt_1", port=gateway.port) for _ in range(3)
+        ]
+        for client in clients:
+            assert await client.connect()
+
+        results = await asyncio.gather(*(client.get_registers(1) for client in clients))
+        assert [result["A_3"] for result in results] == [5.5, 5.5, 5.5]
+        assert gateway.upstream_polls == 1
+
+        assert await clients[0].set_registers(1, {"A_191": 23.0})
+        assert simulator.get_register("A_191") == 23.0
+
+        for client in clients:
+            client.close()
+
+
+@pytest.mark.parametrize("mt_type", ["mt_0", "mt_1"])
+async def test_scan_detects_type(mt_type: str) -> None:
+    """Test the scan finds the simulator and detects its mapping."""
+    async with MasterthermModbusSimulator(mt_type, port=0) as simulator:
+        found = await scan("127.0.0.1/32", port=simulator.port, timeout=2)
+
+    assert len(found) == 1
+    assert found[0]["mt_type"] == mt_type
+    assert found[0]["hp_type"] == ("pco5_0" if mt_type == "mt_0" else "uPC_0")
+
+
+async def test_scan_nothing_listening() -> None:
+    """Test hosts without a Modbus listener are skipped quickly."""
+    async with MasterthermModbusSimulator(port=0) as simulator:
+        port = simulator.port
+
+    assert await scan("127.0.0.0/29", port=port, timeout=0.5) == []
+    assert detect_type({"A": [0] * 100, "I": [0] * 100}) == (
+        None,
+        {"mt_0": 0, "mt_1": 0},
+    )
@@ -0,0 +1,137 @@
+"""Test the MQTT Bridge against an in memory broker."""
+
+import asyncio
+import json
+import sys
+from collections.abc import AsyncIterator
+from types import SimpleNamespace
+from typing import Any
+
+from masterthermconnect import MasterthermController
+from masterthermconnect.mqtt import MasterthermMQTTBridge
+from masterthermconnect.simulator import MasterthermModbusSimulator
+
+
+class MemoryBroker:
+    """A broker and aiomqtt style client in one, retained messages are kept."""
+
+    def __init__(self) -> None:
+        """Initialise the broker."""
+        self.published: list[tuple[str, Any, bool]] = []
+        self.retained: dict[str, Any] = {}
+        self.subscriptions: list[str] = []
+        self._incoming: asyncio.Queue = asyncio.Queue()
+
+    async def __aenter__(self) -> "MemoryBroker":
+        """Connect."""
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        """Disconnect."""
+
+    async def publish(self, topic: str, payload: Any, qos=0, retain=False) -> None:
+        """Publish a message."""
+        self.published.append((topic, payload, retain))
+        if retain:
+            self.retained[topic] = payload
+
+    async def subscribe(self, topic: str) -> None:
+        """Subscribe to a topic."""
+        self.subscriptions.append(topic)
+
+    def send(self, topic: str, payload: bytes) -> None:
+        """Send a message to the subscribed client."""
+        self._incoming.put_nowait(SimpleNamespace(topic=topic, payload=payload))
+
+    @property
+    async def messages(self) -> AsyncIterator[SimpleNamespace]:
+        """Yield the messages sent to the client."""
+        while True:
+            yield await self._incoming.get()
+
+    def topics(self, prefix: str) -> list[str]:
+        """Return the topics published starting with a prefix."""
+        return [topic for topic, _, _ in self.published if topic.startswith(prefix)]
+
+
+async def test_mqtt_publish_changes_and_set() -> None:
+    """Test only changes are published and set commands are written."""
+    async with MasterthermModbusSimulator(port=0) as simulator:
+        controller = MasterthermController()
+        await controller.enable_modbus("127.0.0.1", "mt_0", port=simulator.port)
+        await controller.connect()
+        await controller.refresh_devices()
+
+        broker = MemoryBroker()
+        async with MasterthermMQTTBridge(
+            controller, prefix="mt", batch=True, client=broker
+        ) as bridge:
+            assert broker.retained["mt/status"] == "online"
+            assert broker.retained["mt/local_1/register/A_3"] == "5.5"
+            assert "homeassistant/sensor/masterthermconnect/local_1_A_3/config" in (
+                broker.retained
+            )
+
+            broker.published.clear()
+            simulator.set_register("A_3", -2.5)
+            await controller.refresh_devices()
+            assert await bridge.publish() == 1
+            assert broker.topics("mt/local_1/register/") == ["mt/local_1/register/A_3"]
+            assert json.loads(broker.retained["mt/local_1/register/A_3"]) == -2.5
+            assert broker.topics("mt/local_1/state") == ["mt/local_1/state"]
+            assert broker.topics("homeassistant/") == []
+
+            assert broker.subscriptions == ["mt/+/register/+/set"]
+            broker.send("mt/local_1/register/A_191/set", b"23.5")
+            for _ in range(50):
+                if simulator.get_register("A_191") == 23.5:
+                    break
+                await asyncio.sleep(0.02)
+            assert simulator.get_register("A_191") == 23.5
+            assert bridge.commands == 1
+
+            assert not await bridge.handle_command("mt/local_1/register/A_3", b"1")
+
+        assert broker.retained["mt/status"] == "offline"
+        await controller.close()
+
+
+async def test_mqtt_publish_field_changes() -> None:
+    """Test only the fields read from changed registers are published."""
+    async with MasterthermModbusSimulator(port=0) as simulator:
+        controller = MasterthermController()
+        await controller.enable_modbus("127.0.0.1", "mt_0", port=simulator.port)
+        await controller.connect()
+        await controller.refresh_devices()
+
+        broker = MemoryBroker()
+        async with MasterthermMQTTBridge(
+            controller, prefix="mt", topics="field", client=broker
+        ) as bridge:
+            assert broker.retained["mt/local_1/data/hc0/name"] == "Home"
+
+            broker.published.clear()
+            simulator.set_register("A_3", -2.5)
+            await controller.refresh_devices()
+            assert await bridge.publish() == 1
+            assert broker.topics("mt/") == ["mt/local_1/data/outside_temp"]
+
+        await controller.close()
+
+
+async def test_mqtt_last_will(monkeypatch) -> None:
+    """Test the client is created with a retained offline last will."""
+    broker = MemoryBroker()
+    created: dict[str, Any] = {}
+
+    def client(host: str, port: int, **kwargs) -> MemoryBroker:
+        created.update(kwargs)
+        return broker
+
+    monkeypatch.setitem(
+        sys.modules,
+        "aiomqtt",
+        SimpleNamespace(Client=client, Will=lambda *args, **kwargs: (args, kwargs)),
+    )
+    async with MasterthermMQTTBridge(MasterthermController(), prefix="mt"):
+        assert created["will"] == (("mt/status", "offline"), {"retain": True})
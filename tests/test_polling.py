@@ -0,0 +1,24 @@
+"""Test the shared poll loop."""
+
+import asyncio
+
+from masterthermconnect.exceptions import MasterthermError
+from masterthermconnect.polling import poll_forever
+
+
+async def test_poll_forever_survives_errors() -> None:
+    """Test a poll that fails or raises is retried, the loop never ends."""
+    polls = []
+
+    async def poll() -> bool:
+        polls.append(len(polls))
+        if len(polls) == 1:
+            raise RuntimeError("Unexpected")
+        if len(polls) == 2:
+            raise MasterthermError("500", "Refresh failed")
+        return len(polls) != 3
+
+    task = asyncio.create_task(poll_forever(poll, 0.01, "Test"))
+    await asyncio.sleep(0.3)
+    task.cancel()
+    assert len(polls) > 4
@@ -0,0 +1,60 @@
+"""Test the WebSocket Push Server."""
+
+import asyncio
+
+from aiohttp import ClientSession
+
+from masterthermconnect import MasterthermController
+from masterthermconnect.push import RESYNC, MasterthermPushServer, PushClient
+from masterthermconnect.simulator import MasterthermModbusSimulator
+
+
+async def test_push_snapshot_then_changes() -> None:
+    """Test a filtered snapshot is sent, then only the changed registers."""
+    async with MasterthermModbusSimulator(port=0) as simulator:
+        controller = MasterthermController()
+        await controller.enable_modbus("127.0.0.1", "mt_0", port=simulator.port)
+        await controller.connect()
+        await controller.refresh_devices()
+
+        async with (
+            MasterthermPushServer(controller, host="127.0.0.1", port=0) as server,
+            ClientSession() as session,
+        ):
+            url = f"http://127.0.0.1:{server.port}/ws?devices=local_1&prefixes=A_"
+            async with session.ws_connect(url) as ws:
+                snapshot = await ws.receive_json(timeout=5)
+                assert snapshot["type"] == "snapshot"
+                registers = snapshot["devices"]["local_1"]["registers"]
+                assert registers["A_3"] == 5.5
+                assert all(register.startswith("A_") for register in registers)
+
+                simulator.set_register("A_3", -2.5)
+                simulator.set_register("I_50", 3)
+                await controller.refresh_devices()
+                assert server.publish() == 1
+
+                update = await ws.receive_json(timeout=5)
+                assert update["type"] == "update"
+                assert update["devices"]["local_1"]["registers"] == {"A_3": -2.5}
+
+                # Nothing changed, nothing is sent.
+                await controller.refresh_devices()
+                assert server.publish() == 0
+
+            await asyncio.sleep(0.1)
+            assert server.clients == 0
+
+        await controller.close()
+
+
+def test_slow_client_resyncs() -> None:
+    """Test a full queue is replaced by a resync instead of growing."""
+    client = PushClient(queue_size=2)
+    client.offer("one")
+    client.offer("two")
+    client.offer("three")
+
+    assert client.queue.qsize() == 1
+    assert client.queue.get_nowait() == RESYNC
+    assert client.resyncs == 1
@@ -0,0 +1,33 @@
+"""Test the Synchronous Client."""
+
+import time
+
+import pytest
+
+from masterthermconnect.exceptions import MasterthermDeadlineError
+from masterthermconnect.simulator import MasterthermModbusSimulator
+from masterthermconnect.sync import MasterthermSyncClient
+
+
+def test_sync_client(simulator_thread: MasterthermModbusSimulator) -> None:
+    """Test the sync client reads and writes through the background loop."""
+    with MasterthermSyncClient(timeout=5) as client:
+        assert client.enable_modbus("127.0.0.1", "mt_0", port=simulator_thread.port)
+        assert client.connect()
+        assert client.refresh().result(5) == {"local_1": True}
+
+        registers = client.get_device_registers("local", "1")
+        assert registers["A_3"] == 5.5
+        version = client.version
+
+        assert client.set_device_register("local", "1", "A_191", 22.5).result(5)
+        assert client.get_device_view("local", "1").registers["A_191"] == 22.5
+        assert client.version > version
+        # Reads are copies taken on the loop, not the live state.
+        assert registers["A_191"] != 22.5
+
+        # A read waits for the busy loop only until its timeout.
+        client._loop.call_soon_threadsafe(time.sleep, 0.3)
+        with pytest.raises(MasterthermDeadlineError):
+            client.get_device_registers("local", "1", timeout=0.1)
+        assert client.get_device_registers("local", "1")["A_191"] == 22.5